@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Audit every user's credit balance against the ledger.
+Replays each user's entries since their last checkpoint (parallel segmented
+scan of Credits, bounded memory) and prints the users whose balance drifted.
+
+Usage:
+    python scripts/audit_ledger.py --env prod [--segments 8] [--checkpoint] [--max-report 100]
+"""
+import os
+import sys
+import json
+import argparse
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ledger_audit import LedgerAuditor, AUDIT_SEGMENTS, MAX_DRIFT_REPORT  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit credit balances against the ledger')
+    parser.add_argument('--env', default='dev', help='Table suffix (dev, staging, prod)')
+    parser.add_argument('--segments', type=int, default=AUDIT_SEGMENTS)
+    parser.add_argument('--checkpoint', action='store_true', help='Advance checkpoints while auditing')
+    parser.add_argument('--max-report', type=int, default=MAX_DRIFT_REPORT)
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+    auditor = LedgerAuditor(
+        dynamodb.Table(f'Ledger-{args.env}'),
+        dynamodb.Table(f'Credits-{args.env}'),
+        dynamodb.Table(f'LedgerCheckpoints-{args.env}')
+    )
+    report = auditor.audit_all(segments=args.segments, checkpoint=args.checkpoint,
+                               max_report=args.max_report)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report['drifting'] or report['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
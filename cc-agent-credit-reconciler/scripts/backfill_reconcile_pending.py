@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+One-off backfill of the sparse UnreconciledIndex.
+Jobs that finished before the stream handler started setting reconcilePending
+are invisible to the sweep; this scans the Jobs table in parallel segments and
+sets reconcilePending = "<status>#<shard>" on every finished, unreconciled job
+(re-run it after changing RECONCILE_INDEX_SHARDS).
+
+Usage:
+    python scripts/backfill_reconcile_pending.py --env prod [--segments 8] [--dry-run]
+"""
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+
+here = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(here, '..', 'src'))
+sys.path.insert(0, os.path.join(here, '..', '..', 'shared', 'python'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill reconcilePending on unreconciled jobs')
+    parser.add_argument('--env', default='dev', help='Table suffix (dev, staging, prod)')
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--dry-run', action='store_true', help='Count jobs without writing')
+    args = parser.parse_args()
+
+    os.environ['JOBS_TABLE'] = f'Jobs-{args.env}'
+    os.environ['SCAN_SEGMENTS'] = str(args.segments)
+    import handler  # noqa: E402
+
+    report = backfill(handler, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+
+
+def backfill(handler, dry_run: bool = False) -> dict:
+    """Mark every unreconciled completed/failed job found by the segmented scan."""
+    report = {'found': 0, 'marked': 0, 'skipped': 0}
+    jobs_table = handler.dynamodb.Table(handler.JOBS_TABLE)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        for jobs, _ in handler.scan_unreconciled_pages(jobs_table, {'mode': 'scan'}):
+            pending = [
+                job for job in jobs
+                if job.get('reconcilePending') != handler.reconcile_pending_key(job['jobId'], job['status'])
+            ]
+            report['found'] += len(pending)
+            if dry_run:
+                continue
+            for marked in executor.map(handler.mark_reconcile_pending, pending):
+                report['marked' if marked else 'skipped'] += 1
+    return report
+
+
+if __name__ == '__main__':
+    main()
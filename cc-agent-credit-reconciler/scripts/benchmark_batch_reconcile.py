@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the batch reconciler against moto's DynamoDB.
+Reconciles the same synthetic backlog job by job and in batches, and reports
+jobs/second and DynamoDB calls for each.
+
+moto has no network and is slow in its own way (every TransactWriteItems
+deep-copies all tables for rollback), so time spent inside moto is subtracted
+and each call is charged a round trip instead (--latency-ms, default 5).
+The call counts are the figure that carries over to production unchanged.
+
+Usage:
+    python scripts/benchmark_batch_reconcile.py [--jobs 2000] [--users 50] [--latency-ms 5]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ['JOBS_TABLE'] = 'bench-jobs'
+os.environ['CREDITS_TABLE'] = 'bench-credits'
+os.environ['LEDGER_TABLE'] = 'bench-ledger'
+
+here = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(here, '..', 'src'))
+sys.path.insert(0, os.path.join(here, '..', '..', 'shared', 'python'))
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+import handler  # noqa: E402
+
+
+def create_tables(dynamodb):
+    """Create the Jobs, Credits and Ledger tables."""
+    for name, key in (('bench-jobs', 'jobId'), ('bench-credits', 'userId'), ('bench-ledger', 'ledgerId')):
+        dynamodb.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+
+def seed(dynamodb, job_count: int, user_count: int, rng: random.Random) -> list:
+    """Write balances, jobs (10% failed after a debit) and the matching debits."""
+    credits = dynamodb.Table('bench-credits')
+    jobs_table = dynamodb.Table('bench-jobs')
+    ledger = dynamodb.Table('bench-ledger')
+
+    for u in range(user_count):
+        credits.put_item(Item={'userId': f'user-{u}', 'remaining': Decimal('100000')})
+
+    jobs = []
+    with jobs_table.batch_writer() as jobs_batch, ledger.batch_writer() as ledger_batch:
+        for i in range(job_count):
+            failed = rng.random() < 0.1
+            job = {
+                'jobId': f'job-{i}',
+                'userId': f'user-{rng.randrange(user_count)}',
+                'status': 'failed' if failed else 'completed',
+                'seconds': rng.randint(1, 60),
+                'model': 'default'
+            }
+            jobs_batch.put_item(Item=job)
+            jobs.append(job)
+            if failed:
+                ledger_batch.put_item(Item={
+                    'ledgerId': f"{job['jobId']}#debit",
+                    'userId': job['userId'],
+                    'type': 'debit',
+                    'amount': Decimal('1.00'),
+                    'jobId': job['jobId']
+                })
+    return jobs
+
+
+class CallMeter:
+    """Counts DynamoDB API calls and the time spent inside moto serving them."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.inside = 0.0
+        self._started = 0.0
+
+    def before_call(self, event_name, **kwargs):
+        self.calls[event_name.split('.')[-1]] += 1
+        self._started = time.perf_counter()
+
+    def after_call(self, **kwargs):
+        self.inside += time.perf_counter() - self._started
+
+
+def run(mode: str, job_count: int, user_count: int, seed_value: int, latency: float) -> dict:
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        create_tables(dynamodb)
+        jobs = seed(dynamodb, job_count, user_count, random.Random(seed_value))
+
+        meter = CallMeter()
+        events = handler.dynamodb.meta.client.meta.events
+        events.register('before-call.dynamodb', meter.before_call)
+        events.register('after-call.dynamodb', meter.after_call)
+
+        start = time.perf_counter()
+        if mode == 'per-job':
+            for job in jobs:
+                handler.reconcile_job(job)
+        else:
+            for offset in range(0, len(jobs), handler.RECONCILE_BATCH_SIZE):
+                handler.reconcile_jobs_batch(jobs[offset:offset + handler.RECONCILE_BATCH_SIZE])
+        elapsed = time.perf_counter() - start
+
+        events.unregister('before-call.dynamodb', meter.before_call)
+        events.unregister('after-call.dynamodb', meter.after_call)
+        total_calls = sum(meter.calls.values())
+        return {
+            'elapsed': elapsed - meter.inside + total_calls * latency,
+            'calls': meter.calls
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # Keep the LLM out of the numbers
+    with mock.patch.object(handler, 'invoke_llm', return_value='benchmark'), \
+         mock.patch.object(handler, 'get_model_price', return_value=0.10), \
+         mock.patch.object(handler, 'emit_metric'):
+        for mode in ('per-job', 'batch'):
+            result = run(mode, args.jobs, args.users, args.seed, args.latency_ms / 1000)
+            total_calls = sum(result['calls'].values())
+            print(f"{mode:8s} {args.jobs} jobs / {args.users} users: "
+                  f"{result['elapsed']:.2f}s, {args.jobs / result['elapsed']:.0f} jobs/s, "
+                  f"{total_calls} DynamoDB calls ({dict(result['calls'])})")
+
+
+if __name__ == '__main__':
+    main()
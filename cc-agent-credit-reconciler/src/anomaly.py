@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger()
+
+# Robust z-score above which a job is anomalous (Iglewicz & Hoaglin suggest 3.5)
+ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.5'))
+# Observations a model needs before its own statistics are trusted
+ANOMALY_MIN_SAMPLES = int(os.environ.get('ANOMALY_MIN_SAMPLES', '30'))
+# Observations per generation; scoring follows the last one to two windows
+ANOMALY_WINDOW = int(os.environ.get('ANOMALY_WINDOW', '1000'))
+# Age after which a clean cached sketch is re-read from the table (seconds)
+ANOMALY_CACHE_SECONDS = float(os.environ.get('ANOMALY_CACHE_SECONDS', '300'))
+
+# Scales MAD to the standard deviation of a normal distribution
+MAD_SCALE = 0.6745
+# MAD floor relative to the median, so near-constant history is not all-anomalous
+MAD_FLOOR = 0.05
+
+METRICS = ('cost', 'seconds')
+
+
+class P2Quantile:
+    """P² streaming estimate of one quantile (Jain & Chlamtac): five markers, O(1) per update."""
+
+    def __init__(self, p: float, state: Optional[Dict[str, Any]] = None):
+        self.p = p
+        if state:
+            self.heights: List[float] = state['q']
+            self.positions: List[float] = state['n']
+            self.desired: List[float] = state['d']
+            self.count: int = state['c']
+        else:
+            self.heights = []
+            self.positions = [0, 1, 2, 3, 4]
+            self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+            self.count = 0
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in range(1, 4):
+            delta = self.desired[i] - n[i]
+            if (delta >= 1 and n[i + 1] - n[i] > 1) or (delta <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if self.count <= 5:
+            return self.heights[int(round((len(self.heights) - 1) * self.p))]
+        return self.heights[2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'q': self.heights, 'n': self.positions, 'd': self.desired, 'c': self.count}
+
+
+class RobustStats:
+    """Streaming median and MAD (median of absolute deviations from the running median)."""
+
+    def __init__(self, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        self.median = P2Quantile(0.5, state.get('median'))
+        self.mad = P2Quantile(0.5, state.get('mad'))
+
+    @property
+    def count(self) -> int:
+        return self.median.count
+
+    def add(self, x: float):
+        self.median.add(x)
+        self.mad.add(abs(x - self.median.value()))
+
+    def z_score(self, x: float) -> float:
+        median = self.median.value()
+        mad = max(self.mad.value() or 0.0, MAD_FLOOR * abs(median), 1e-9)
+        return MAD_SCALE * (x - median) / mad
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'median': self.median.to_dict(), 'mad': self.mad.to_dict()}
+
+
+class ModelSketch:
+    """Per-model statistics in two generations, so old pricing and usage age out."""
+
+    def __init__(self, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        self.current = {m: RobustStats(state.get('current', {}).get(m)) for m in METRICS}
+        previous = state.get('previous')
+        self.previous = {m: RobustStats(previous.get(m)) for m in METRICS} if previous else None
+
+    def scoring_stats(self, metric: str) -> Optional[RobustStats]:
+        if self.current[metric].count >= ANOMALY_MIN_SAMPLES:
+            return self.current[metric]
+        if self.previous and self.previous[metric].count >= ANOMALY_MIN_SAMPLES:
+            return self.previous[metric]
+        return None
+
+    def add(self, values: Dict[str, float]):
+        if self.current[METRICS[0]].count >= ANOMALY_WINDOW:
+            self.previous = self.current
+            self.current = {m: RobustStats() for m in METRICS}
+        for metric in METRICS:
+            self.current[metric].add(values[metric])
+
+    def serialize(self) -> str:
+        state = {'current': {m: s.to_dict() for m, s in self.current.items()}}
+        if self.previous:
+            state['previous'] = {m: s.to_dict() for m, s in self.previous.items()}
+        return json.dumps(state, separators=(',', ':'))
+
+
+class AnomalyDetector:
+    """Scores debits against per-model sketches cached in memory and stored one item per model."""
+
+    def __init__(self, table: Any = None, clock=time.time):
+        self.table = table
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sketches: Dict[str, ModelSketch] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._dirty = set()
+
+    def observe(self, model: str, cost: float, seconds: float) -> Optional[str]:
+        """Score a debit against the model's history, then add it; returns the outlying metric."""
+        outlier = self.score(model, cost, seconds)
+        self.add(model, cost, seconds)
+        return outlier
+
+    def score(self, model: str, cost: float, seconds: float) -> Optional[str]:
+        """Score a debit against the model's history without adding it; returns the outlying metric."""
+        values = {'cost': float(cost), 'seconds': float(seconds)}
+        with self._lock:
+            sketch = self._sketch(model)
+            for metric in METRICS:
+                stats = sketch.scoring_stats(metric)
+                if stats is None:
+                    continue
+                z = stats.z_score(values[metric])
+                if z > ANOMALY_Z_THRESHOLD:
+                    logger.info(f"{model} {metric} {values[metric]:g} is {z:.1f} robust deviations "
+                                f"above the median {stats.median.value():g}")
+                    return metric
+        return None
+
+    def add(self, model: str, cost: float, seconds: float):
+        """Add a committed debit to the model's history."""
+        with self._lock:
+            self._sketch(model).add({'cost': float(cost), 'seconds': float(seconds)})
+            self._dirty.add(model)
+
+    def flush(self):
+        """Persist sketches changed since the last flush; last writer wins between containers."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            items = {model: self._sketches[model].serialize() for model in dirty}
+        if self.table is None:
+            return
+        for model, sketch in items.items():
+            try:
+                self.table.put_item(Item={
+                    'model': model,
+                    'sketch': sketch,
+                    'updatedAt': int(self.clock())
+                })
+            except Exception as e:
+                logger.error(f"Failed to persist anomaly sketch for {model}: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._sketches = {}
+            self._loaded_at = {}
+            self._dirty = set()
+
+    def _sketch(self, model: str) -> ModelSketch:
+        now = self.clock()
+        sketch = self._sketches.get(model)
+        stale = now - self._loaded_at.get(model, 0) >= ANOMALY_CACHE_SECONDS
+        if sketch is None or (stale and model not in self._dirty):
+            sketch = self._load(model) or sketch or ModelSketch()
+            self._sketches[model] = sketch
+            self._loaded_at[model] = now
+        return sketch
+
+    def _load(self, model: str) -> Optional[ModelSketch]:
+        if self.table is None:
+            return None
+        try:
+            item = self.table.get_item(Key={'model': model}).get('Item')
+        except Exception as e:
+            logger.error(f"Failed to load anomaly sketch for {model}: {e}")
+            return None
+        return ModelSketch(json.loads(item['sketch'])) if item else None
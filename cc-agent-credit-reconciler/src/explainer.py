@@ -0,0 +1,213 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger()
+
+# Written to the ledger entry until the explainer patches it
+ANOMALY_PLACEHOLDER = 'Anomaly detected - explanation pending'
+# invoke_llm's answer when the LLM is unavailable; never cached
+ANOMALY_FALLBACK = 'Anomaly detected - manual review recommended'
+
+# Explanations are reused for the same (model, cost bucket, reason) for this long
+EXPLANATION_CACHE_SECONDS = int(os.environ.get('EXPLANATION_CACHE_SECONDS', str(7 * 24 * 3600)))
+# Anomalies per LLM request
+EXPLAIN_BATCH_SIZE = int(os.environ.get('EXPLAIN_BATCH_SIZE', '20'))
+
+# SQS SendMessageBatch / DynamoDB BatchGetItem limits
+SQS_BATCH_SIZE = 10
+BATCH_GET_SIZE = 100
+
+
+def anomaly_signature(model: str, cost: Any, reason: str) -> str:
+    """Signature shared by anomalies one explanation covers; cost in powers-of-two buckets."""
+    cost = float(cost)
+    bucket = f"2^{math.floor(math.log2(cost))}" if cost > 0 else '0'
+    return f"{model}|{bucket}|{reason}"
+
+
+class AnomalyQueue:
+    """Buffers anomalies from one invocation and sends them to the explainer queue in batches."""
+
+    def __init__(self, sqs_client: Any, queue_url: Optional[str]):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.queue_url)
+
+    def add(self, ledger_item: Dict[str, Any], model: str, seconds: Any, reason: str):
+        with self._lock:
+            self._pending.append({
+                'ledgerId': ledger_item['ledgerId'],
+                'jobId': ledger_item['jobId'],
+                'model': model,
+                'cost': str(ledger_item['amount']),
+                'seconds': str(seconds),
+                'reason': reason,
+                'signature': anomaly_signature(model, ledger_item['amount'], reason)
+            })
+
+    def flush(self):
+        """Send buffered anomalies; entries that cannot be queued keep their placeholder."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for start in range(0, len(pending), SQS_BATCH_SIZE):
+            batch = pending[start:start + SQS_BATCH_SIZE]
+            try:
+                response = self.sqs.send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {'Id': str(i), 'MessageBody': json.dumps(anomaly)}
+                        for i, anomaly in enumerate(batch)
+                    ]
+                )
+                failed = response.get('Failed', [])
+            except Exception as e:
+                failed = batch
+                logger.error(f"Failed to queue anomaly explanations: {e}")
+            if failed:
+                logger.error(json.dumps({
+                    'level': 'error',
+                    'msg': 'Anomalies left unexplained',
+                    'count': len(failed)
+                }))
+
+
+class AnomalyExplainer:
+    """Explains queued anomalies with one LLM request per batch and patches the ledger."""
+
+    def __init__(self, llm: Callable[..., Optional[str]], ledger_table: Any,
+                 cache_table: Any = None, clock=time.time):
+        self.llm = llm
+        self.ledger_table = ledger_table
+        self.cache_table = cache_table
+        self.clock = clock
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    def process(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Handle an SQS batch; returns the partial batch response."""
+        anomalies = [(record['messageId'], json.loads(record['body'])) for record in records]
+        explanations = self.explain({a['signature']: a for _, a in anomalies})
+
+        failures = []
+        for message_id, anomaly in anomalies:
+            explanation = explanations.get(anomaly['signature'])
+            if explanation is None:
+                # LLM unavailable: retry later, the placeholder stays meanwhile
+                failures.append({'itemIdentifier': message_id})
+                continue
+            try:
+                self.patch_ledger(anomaly['ledgerId'], explanation)
+            except Exception as e:
+                logger.error(f"Failed to patch ledger entry {anomaly['ledgerId']}: {e}")
+                failures.append({'itemIdentifier': message_id})
+
+        logger.info(json.dumps({
+            'level': 'info',
+            'msg': 'Anomaly explanations processed',
+            'anomalies': len(anomalies),
+            'signatures': len(explanations),
+            'failed': len(failures)
+        }))
+        return {'batchItemFailures': failures}
+
+    def explain(self, by_signature: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Explanation per signature, from the cache or from batched LLM requests."""
+        explanations = self._cached(list(by_signature))
+        missing = [s for s in by_signature if s not in explanations]
+        for start in range(0, len(missing), EXPLAIN_BATCH_SIZE):
+            batch = [by_signature[s] for s in missing[start:start + EXPLAIN_BATCH_SIZE]]
+            fresh = self._ask(batch)
+            self._store(fresh)
+            explanations.update(fresh)
+        return explanations
+
+    def patch_ledger(self, ledger_id: str, explanation: str):
+        """Replace the placeholder; entries already explained or never written are left alone."""
+        try:
+            self.ledger_table.update_item(
+                Key={'ledgerId': ledger_id},
+                UpdateExpression='SET anomaly = :text',
+                ConditionExpression='attribute_exists(ledgerId) AND anomaly = :placeholder',
+                ExpressionAttributeValues={':text': explanation, ':placeholder': ANOMALY_PLACEHOLDER}
+            )
+        except self.ledger_table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Ledger entry {ledger_id} missing or already explained")
+
+    def _ask(self, anomalies: List[Dict[str, Any]]) -> Dict[str, str]:
+        lines = [
+            f"{i + 1}. model={a['model']}, cost=${a['cost']}, seconds={a['seconds']}, reason={a['reason']}"
+            for i, a in enumerate(anomalies)
+        ]
+        prompt = (
+            "Explain each of these video generation billing anomalies in ≤2 sentences. "
+            "Reply with only a JSON object mapping each number to its explanation.\n" + "\n".join(lines)
+        )
+        answer = self.llm(prompt, max_tokens=80 * len(anomalies))
+        if not answer or answer == ANOMALY_FALLBACK:
+            return {}
+        try:
+            parsed = json.loads(answer[answer.index('{'):answer.rindex('}') + 1])
+        except ValueError:
+            logger.warning(f"Unparseable anomaly explanations: {answer[:200]}")
+            return {}
+        return {
+            a['signature']: str(parsed[str(i + 1)]).strip()
+            for i, a in enumerate(anomalies)
+            if parsed.get(str(i + 1))
+        }
+
+    def _cached(self, signatures: List[str]) -> Dict[str, str]:
+        now = self.clock()
+        found = {
+            s: self._cache[s]['text'] for s in signatures
+            if s in self._cache and self._cache[s]['expiresAt'] > now
+        }
+        missing = [s for s in signatures if s not in found]
+        if self.cache_table is None or not missing:
+            return found
+
+        client = self.cache_table.meta.client
+        for start in range(0, len(missing), BATCH_GET_SIZE):
+            request = {self.cache_table.name: {
+                'Keys': [{'signature': s} for s in missing[start:start + BATCH_GET_SIZE]]
+            }}
+            try:
+                while request:
+                    response = client.batch_get_item(RequestItems=request)
+                    for item in response['Responses'].get(self.cache_table.name, []):
+                        if int(item['expiresAt']) > now:
+                            self._cache[item['signature']] = {
+                                'text': item['text'], 'expiresAt': int(item['expiresAt'])
+                            }
+                            found[item['signature']] = item['text']
+                    request = response.get('UnprocessedKeys')
+            except Exception as e:
+                logger.error(f"Failed to read explanation cache: {e}")
+        return found
+
+    def _store(self, explanations: Dict[str, str]):
+        expires_at = int(self.clock()) + EXPLANATION_CACHE_SECONDS
+        for signature, text in explanations.items():
+            self._cache[signature] = {'text': text, 'expiresAt': expires_at}
+        if self.cache_table is None or not explanations:
+            return
+        try:
+            with self.cache_table.batch_writer() as batch:
+                for signature, text in explanations.items():
+                    batch.put_item(Item={
+                        'signature': signature,
+                        'text': text,
+                        'expiresAt': Decimal(expires_at)
+                    })
+        except Exception as e:
+            logger.error(f"Failed to write explanation cache: {e}")
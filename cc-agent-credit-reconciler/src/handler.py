@@ -1,16 +1,24 @@
 import os
 import json
 import time
+import zlib
 import boto3
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
+import concurrent.futures
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 import sys
 sys.path.insert(0, '/opt')  # For Lambda layer
 from secrets_manager import secrets_manager
+from outcome_counters import OutcomeCounter
+from pricing import PricingCache
+from anomaly import AnomalyDetector
+from explainer import AnomalyQueue, AnomalyExplainer, ANOMALY_PLACEHOLDER
+from ledger_audit import LedgerAuditor
 
 # Initialize logging
 logger = logging.getLogger()
@@ -20,15 +28,66 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource('dynamodb')
 cloudwatch = boto3.client('cloudwatch')
 ssm = boto3.client('ssm')
+sqs = boto3.client('sqs')
+lambda_client = boto3.client('lambda')
 
 # Table names from environment
 JOBS_TABLE = os.environ.get('JOBS_TABLE', 'Jobs')
 CREDITS_TABLE = os.environ.get('CREDITS_TABLE', 'Credits')
 LEDGER_TABLE = os.environ.get('LEDGER_TABLE', 'Ledger')
+CHECKPOINTS_TABLE = os.environ.get('CHECKPOINTS_TABLE', 'LedgerCheckpoints')
+
+# Sparse GSI on Jobs: only jobs awaiting reconciliation carry reconcilePending.
+# The stream handler sets it on every transition to completed/failed.
+UNRECONCILED_INDEX = os.environ.get('UNRECONCILED_INDEX', 'UnreconciledIndex')
+RECONCILABLE_STATUSES = ('completed', 'failed')
+# Index keys are "<status>#<shard>", so a backlog of one status spreads over several partitions
+RECONCILE_INDEX_SHARDS = int(os.environ.get('RECONCILE_INDEX_SHARDS', '8'))
+# Paths that rebuild events from Jobs items rather than receiving them
+JOB_TABLE_SOURCES = ('stream', 'sweep')
+# Parallel segments for the scan fallback (tables without the index)
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+
+# SQS intake: events handled at once per batch (one user's events stay in order)
+INTAKE_CONCURRENCY = int(os.environ.get('INTAKE_CONCURRENCY', '8'))
+
+# Timer scan cursor and counters, so a sweep can span invocations (one pass without it)
+SWEEP_STATE_TABLE = os.environ.get('SWEEP_STATE_TABLE')
+SWEEP_ID = 'timer-scan'
+# Time kept in reserve on top of two of the slowest pages so far (ms)
+SWEEP_SAFETY_MS = int(os.environ.get('SWEEP_SAFETY_MS', '10000'))
+# A running sweep not saved for this long has lost its continuation (seconds)
+SWEEP_STALE_SECONDS = int(os.environ.get('SWEEP_STALE_SECONDS', '900'))
+
+# Jobs per batch reconciliation page
+RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', '100'))
+# BatchGetItem reads at most 100 keys; TransactWriteItems takes at most 100 actions
+BATCH_GET_SIZE = 100
+TRANSACT_MAX_ACTIONS = 100
+
+# Model prices, loaded once per container from /fertilia/pricing/
+pricing_cache = PricingCache(ssm)
+
+# Per-model cost/duration sketches for anomaly detection (in-memory only without a table)
+ANOMALY_TABLE = os.environ.get('ANOMALY_TABLE')
+anomaly_detector = AnomalyDetector(dynamodb.Table(ANOMALY_TABLE) if ANOMALY_TABLE else None)
 
 # LLM model configuration
 LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4.1')
 
+# Anomaly explanations are produced off the debit path; without a queue they are inline
+ANOMALY_QUEUE_URL = os.environ.get('ANOMALY_QUEUE_URL')
+EXPLANATIONS_TABLE = os.environ.get('EXPLANATIONS_TABLE')
+anomaly_queue = AnomalyQueue(sqs, ANOMALY_QUEUE_URL)
+
+# Minute-bucketed success/error counters read by the routing manager's health monitor
+AGENT_ID = os.environ.get('AGENT_ID', 'credit-reconciler')
+AGENT_OUTCOMES_TABLE = os.environ.get('AGENT_OUTCOMES_TABLE')
+outcome_counter = OutcomeCounter(
+    dynamodb.Table(AGENT_OUTCOMES_TABLE) if AGENT_OUTCOMES_TABLE else None,
+    AGENT_ID
+)
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Main Lambda handler that routes events to appropriate processors."""
@@ -42,18 +101,34 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }))
         
         # Route based on event type
-        if event.get('source') == 'aws.events' and event.get('detail-type'):
+        records = event.get('Records') or []
+        if records and records[0].get('eventSource') == 'aws:dynamodb':
+            # Jobs table stream batch (one shard)
+            return handle_jobs_stream(records)
+        elif records and records[0].get('eventSource') == 'aws:sqs':
+            # Buffered video.rendered / video.failed events from the intake queue
+            return handle_intake_batch(records)
+        elif event.get('source') == 'aws.events' and 'Scheduled Event' in event.get('detail-type', ''):
+            # Scheduled timer scan
+            return handle_timer_scan(event, context)
+        elif event.get('source') == 'aws.events' and event.get('detail-type'):
             # EventBridge events
             detail_type = event['detail-type']
             detail = event.get('detail', {})
             
             if detail_type == 'video.rendered':
-                return handle_video_rendered(detail)
+                return record_outcome(handle_video_rendered(detail))
             elif detail_type == 'video.failed':
-                return handle_video_failed(detail)
-        elif event.get('source') == 'aws.events' and 'Scheduled Event' in event.get('detail-type', ''):
-            # Scheduled timer scan
-            return handle_timer_scan()
+                return record_outcome(handle_video_failed(detail))
+        elif event.get('source') == 'aws.ssm':
+            # Pricing parameter changed
+            return handle_pricing_change(event.get('detail', {}))
+        elif event.get('action') == 'continue_sweep':
+            # Timer scan handing over to itself before its time budget ran out
+            return handle_timer_scan(event, context)
+        elif event.get('action') == 'audit_ledger':
+            # Scheduled checkpoint and balance audit (LedgerAuditFunction)
+            return handle_ledger_audit(event)
         else:
             logger.warning(f"Unhandled event type: {event.get('source')}")
             
@@ -69,8 +144,116 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'error': str(e),
             'event': event
         }))
+        outcome_counter.record(False)
         # Let it bubble up to DLQ
         raise
+    finally:
+        # One write per model touched by this invocation
+        anomaly_detector.flush()
+        anomaly_queue.flush()
+        outcome_counter.flush()
+
+
+def record_outcome(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Count an event's result: 200 succeeded, 5xx failed, malformed events are neither."""
+    if result['statusCode'] == 200:
+        outcome_counter.record(True)
+    elif result['statusCode'] >= 500:
+        outcome_counter.record(False)
+    return result
+
+
+def explain_anomalies_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Explain queued anomalies in batched LLM requests and patch their ledger entries."""
+    explainer = AnomalyExplainer(
+        invoke_llm,
+        dynamodb.Table(LEDGER_TABLE),
+        dynamodb.Table(EXPLANATIONS_TABLE) if EXPLANATIONS_TABLE else None
+    )
+    return explainer.process(event.get('Records', []))
+
+
+def handle_intake_batch(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Handle an SQS batch of EventBridge events; returns the partial batch response.
+    
+    Users are processed concurrently, each user's events one at a time in
+    queue order, so debits to one balance never contend with each other.
+    """
+    started = time.monotonic()
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        try:
+            user_id = json.loads(record['body']).get('detail', {}).get('userId')
+        except (ValueError, AttributeError):
+            user_id = None
+        by_user.setdefault(user_id or record['messageId'], []).append(record)
+    
+    def process_user(user_records: List[Dict[str, Any]]) -> List[str]:
+        failed = []
+        for record in user_records:
+            if failed:
+                # Keep the user's later events behind the failed one
+                failed.append(record['messageId'])
+                continue
+            if not process_intake_record(record):
+                failed.append(record['messageId'])
+        return failed
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=INTAKE_CONCURRENCY) as executor:
+        failed_by_user = list(executor.map(process_user, by_user.values()))
+    failures = [message_id for failed in failed_by_user for message_id in failed]
+    # One error per user whose events stopped; the events held behind it did not fail
+    outcome_counter.record(True, len(records) - len(failures))
+    outcome_counter.record(False, sum(1 for failed in failed_by_user if failed))
+    
+    elapsed = time.monotonic() - started
+    # Oldest message in the batch, from its first send to the end of processing
+    sent = [int(r['attributes']['SentTimestamp']) for r in records if 'SentTimestamp' in r.get('attributes', {})]
+    queued_ms = time.time() * 1000 - min(sent) if sent else 0
+    emit_metrics([
+        ('IntakeBatchSize', len(records), 'Count'),
+        ('IntakeBatchDuration', elapsed * 1000, 'Milliseconds'),
+        ('IntakeThroughput', len(records) / elapsed if elapsed > 0 else 0, 'Count/Second'),
+        ('IntakeFailures', len(failures), 'Count'),
+        ('IntakeQueueLatency', queued_ms, 'Milliseconds')
+    ])
+    logger.info(json.dumps({
+        'level': 'info',
+        'msg': 'Intake batch completed',
+        'records': len(records),
+        'users': len(by_user),
+        'failed': len(failures),
+        'durationMs': round(elapsed * 1000)
+    }))
+    
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
+
+def process_intake_record(record: Dict[str, Any]) -> bool:
+    """Apply one queued event; False if it should be retried."""
+    try:
+        event = json.loads(record['body'])
+        detail_type = event.get('detail-type')
+        if detail_type == 'video.rendered':
+            result = handle_video_rendered(event.get('detail', {}))
+        elif detail_type == 'video.failed':
+            result = handle_video_failed(event.get('detail', {}))
+        else:
+            logger.warning(f"Dropping intake message {record['messageId']} with detail-type {detail_type}")
+            return True
+    except Exception as e:
+        logger.error(json.dumps({
+            'level': 'error',
+            'msg': 'Intake event failed',
+            'messageId': record['messageId'],
+            'error': str(e)
+        }))
+        return False
+    
+    if result['statusCode'] != 200:
+        # Malformed events cannot succeed on retry
+        logger.warning(f"Dropping intake message {record['messageId']}: {result['body']}")
+    return True
 
 
 def handle_video_rendered(detail: Dict[str, Any]) -> Dict[str, Any]:
@@ -85,73 +268,15 @@ def handle_video_rendered(detail: Dict[str, Any]) -> Dict[str, Any]:
         return {'statusCode': 400, 'body': 'Missing required fields'}
     
     try:
-        # Check if already processed (idempotent)
-        ledger_table = dynamodb.Table(LEDGER_TABLE)
-        existing = ledger_table.query(
-            IndexName='JobIdIndex',  # Assuming we have a GSI on jobId
-            KeyConditionExpression=Key('jobId').eq(job_id),
-            FilterExpression=Attr('type').eq('debit')
-        )
+        ledger_item, reason = build_debit_entry(job_id, user_id, seconds, model, detail)
+        cost = ledger_item['amount']
         
-        if existing['Count'] > 0:
+        # Ledger entry, balance decrement and reconciled flag in one transaction.
+        # The job condition also catches jobs debited under the old ledger keys.
+        if not reconcile_transaction(ledger_item, -cost, job_condition=DEBIT_JOB_CONDITION):
             logger.info(f"Job {job_id} already debited, skipping")
             return {'statusCode': 200, 'body': 'Already processed'}
-        
-        # Get pricing from SSM Parameter Store
-        price_per_second = get_model_price(model)
-        cost = Decimal(str(seconds)) * Decimal(str(price_per_second))
-        
-        # Create ledger entry
-        timestamp = datetime.utcnow().isoformat()
-        ledger_id = f"{user_id}#{timestamp}#{job_id}"
-        
-        ledger_item = {
-            'ledgerId': ledger_id,
-            'userId': user_id,
-            'timestamp': timestamp,
-            'type': 'debit',
-            'amount': cost,
-            'reference': job_id,
-            'jobId': job_id,  # For GSI
-            'description': f'Video generation - {seconds}s @ {model}'
-        }
-        
-        # Check for anomalies before processing
-        if is_anomaly(cost, seconds, detail):
-            anomaly_msg = invoke_llm(
-                f"Explain this video generation anomaly in ≤2 sentences: "
-                f"cost=${cost}, seconds={seconds}, model={model}, "
-                f"jobId={job_id}"
-            )
-            ledger_item['anomaly'] = anomaly_msg
-            logger.warning(json.dumps({
-                'level': 'warning',
-                'msg': 'Anomaly detected',
-                'jobId': job_id,
-                'userId': user_id,
-                'cost': float(cost),
-                'anomaly': anomaly_msg
-            }))
-        
-        # Write to ledger
-        ledger_table.put_item(Item=ledger_item)
-        
-        # Update user credits (atomic decrement)
-        credits_table = dynamodb.Table(CREDITS_TABLE)
-        response = credits_table.update_item(
-            Key={'userId': user_id},
-            UpdateExpression='SET remaining = remaining - :cost',
-            ExpressionAttributeValues={':cost': cost},
-            ReturnValues='ALL_NEW'
-        )
-        
-        # Update job reconciliation status
-        jobs_table = dynamodb.Table(JOBS_TABLE)
-        jobs_table.update_item(
-            Key={'jobId': job_id},
-            UpdateExpression='SET reconciled = :true',
-            ExpressionAttributeValues={':true': True}
-        )
+        record_debit(ledger_item, model, seconds, reason)
         
         # Emit metric
         emit_metric('Adjustments', 1, 'Count')
@@ -161,16 +286,14 @@ def handle_video_rendered(detail: Dict[str, Any]) -> Dict[str, Any]:
             'msg': 'Credit debited',
             'jobId': job_id,
             'userId': user_id,
-            'cost': float(cost),
-            'remaining': float(response['Attributes']['remaining'])
+            'cost': float(cost)
         }))
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Credit debited',
-                'cost': float(cost),
-                'remaining': float(response['Attributes']['remaining'])
+                'cost': float(cost)
             })
         }
         
@@ -192,66 +315,41 @@ def handle_video_failed(detail: Dict[str, Any]) -> Dict[str, Any]:
         return {'statusCode': 400, 'body': 'Missing required fields'}
     
     try:
-        # Find the original debit
+        # Find the original debit by its deterministic key
         ledger_table = dynamodb.Table(LEDGER_TABLE)
-        debits = ledger_table.query(
-            IndexName='JobIdIndex',
-            KeyConditionExpression=Key('jobId').eq(job_id),
-            FilterExpression=Attr('type').eq('debit')
-        )
-        
-        if debits['Count'] == 0:
-            logger.info(f"No debit found for failed job {job_id}")
-            return {'statusCode': 200, 'body': 'No debit to refund'}
-        
-        # Check if already refunded
-        refunds = ledger_table.query(
-            IndexName='JobIdIndex',
-            KeyConditionExpression=Key('jobId').eq(job_id),
-            FilterExpression=Attr('type').eq('credit')
-        )
+        original_debit = ledger_table.get_item(
+            Key={'ledgerId': ledger_key(job_id, 'debit')},
+            ConsistentRead=True
+        ).get('Item')
         
-        if refunds['Count'] > 0:
-            logger.info(f"Job {job_id} already refunded")
-            return {'statusCode': 200, 'body': 'Already refunded'}
+        if original_debit is None:
+            # Entries written before deterministic keys are only reachable by jobId
+            entries = ledger_table.query(
+                IndexName='JobIdIndex',
+                KeyConditionExpression=Key('jobId').eq(job_id)
+            )['Items']
+            debits = [item for item in entries if item.get('type') == 'debit']
+            
+            if not debits:
+                logger.info(f"No debit found for failed job {job_id}")
+                settle_failed_job(job_id)
+                return {'statusCode': 200, 'body': 'No debit to refund'}
+            
+            if any(item.get('type') == 'credit' for item in entries):
+                logger.info(f"Job {job_id} already refunded")
+                settle_failed_job(job_id)
+                return {'statusCode': 200, 'body': 'Already refunded'}
+            
+            original_debit = debits[0]
         
         # Process refund
-        original_debit = debits['Items'][0]
         refund_amount = original_debit['amount']
+        refund_item = build_refund_entry(job_id, user_id, refund_amount)
         
-        # Create refund ledger entry
-        timestamp = datetime.utcnow().isoformat()
-        ledger_id = f"{user_id}#{timestamp}#{job_id}#refund"
-        
-        refund_item = {
-            'ledgerId': ledger_id,
-            'userId': user_id,
-            'timestamp': timestamp,
-            'type': 'credit',
-            'amount': refund_amount,
-            'reference': job_id,
-            'jobId': job_id,
-            'description': f'Refund for failed job {job_id}'
-        }
-        
-        ledger_table.put_item(Item=refund_item)
-        
-        # Update user credits (atomic increment)
-        credits_table = dynamodb.Table(CREDITS_TABLE)
-        response = credits_table.update_item(
-            Key={'userId': user_id},
-            UpdateExpression='SET remaining = remaining + :amount',
-            ExpressionAttributeValues={':amount': refund_amount},
-            ReturnValues='ALL_NEW'
-        )
-        
-        # Update job reconciliation status
-        jobs_table = dynamodb.Table(JOBS_TABLE)
-        jobs_table.update_item(
-            Key={'jobId': job_id},
-            UpdateExpression='SET reconciled = :true',
-            ExpressionAttributeValues={':true': True}
-        )
+        if not reconcile_transaction(refund_item, refund_amount):
+            logger.info(f"Job {job_id} already refunded")
+            settle_failed_job(job_id)
+            return {'statusCode': 200, 'body': 'Already refunded'}
         
         # Emit metric
         emit_metric('Adjustments', 1, 'Count')
@@ -261,16 +359,14 @@ def handle_video_failed(detail: Dict[str, Any]) -> Dict[str, Any]:
             'msg': 'Credit refunded',
             'jobId': job_id,
             'userId': user_id,
-            'refund': float(refund_amount),
-            'remaining': float(response['Attributes']['remaining'])
+            'refund': float(refund_amount)
         }))
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Credit refunded',
-                'refund': float(refund_amount),
-                'remaining': float(response['Attributes']['remaining'])
+                'refund': float(refund_amount)
             })
         }
         
@@ -282,95 +378,258 @@ def handle_video_failed(detail: Dict[str, Any]) -> Dict[str, Any]:
         raise
 
 
-def handle_timer_scan() -> Dict[str, Any]:
-    """Scan for unreconciled completed/failed jobs and process them."""
-    try:
-        jobs_table = dynamodb.Table(JOBS_TABLE)
-        
-        # Scan for unreconciled jobs
-        response = jobs_table.scan(
-            FilterExpression=(
-                Attr('status').is_in(['completed', 'failed']) & 
-                (Attr('reconciled').eq(False) | Attr('reconciled').not_exists())
+def ledger_key(job_id: str, entry: str) -> str:
+    """Deterministic ledger key for a job's debit or refund entry."""
+    return f"{job_id}#{entry}"
+
+
+def build_debit_entry(job_id: str, user_id: str, seconds: Any, model: str,
+                      detail: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Price a completed job and build its debit ledger entry, flagging anomalies.
+    
+    Returns the entry and its anomaly reason, for record_debit once the entry commits.
+    """
+    # Get pricing from the cached SSM pricing table
+    price_per_second = get_model_price(model)
+    cost = Decimal(str(seconds)) * Decimal(str(price_per_second))
+    
+    # The key is deterministic so a replay collides
+    ledger_item = {
+        'ledgerId': ledger_key(job_id, 'debit'),
+        'userId': user_id,
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'debit',
+        'amount': cost,
+        'reference': job_id,
+        'jobId': job_id,  # For GSI
+        'description': f'Video generation - {seconds}s @ {model}'
+    }
+    
+    # Check for anomalies before processing
+    reason = anomaly_reason(cost, seconds, detail, model)
+    if reason:
+        if anomaly_queue.enabled:
+            # Explained in the background once committed; the explainer replaces the placeholder
+            anomaly_msg = ANOMALY_PLACEHOLDER
+        else:
+            anomaly_msg = invoke_llm(
+                f"Explain this video generation anomaly in ≤2 sentences: "
+                f"cost=${cost}, seconds={seconds}, model={model}, "
+                f"jobId={job_id}"
             )
+        ledger_item['anomaly'] = anomaly_msg
+        logger.warning(json.dumps({
+            'level': 'warning',
+            'msg': 'Anomaly detected',
+            'jobId': job_id,
+            'userId': user_id,
+            'cost': float(cost),
+            'anomaly': anomaly_msg
+        }))
+    
+    return ledger_item, reason
+
+
+def record_debit(ledger_item: Dict[str, Any], model: str, seconds: Any, reason: Optional[str]):
+    """Add a committed debit to its model's history and queue its explanation.
+    
+    Replays and cancelled writes never get here.
+    """
+    anomaly_detector.add(model, ledger_item['amount'], seconds)
+    if reason and anomaly_queue.enabled:
+        anomaly_queue.add(ledger_item, model, seconds, reason)
+
+
+def build_refund_entry(job_id: str, user_id: str, amount: Decimal) -> Dict[str, Any]:
+    """Build the refund ledger entry for a failed job."""
+    return {
+        'ledgerId': ledger_key(job_id, 'refund'),
+        'userId': user_id,
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'credit',
+        'amount': amount,
+        'reference': job_id,
+        'jobId': job_id,
+        'description': f'Refund for failed job {job_id}'
+    }
+
+
+# Only debits guard on the job: it catches jobs debited under the old ledger keys
+DEBIT_JOB_CONDITION = 'attribute_not_exists(reconciled) OR reconciled = :false'
+
+
+def ledger_put_action(ledger_item: Dict[str, Any]) -> Dict[str, Any]:
+    """Transaction action writing a ledger entry exactly once."""
+    return {'Put': {
+        'TableName': LEDGER_TABLE,
+        'Item': ledger_item,
+        'ConditionExpression': 'attribute_not_exists(ledgerId)'
+    }}
+
+
+def balance_update_action(user_id: str, delta: Decimal) -> Dict[str, Any]:
+    """Transaction action adding delta to a user's remaining credits."""
+    return {'Update': {
+        'TableName': CREDITS_TABLE,
+        'Key': {'userId': user_id},
+        'UpdateExpression': 'SET remaining = remaining + :delta',
+        'ExpressionAttributeValues': {':delta': delta}
+    }}
+
+
+def job_reconciled_action(job_id: str, condition: Optional[str] = None) -> Dict[str, Any]:
+    """Transaction action marking a job reconciled and dropping it from the sparse index."""
+    job_update = {
+        'TableName': JOBS_TABLE,
+        'Key': {'jobId': job_id},
+        'UpdateExpression': 'SET reconciled = :true REMOVE reconcilePending',
+        'ExpressionAttributeValues': {':true': True}
+    }
+    if condition:
+        job_update['ConditionExpression'] = condition
+        job_update['ExpressionAttributeValues'][':false'] = False
+    return {'Update': job_update}
+
+
+def settle_failed_job(job_id: str) -> bool:
+    """Mark a failed job with nothing (left) to refund reconciled; False if it is not a failed job."""
+    try:
+        dynamodb.Table(JOBS_TABLE).update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='SET reconciled = :true REMOVE reconcilePending',
+            ConditionExpression='#status = :failed',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':true': True, ':failed': 'failed'}
         )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def reconcile_transaction(ledger_item: Dict[str, Any], delta: Decimal,
+                          job_condition: Optional[str] = None) -> bool:
+    """Write a ledger entry, adjust the balance and mark the job reconciled atomically.
+    
+    Returns False when the ledger entry already exists (or job_condition fails).
+    """
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            ledger_put_action(ledger_item),
+            balance_update_action(ledger_item['userId'], delta),
+            job_reconciled_action(ledger_item['jobId'], job_condition)
+        ])
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [r.get('Code') for r in e.response.get('CancellationReasons', [])]
+        # Items 0 (ledger) and 2 (job) carry the idempotency conditions
+        if 'ConditionalCheckFailed' in (reasons[0:1] + reasons[2:3]):
+            return False
+        raise
+
+
+def handle_ledger_audit(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Advance ledger checkpoints and compare every balance with its ledger."""
+    auditor = LedgerAuditor(
+        dynamodb.Table(LEDGER_TABLE),
+        dynamodb.Table(CREDITS_TABLE),
+        dynamodb.Table(CHECKPOINTS_TABLE)
+    )
+    report = auditor.audit_all(checkpoint=event.get('checkpoint', True))
+    
+    emit_metric('BalanceDrift', report['drifting'], 'Count')
+    if report['drifting']:
+        logger.warning(json.dumps({
+            'level': 'warning',
+            'msg': 'Balance drift detected',
+            'drifting': report['drifting'],
+            'users': report['drift']
+        }))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Ledger audit completed',
+            'users': report['users'],
+            'drifting': report['drifting'],
+            'checkpointed': report['checkpointed'],
+            'errors': report['errors']
+        })
+    }
+
+
+def handle_timer_scan(event: Optional[Dict[str, Any]] = None, context: Any = None) -> Dict[str, Any]:
+    """Find unreconciled completed/failed jobs and process them, page by page.
+    
+    With a sweep state table and a Lambda context, the sweep stops before the
+    time budget runs out, saves its cursor and counters, and re-invokes the
+    function asynchronously to continue from there.
+    """
+    try:
+        event = event or {}
+        remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+        sweep_table = dynamodb.Table(SWEEP_STATE_TABLE) if SWEEP_STATE_TABLE else None
+        if sweep_table is None:
+            remaining_ms = None
         
-        processed_count = 0
-        error_count = 0
+        sweep = start_sweep(sweep_table, event)
+        if sweep is None:
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Timer scan skipped', 'sweepId': event.get('sweepId', SWEEP_ID)})
+            }
         
-        for job in response['Items']:
-            try:
-                if job['status'] == 'completed':
-                    # Simulate video.rendered event
-                    result = handle_video_rendered({
-                        'jobId': job['jobId'],
-                        'userId': job['userId'],
-                        'seconds': job.get('seconds', 0),
-                        'model': job.get('model', 'default')
-                    })
-                elif job['status'] == 'failed':
-                    # Simulate video.failed event
-                    result = handle_video_failed({
-                        'jobId': job['jobId'],
-                        'userId': job['userId']
-                    })
-                
-                if result['statusCode'] == 200:
-                    processed_count += 1
-                else:
-                    error_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error processing job {job['jobId']}: {e}")
-                error_count += 1
+        pages = unreconciled_pages(sweep['cursor'])
+        slowest_page_ms = 0
+        finished = False
+        while True:
+            if remaining_ms and remaining_ms() < 2 * slowest_page_ms + SWEEP_SAFETY_MS:
+                break
+            started = time.monotonic()
+            page = next(pages, None)
+            if page is None:
+                finished = True
+                break
+            jobs, cursor = page
+            processed, errors = reconcile_jobs_batch(jobs) if jobs else (0, 0)
+            sweep['processed'] += processed
+            sweep['errors'] += errors
+            sweep['cursor'] = cursor
+            slowest_page_ms = max(slowest_page_ms, (time.monotonic() - started) * 1000)
+            if not save_sweep(sweep_table, sweep):
+                # Another invocation took the sweep over; it carries on from its own cursor
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({'message': 'Timer scan superseded', 'sweepId': sweep['sweepId']})
+                }
         
-        # Handle pagination if needed
-        while 'LastEvaluatedKey' in response:
-            response = jobs_table.scan(
-                FilterExpression=(
-                    Attr('status').is_in(['completed', 'failed']) & 
-                    (Attr('reconciled').eq(False) | Attr('reconciled').not_exists())
-                ),
-                ExclusiveStartKey=response['LastEvaluatedKey']
-            )
-            
-            for job in response['Items']:
-                try:
-                    if job['status'] == 'completed':
-                        result = handle_video_rendered({
-                            'jobId': job['jobId'],
-                            'userId': job['userId'],
-                            'seconds': job.get('seconds', 0),
-                            'model': job.get('model', 'default')
-                        })
-                    elif job['status'] == 'failed':
-                        result = handle_video_failed({
-                            'jobId': job['jobId'],
-                            'userId': job['userId']
-                        })
-                    
-                    if result['statusCode'] == 200:
-                        processed_count += 1
-                    else:
-                        error_count += 1
-                        
-                except Exception as e:
-                    logger.error(f"Error processing job {job['jobId']}: {e}")
-                    error_count += 1
+        sweep['status'] = 'completed' if finished else 'running'
+        if not finished:
+            sweep['invocations'] += 1
+        if save_sweep(sweep_table, sweep) and not finished:
+            continue_sweep(context, sweep)
         
+        message = 'Timer scan completed' if finished else 'Timer scan continuing'
         logger.info(json.dumps({
             'level': 'info',
-            'msg': 'Timer scan completed',
-            'processed': processed_count,
-            'errors': error_count
+            'msg': message,
+            'sweepId': sweep['sweepId'],
+            'processed': sweep['processed'],
+            'errors': sweep['errors'],
+            'invocations': sweep['invocations']
         }))
         
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'Timer scan completed',
-                'processed': processed_count,
-                'errors': error_count
+                'message': message,
+                'sweepId': sweep['sweepId'],
+                'processed': sweep['processed'],
+                'errors': sweep['errors'],
+                'invocations': sweep['invocations']
             })
         }
         
@@ -379,41 +638,487 @@ def handle_timer_scan() -> Dict[str, Any]:
         raise
 
 
-def get_model_price(model: str) -> float:
-    """Get the price per second for a given model from SSM Parameter Store."""
+def start_sweep(sweep_table, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Load the sweep to continue, or start a new one; None when another invocation owns it."""
+    sweep_id = event.get('sweepId', SWEEP_ID)
+    fresh = {
+        'sweepId': sweep_id,
+        'status': 'running',
+        'cursor': None,
+        'processed': 0,
+        'errors': 0,
+        'invocations': 1,
+        'version': 0
+    }
+    if sweep_table is None:
+        return fresh
+    
+    item = sweep_table.get_item(Key={'sweepId': sweep_id}, ConsistentRead=True).get('Item')
+    if event.get('action') == 'continue_sweep':
+        # Only the continuation the last save handed off to may resume
+        if not item or item['status'] != 'running' or int(item['version']) != int(event.get('version', -1)):
+            logger.info(f"Sweep {sweep_id} continuation is stale, skipping")
+            return None
+    elif item and item['status'] == 'running':
+        if time.time() - int(item['updatedAt']) < SWEEP_STALE_SECONDS:
+            logger.info(f"Sweep {sweep_id} is still running, skipping scheduled start")
+            return None
+        # The continuation chain broke (invoke failed, function crashed); pick it up
+        logger.warning(json.dumps({
+            'level': 'warning',
+            'msg': 'Resuming stalled sweep',
+            'sweepId': sweep_id,
+            'processed': int(item['processed'])
+        }))
+    else:
+        fresh['version'] = int(item['version']) if item else 0
+        return fresh
+    
+    return {
+        'sweepId': sweep_id,
+        'status': 'running',
+        'cursor': json.loads(item['cursor']) if item.get('cursor') else None,
+        'processed': int(item['processed']),
+        'errors': int(item['errors']),
+        'invocations': int(item['invocations']),
+        'version': int(item['version'])
+    }
+
+
+def save_sweep(sweep_table, sweep: Dict[str, Any]) -> bool:
+    """Persist the sweep cursor and counters; False if another invocation saved in between."""
+    if sweep_table is None:
+        return True
     try:
-        parameter_name = f"/fertilia/pricing/{model}"
-        response = ssm.get_parameter(Name=parameter_name)
-        return float(response['Parameter']['Value'])
+        sweep_table.put_item(
+            Item={
+                'sweepId': sweep['sweepId'],
+                'status': sweep['status'],
+                'cursor': json.dumps(sweep['cursor']) if sweep['cursor'] else '',
+                'processed': sweep['processed'],
+                'errors': sweep['errors'],
+                'invocations': sweep['invocations'],
+                'version': sweep['version'] + 1,
+                'updatedAt': int(time.time())
+            },
+            ConditionExpression='attribute_not_exists(sweepId) OR version = :version',
+            ExpressionAttributeValues={':version': sweep['version']}
+        )
     except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            # Default pricing if model not found
-            logger.warning(f"Price not found for model {model}, using default")
-            return 0.10  # Default $0.10 per second
-        raise
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.warning(f"Sweep {sweep['sweepId']} was saved by another invocation")
+        return False
+    sweep['version'] += 1
+    return True
+
+
+def continue_sweep(context: Any, sweep: Dict[str, Any]):
+    """Re-invoke this function asynchronously to continue the sweep."""
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps({
+            'action': 'continue_sweep',
+            'sweepId': sweep['sweepId'],
+            'version': sweep['version']
+        })
+    )
+
+
+def reconcile_jobs_batch(jobs: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Reconcile a page of jobs with one ledger read and one transaction per user.
+    
+    Returns (processed, errors) counted per job.
+    """
+    processed_count = 0
+    error_count = 0
+    
+    candidates = []
+    for job in jobs:
+        if not job.get('userId') or (job['status'] == 'completed' and not job.get('seconds')):
+            logger.error(f"Missing required fields for job {job['jobId']}")
+            error_count += 1
+        else:
+            candidates.append(job)
+    
+    # Which debits/refunds already exist, by deterministic key
+    keys = [ledger_key(job['jobId'], 'debit') for job in candidates]
+    keys += [ledger_key(job['jobId'], 'refund') for job in candidates if job['status'] != 'completed']
+    existing = get_ledger_entries(keys)
+    
+    # Net every user's adjustments: user -> [(job, ledger entry or None, job condition)]
+    work_by_user: Dict[str, List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]]] = {}
+    # Job -> anomaly reason of its new debit, queued once the debit commits
+    reasons: Dict[str, Optional[str]] = {}
+    per_job = []
+    for job in candidates:
+        job_id = job['jobId']
+        user_id = job['userId']
+        try:
+            if job['status'] == 'completed':
+                entry = None
+                if ledger_key(job_id, 'debit') not in existing:
+                    entry, reasons[job_id] = build_debit_entry(
+                        job_id, user_id, job['seconds'], job.get('model', 'default'),
+                        {'result_url': job.get('result_url'), 'source': 'sweep'}
+                    )
+                work_by_user.setdefault(user_id, []).append((job, entry, DEBIT_JOB_CONDITION))
+            else:
+                debit = existing.get(ledger_key(job_id, 'debit'))
+                if debit is None:
+                    # Old-style ledger keys (or nothing to refund): per-job path
+                    per_job.append(job)
+                    continue
+                entry = None
+                if ledger_key(job_id, 'refund') not in existing:
+                    entry = build_refund_entry(job_id, user_id, debit['amount'])
+                work_by_user.setdefault(user_id, []).append((job, entry, None))
+        except Exception as e:
+            logger.error(f"Error processing job {job_id}: {e}")
+            error_count += 1
+    
+    # Each job needs a ledger put and a job update; one balance update per chunk
+    jobs_per_transaction = (TRANSACT_MAX_ACTIONS - 1) // 2
+    adjustments = 0
+    for user_id, work in work_by_user.items():
+        for start in range(0, len(work), jobs_per_transaction):
+            chunk = work[start:start + jobs_per_transaction]
+            try:
+                write_user_batch(user_id, chunk)
+                for job, entry, _ in chunk:
+                    if entry and entry['type'] == 'debit':
+                        record_debit(entry, job.get('model', 'default'), job['seconds'],
+                                     reasons[job['jobId']])
+                processed_count += len(chunk)
+                adjustments += sum(1 for _, entry, _ in chunk if entry)
+            except ClientError as e:
+                # A concurrent reconciliation or bad balance row: retry job by job
+                logger.warning(json.dumps({
+                    'level': 'warning',
+                    'msg': 'Batch transaction failed, reconciling jobs individually',
+                    'userId': user_id,
+                    'jobs': len(chunk),
+                    'error': str(e)
+                }))
+                per_job.extend(job for job, _, _ in chunk)
+    
+    if adjustments:
+        emit_metric('Adjustments', adjustments, 'Count')
+    
+    for job in per_job:
+        try:
+            result = reconcile_job(job)
+            
+            if result['statusCode'] == 200:
+                processed_count += 1
+            else:
+                error_count += 1
+                
+        except Exception as e:
+            logger.error(f"Error processing job {job['jobId']}: {e}")
+            error_count += 1
+    
+    outcome_counter.record(True, processed_count)
+    outcome_counter.record(False, error_count)
+    return processed_count, error_count
+
+
+def get_ledger_entries(ledger_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch existing ledger entries by key with BatchGetItem."""
+    entries = {}
+    for start in range(0, len(ledger_ids), BATCH_GET_SIZE):
+        request = {LEDGER_TABLE: {
+            'Keys': [{'ledgerId': ledger_id} for ledger_id in ledger_ids[start:start + BATCH_GET_SIZE]],
+            'ProjectionExpression': 'ledgerId, amount',
+            'ConsistentRead': True
+        }}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(LEDGER_TABLE, []):
+                entries[item['ledgerId']] = item
+            request = response.get('UnprocessedKeys')
+    return entries
+
+
+def write_user_batch(user_id: str,
+                     work: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]]):
+    """Write one user's ledger entries, net balance change and job flags in one transaction."""
+    actions = []
+    delta = Decimal('0')
+    for job, entry, condition in work:
+        if entry:
+            actions.append(ledger_put_action(entry))
+            delta += -entry['amount'] if entry['type'] == 'debit' else entry['amount']
+        actions.append(job_reconciled_action(job['jobId'], condition if entry else None))
+    if any(entry for _, entry, _ in work):
+        actions.append(balance_update_action(user_id, delta))
+    dynamodb.meta.client.transact_write_items(TransactItems=actions)
+
+
+def handle_jobs_stream(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reconcile Jobs stream records that move a job to completed/failed, in shard order."""
+    processed_count = 0
+    
+    for record in records:
+        sequence_number = record['dynamodb']['SequenceNumber']
+        job = job_transition(record)
+        if job is None:
+            continue
+        
+        try:
+            # Index the job first, so the sweep finds it even if this record is never retried;
+            # reconciling it (or settling a failed job with nothing to refund) drops the key again
+            mark_reconcile_pending(job)
+            result = reconcile_job(job, source='stream')
+        except Exception as e:
+            # Stop here: the event source retries from this record, keeping shard order
+            logger.error(json.dumps({
+                'level': 'error',
+                'msg': 'Stream reconciliation failed',
+                'jobId': job.get('jobId'),
+                'sequenceNumber': sequence_number,
+                'error': str(e)
+            }))
+            outcome_counter.record(True, processed_count)
+            outcome_counter.record(False)
+            return {'batchItemFailures': [{'itemIdentifier': sequence_number}]}
+        
+        if result['statusCode'] == 200:
+            processed_count += 1
+        else:
+            # Malformed jobs cannot succeed on retry
+            logger.warning(f"Skipping stream record for job {job.get('jobId')}: {result['body']}")
+    
+    logger.info(json.dumps({
+        'level': 'info',
+        'msg': 'Stream batch completed',
+        'records': len(records),
+        'processed': processed_count
+    }))
+    outcome_counter.record(True, processed_count)
+    
+    return {'batchItemFailures': []}
+
+
+def mark_reconcile_pending(job: Dict[str, Any]) -> bool:
+    """Put a finished job in the sparse unreconciled index; False if it moved on meanwhile."""
+    try:
+        dynamodb.Table(JOBS_TABLE).update_item(
+            Key={'jobId': job['jobId']},
+            UpdateExpression='SET reconcilePending = :pending',
+            ConditionExpression='#status = :status AND (attribute_not_exists(reconciled) OR reconciled = :false)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':pending': reconcile_pending_key(job['jobId'], job['status']),
+                ':status': job['status'],
+                ':false': False
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def reconcile_pending_key(job_id: str, status: str) -> str:
+    """Index key of an unreconciled job: its status and a stable shard of its id."""
+    return f"{status}#{zlib.crc32(job_id.encode()) % RECONCILE_INDEX_SHARDS}"
+
+
+def job_transition(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the new job image if the record moves an unreconciled job to completed/failed."""
+    if record.get('eventName') not in ('INSERT', 'MODIFY'):
+        return None
+    
+    images = record['dynamodb']
+    new_image = deserialize_image(images.get('NewImage'))
+    old_image = deserialize_image(images.get('OldImage'))
+    
+    status = new_image.get('status')
+    if status not in RECONCILABLE_STATUSES or new_image.get('reconciled'):
+        return None
+    # Updates that keep the status (including our own reconciled flag) are not transitions
+    if old_image.get('status') == status:
+        return None
+    return new_image
+
+
+def deserialize_image(image: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert a stream image from DynamoDB JSON to Python values."""
+    deserializer = TypeDeserializer()
+    return {key: deserializer.deserialize(value) for key, value in (image or {}).items()}
+
+
+def reconcile_job(job: Dict[str, Any], source: str = 'sweep') -> Dict[str, Any]:
+    """Debit a completed job or refund a failed one; source is 'stream' or 'sweep'."""
+    if job['status'] == 'completed':
+        # Simulate video.rendered event
+        return handle_video_rendered({
+            'jobId': job['jobId'],
+            'userId': job.get('userId'),
+            'seconds': job.get('seconds', 0),
+            'model': job.get('model', 'default'),
+            'result_url': job.get('result_url'),
+            'source': source
+        })
+    # Simulate video.failed event
+    return handle_video_failed({
+        'jobId': job['jobId'],
+        'userId': job.get('userId')
+    })
+
+
+def find_unreconciled_jobs() -> List[Dict[str, Any]]:
+    """Every unreconciled job, from the sparse index or the parallel scan fallback."""
+    return [job for jobs, _ in unreconciled_pages() for job in jobs]
+
+
+def unreconciled_pages(cursor: Optional[Dict[str, Any]] = None):
+    """Yield (jobs, cursor) pages; passing a yielded cursor back resumes after that page.
+    
+    Queries the sparse unreconciled index, falling back to a parallel scan without it.
+    """
+    jobs_table = dynamodb.Table(JOBS_TABLE)
+    cursor = cursor or {'mode': 'index', 'status': 0}
+    if cursor['mode'] == 'index':
+        try:
+            yield from query_unreconciled_pages(jobs_table, cursor)
+            return
+        except ClientError as e:
+            # DynamoDB reports a missing index as a ValidationException
+            if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+                raise
+            logger.warning(json.dumps({
+                'level': 'warning',
+                'msg': 'Unreconciled index unavailable, scanning',
+                'index': UNRECONCILED_INDEX,
+                'error': str(e)
+            }))
+            cursor = {'mode': 'scan'}
+    yield from scan_unreconciled_pages(jobs_table, cursor)
+
+
+def query_unreconciled_pages(jobs_table, cursor: Dict[str, Any]):
+    """Page through the sparse index shard by shard; cost tracks the backlog, not the table."""
+    start = (cursor['status'], cursor.get('shard', 0))
+    for status in range(cursor['status'], len(RECONCILABLE_STATUSES)):
+        for shard in range(RECONCILE_INDEX_SHARDS):
+            if (status, shard) < start:
+                continue
+            kwargs = {
+                'IndexName': UNRECONCILED_INDEX,
+                'KeyConditionExpression': Key('reconcilePending').eq(
+                    f"{RECONCILABLE_STATUSES[status]}#{shard}"
+                ),
+                'Limit': RECONCILE_BATCH_SIZE
+            }
+            if (status, shard) == start and cursor.get('lastKey'):
+                kwargs['ExclusiveStartKey'] = cursor['lastKey']
+            while True:
+                response = jobs_table.query(**kwargs)
+                last_key = response.get('LastEvaluatedKey')
+                if last_key:
+                    yield response['Items'], {'mode': 'index', 'status': status, 'shard': shard,
+                                              'lastKey': last_key}
+                else:
+                    # Past the last shard, this sorts before the next status's first shard
+                    yield response['Items'], {'mode': 'index', 'status': status, 'shard': shard + 1}
+                    break
+                kwargs['ExclusiveStartKey'] = last_key
+
+
+def scan_unreconciled_pages(jobs_table, cursor: Dict[str, Any]):
+    """Scan the Jobs table in SCAN_SEGMENTS parallel segments, one page per segment at a time."""
+    # Segment -> its ExclusiveStartKey (None to start); finished segments are dropped
+    segments = cursor['segments'] if 'segments' in cursor else {str(s): None for s in range(SCAN_SEGMENTS)}
+    total_segments = cursor.get('totalSegments', SCAN_SEGMENTS)
+    
+    def scan_page(segment: str) -> Dict[str, Any]:
+        kwargs = {
+            'FilterExpression': (
+                Attr('status').is_in(list(RECONCILABLE_STATUSES)) &
+                (Attr('reconciled').eq(False) | Attr('reconciled').not_exists())
+            ),
+            'Segment': int(segment),
+            'TotalSegments': total_segments,
+            'Limit': RECONCILE_BATCH_SIZE
+        }
+        if segments[segment]:
+            kwargs['ExclusiveStartKey'] = segments[segment]
+        return jobs_table.scan(**kwargs)
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=total_segments) as executor:
+        while segments:
+            responses = dict(zip(segments, executor.map(scan_page, list(segments))))
+            segments = {
+                segment: response['LastEvaluatedKey']
+                for segment, response in responses.items()
+                if 'LastEvaluatedKey' in response
+            }
+            jobs = [job for response in responses.values() for job in response['Items']]
+            yield jobs, {'mode': 'scan', 'segments': segments, 'totalSegments': total_segments}
 
 
-def is_anomaly(cost: Decimal, seconds: int, detail: Dict[str, Any]) -> bool:
+def get_model_price(model: str) -> float:
+    """Get the price per second for a given model from the cached SSM pricing table."""
+    return pricing_cache.price(model)
+
+
+def handle_pricing_change(detail: Dict[str, Any]) -> Dict[str, Any]:
+    """Invalidate cached pricing when a /fertilia/pricing/ parameter changes."""
+    name = detail.get('name', '')
+    if name.startswith(pricing_cache.path):
+        pricing_cache.invalidate(name[len(pricing_cache.path):])
+    else:
+        pricing_cache.invalidate()
+    
+    logger.info(json.dumps({
+        'level': 'info',
+        'msg': 'Pricing cache invalidated',
+        'parameter': name,
+        'operation': detail.get('operation')
+    }))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': 'Pricing cache invalidated'})
+    }
+
+
+def is_anomaly(cost: Decimal, seconds: int, detail: Dict[str, Any],
+               model: Optional[str] = None) -> bool:
     """Check if a job represents an anomaly based on cost and other factors."""
+    return anomaly_reason(cost, seconds, detail, model) is not None
+
+
+def anomaly_reason(cost: Decimal, seconds: int, detail: Dict[str, Any],
+                   model: Optional[str] = None) -> Optional[str]:
+    """Name the first anomaly check a job fails, or None."""
+    # Scored only: the debit joins the model's history once its ledger write commits
+    outlier = anomaly_detector.score(model, cost, seconds) if model else None
+    
     # Check if cost is unusually high (> $50)
     if cost > 50:
-        return True
+        return 'cost_over_limit'
     
     # Check if seconds is unusually high (> 300 seconds / 5 minutes)
     if seconds > 300:
-        return True
+        return 'duration_over_limit'
     
-    # Check if result_url is missing
-    if not detail.get('result_url'):
-        return True
+    # Check if result_url is missing; Jobs items rebuilt by the stream or sweep need not carry one
+    if not detail.get('result_url') and detail.get('source') not in JOB_TABLE_SOURCES:
+        return 'missing_result_url'
     
-    # TODO: Implement median-based anomaly detection
-    # For now, using fixed thresholds
+    # Robust deviation from the model's running median (median/MAD)
+    if outlier:
+        return f"{outlier}_outlier"
     
-    return False
+    return None
 
 
-def invoke_llm(prompt: str) -> Optional[str]:
+def invoke_llm(prompt: str, max_tokens: int = 100) -> Optional[str]:
     """Invoke LLM for anomaly explanation or other assistance."""
     try:
         from openai import OpenAI
@@ -433,7 +1138,7 @@ def invoke_llm(prompt: str) -> Optional[str]:
         response = client.chat.completions.create(
             model=LLM_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=100,
+            max_tokens=max_tokens,
             temperature=0.7
         )
         
@@ -443,6 +1148,21 @@ def invoke_llm(prompt: str) -> Optional[str]:
         return "Anomaly detected - manual review recommended"
 
 
+def emit_metrics(metrics: List[Tuple[str, float, str]]):
+    """Emit several CloudWatch metrics in one call."""
+    timestamp = datetime.utcnow()
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='Reconciler',
+            MetricData=[
+                {'MetricName': name, 'Value': value, 'Unit': unit, 'Timestamp': timestamp}
+                for name, value, unit in metrics
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Failed to emit metrics {[name for name, _, _ in metrics]}: {e}")
+
+
 def emit_metric(metric_name: str, value: float, unit: str = 'Count'):
     """Emit a CloudWatch metric."""
     try:
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import logging
+import threading
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Any, Optional, Tuple
+from boto3.dynamodb.conditions import Key
+
+logger = logging.getLogger()
+
+# Entries younger than this are never folded into a checkpoint, so a late
+# write with an older timestamp cannot land behind one (seconds)
+CHECKPOINT_SETTLE_SECONDS = int(os.environ.get('CHECKPOINT_SETTLE_SECONDS', '300'))
+# Balances within this of the ledger are not reported
+DRIFT_TOLERANCE = Decimal(os.environ.get('DRIFT_TOLERANCE', '0.000001'))
+# Drifting users kept in the report; the rest are only counted
+MAX_DRIFT_REPORT = int(os.environ.get('MAX_DRIFT_REPORT', '100'))
+AUDIT_SEGMENTS = int(os.environ.get('AUDIT_SEGMENTS', '4'))
+AUDIT_PAGE_SIZE = 100
+
+# Checkpoint covering no entries
+EMPTY_CHECKPOINT = {'asOf': '', 'balance': Decimal('0'), 'entryCount': 0}
+
+
+def entry_delta(entry: Dict[str, Any]) -> Decimal:
+    """Signed effect of a ledger entry on the user's balance."""
+    if entry.get('type') == 'debit':
+        return -Decimal(entry['amount'])
+    if entry.get('type') == 'credit':
+        return Decimal(entry['amount'])
+    return Decimal('0')
+
+
+class LedgerAuditor:
+    """Replays each user's ledger from their last checkpoint instead of from the beginning."""
+
+    def __init__(self, ledger_table: Any, credits_table: Any, checkpoints_table: Any,
+                 user_index: str = 'UserIdIndex', clock=time.time):
+        self.ledger_table = ledger_table
+        self.credits_table = credits_table
+        self.checkpoints_table = checkpoints_table
+        self.user_index = user_index
+        self.clock = clock
+
+    def ledger_balance(self, user_id: str, until: Optional[str] = None) -> Tuple[Decimal, Dict[str, Any]]:
+        """Balance implied by the ledger, and the checkpoint it was replayed from.
+
+        Args:
+            user_id: User to replay
+            until: Only replay entries with timestamp <= until
+
+        Returns:
+            (balance, {'checkpoint', 'replayed', 'lastTimestamp'})
+        """
+        checkpoint = self.checkpoints_table.get_item(
+            Key={'userId': user_id}, ConsistentRead=True
+        ).get('Item') or EMPTY_CHECKPOINT
+
+        if until is not None and until <= checkpoint['asOf']:
+            return Decimal(checkpoint['balance']), {
+                'checkpoint': checkpoint, 'replayed': 0, 'lastTimestamp': checkpoint['asOf']
+            }
+
+        condition = Key('userId').eq(user_id)
+        if until is not None:
+            condition &= Key('timestamp').between(checkpoint['asOf'] + '\x00', until)
+        elif checkpoint['asOf']:
+            condition &= Key('timestamp').gt(checkpoint['asOf'])
+
+        balance = Decimal(checkpoint['balance'])
+        replayed = 0
+        last_timestamp = checkpoint['asOf']
+        kwargs = {
+            'IndexName': self.user_index,
+            'KeyConditionExpression': condition,
+            'ProjectionExpression': 'amount, #type, #ts',
+            'ExpressionAttributeNames': {'#type': 'type', '#ts': 'timestamp'}
+        }
+        while True:
+            response = self.ledger_table.query(**kwargs)
+            for entry in response['Items']:
+                balance += entry_delta(entry)
+                replayed += 1
+                last_timestamp = max(last_timestamp, entry['timestamp'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        return balance, {'checkpoint': checkpoint, 'replayed': replayed, 'lastTimestamp': last_timestamp}
+
+    def checkpoint_user(self, user_id: str) -> bool:
+        """Advance the user's checkpoint over settled entries; returns True if it moved."""
+        cutoff = (datetime.fromtimestamp(self.clock(), timezone.utc).replace(tzinfo=None)
+                  - timedelta(seconds=CHECKPOINT_SETTLE_SECONDS)).isoformat()
+        balance, replay = self.ledger_balance(user_id, until=cutoff)
+        if not replay['replayed']:
+            return False
+
+        previous = replay['checkpoint']
+        try:
+            self.checkpoints_table.put_item(
+                Item={
+                    'userId': user_id,
+                    'asOf': replay['lastTimestamp'],
+                    'balance': balance,
+                    'entryCount': int(previous['entryCount']) + replay['replayed'],
+                    'updatedAt': int(self.clock())
+                },
+                # Never move a checkpoint backwards
+                ConditionExpression='attribute_not_exists(userId) OR asOf < :asOf',
+                ExpressionAttributeValues={':asOf': replay['lastTimestamp']}
+            )
+        except self.checkpoints_table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def audit_user(self, user_id: str, remaining: Any) -> Optional[Dict[str, Any]]:
+        """Compare a balance with the ledger; returns the drift record or None."""
+        balance, replay = self.ledger_balance(user_id)
+        drift = Decimal(remaining) - balance
+        if abs(drift) <= DRIFT_TOLERANCE:
+            return None
+
+        # A debit or refund may have landed between the two reads; look once more
+        current = self.credits_table.get_item(Key={'userId': user_id}, ConsistentRead=True).get('Item')
+        if current is None:
+            return None
+        balance, replay = self.ledger_balance(user_id)
+        drift = Decimal(current['remaining']) - balance
+        if abs(drift) <= DRIFT_TOLERANCE:
+            return None
+        return {
+            'userId': user_id,
+            'remaining': str(current['remaining']),
+            'ledgerBalance': str(balance),
+            'drift': str(drift),
+            'replayed': replay['replayed']
+        }
+
+    def audit_all(self, segments: int = AUDIT_SEGMENTS, checkpoint: bool = False,
+                  max_report: int = MAX_DRIFT_REPORT) -> Dict[str, Any]:
+        """Audit every user with a parallel segmented scan of the Credits table.
+
+        Memory stays bounded: each worker holds one scan page, and only the
+        first max_report drifting users are kept.
+        """
+        lock = threading.Lock()
+        report = {'users': 0, 'drifting': 0, 'checkpointed': 0, 'errors': 0, 'drift': []}
+
+        def audit_segment(segment: int):
+            kwargs = {
+                'Segment': segment,
+                'TotalSegments': segments,
+                'ProjectionExpression': 'userId, remaining',
+                'Limit': AUDIT_PAGE_SIZE
+            }
+            while True:
+                response = self.credits_table.scan(**kwargs)
+                for user in response['Items']:
+                    self._audit_one(user, checkpoint, report, lock, max_report)
+                if 'LastEvaluatedKey' not in response:
+                    return
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=segments) as executor:
+            list(executor.map(audit_segment, range(segments)))
+
+        logger.info(json.dumps({
+            'level': 'warning' if report['drifting'] else 'info',
+            'msg': 'Ledger audit completed',
+            'users': report['users'],
+            'drifting': report['drifting'],
+            'checkpointed': report['checkpointed'],
+            'errors': report['errors']
+        }))
+        return report
+
+    def _audit_one(self, user: Dict[str, Any], checkpoint: bool, report: Dict[str, Any],
+                   lock: threading.Lock, max_report: int):
+        user_id = user['userId']
+        moved = False
+        try:
+            if checkpoint:
+                moved = self.checkpoint_user(user_id)
+            drift = self.audit_user(user_id, user.get('remaining', 0))
+        except Exception as e:
+            logger.error(f"Audit failed for user {user_id}: {e}")
+            with lock:
+                report['errors'] += 1
+            return
+
+        with lock:
+            report['users'] += 1
+            if moved:
+                report['checkpointed'] += 1
+            if drift:
+                report['drifting'] += 1
+                if len(report['drift']) < max_report:
+                    report['drift'].append(drift)
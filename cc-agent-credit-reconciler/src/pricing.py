@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Every model price lives under this path, one parameter per model
+PRICING_PARAMETER_PATH = '/fertilia/pricing/'
+DEFAULT_PRICE_PER_SECOND = 0.10  # Default $0.10 per second
+
+# Age (seconds) after which the table is reloaded before answering
+PRICING_CACHE_SECONDS = float(os.environ.get('PRICING_CACHE_SECONDS', '300'))
+# Within this many seconds of expiry a lookup starts a background reload
+PRICING_REFRESH_AHEAD_SECONDS = float(os.environ.get('PRICING_REFRESH_AHEAD_SECONDS', '60'))
+# How long a model without a parameter keeps the default price
+PRICING_NEGATIVE_CACHE_SECONDS = float(os.environ.get('PRICING_NEGATIVE_CACHE_SECONDS', '60'))
+# Back-off before retrying a failed reload while serving the previous table
+PRICING_RETRY_SECONDS = 30.0
+
+
+class PricingCache:
+    """In-memory model price table loaded with GetParametersByPath."""
+
+    def __init__(self, ssm_client: Any, path: str = PRICING_PARAMETER_PATH,
+                 ttl: float = PRICING_CACHE_SECONDS,
+                 refresh_ahead: float = PRICING_REFRESH_AHEAD_SECONDS,
+                 negative_ttl: float = PRICING_NEGATIVE_CACHE_SECONDS,
+                 clock=time.time):
+        self.ssm = ssm_client
+        self.path = path
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._prices: Optional[Dict[str, float]] = None
+        self._expires = 0.0
+        self._missing: Dict[str, float] = {}
+        self._refreshing = False
+
+    def price(self, model: str) -> float:
+        """Price per second for a model; a dictionary hit while the table is fresh."""
+        now = self.clock()
+        if self._prices is None or now >= self._expires:
+            self._reload(background=False)
+        elif now >= self._expires - self.refresh_ahead:
+            self._start_refresh()
+
+        price = self._prices.get(model)
+        if price is not None:
+            return price
+
+        # Models added since the last load are looked up once, then cached either way
+        missing_until = self._missing.get(model)
+        if missing_until is not None and now < missing_until:
+            return DEFAULT_PRICE_PER_SECOND
+        return self._load_one(model, now)
+
+    def invalidate(self, model: Optional[str] = None):
+        """Drop the table (or one model) so the next lookup reads SSM again."""
+        with self._lock:
+            if model is None:
+                self._prices = None
+                self._missing = {}
+            else:
+                if self._prices is not None:
+                    self._prices.pop(model, None)
+                self._missing.pop(model, None)
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._reload, kwargs={'background': True}, daemon=True).start()
+
+    def _reload(self, background: bool):
+        try:
+            prices = self._fetch_all()
+        except ClientError as e:
+            with self._lock:
+                self._refreshing = False
+                if self._prices is None:
+                    if background:
+                        return
+                    raise
+                # Keep serving the previous table and retry after a short back-off
+                self._expires = self.clock() + min(self.ttl, PRICING_RETRY_SECONDS)
+            logger.error(f"Failed to reload pricing from {self.path}: {e}")
+            return
+
+        with self._lock:
+            self._prices = prices
+            self._expires = self.clock() + self.ttl
+            self._missing = {}
+            self._refreshing = False
+        logger.info(f"Loaded {len(prices)} model prices from {self.path}")
+
+    def _fetch_all(self) -> Dict[str, float]:
+        prices = {}
+        kwargs = {'Path': self.path, 'Recursive': False}
+        while True:
+            response = self.ssm.get_parameters_by_path(**kwargs)
+            for parameter in response['Parameters']:
+                model = parameter['Name'][len(self.path):]
+                try:
+                    prices[model] = float(parameter['Value'])
+                except ValueError:
+                    logger.warning(f"Ignoring non-numeric price {parameter['Name']}={parameter['Value']}")
+            if not response.get('NextToken'):
+                return prices
+            kwargs['NextToken'] = response['NextToken']
+
+    def _load_one(self, model: str, now: float) -> float:
+        try:
+            response = self.ssm.get_parameter(Name=f"{self.path}{model}")
+            price = float(response['Parameter']['Value'])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ParameterNotFound':
+                raise
+            logger.warning(f"Price not found for model {model}, using default")
+            with self._lock:
+                self._missing[model] = now + self.negative_ttl
+            return DEFAULT_PRICE_PER_SECOND
+
+        with self._lock:
+            if self._prices is not None:
+                self._prices[model] = price
+        return price
@@ -0,0 +1,131 @@
+import json
+import random
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import MagicMock, patch
+
+from src import anomaly
+from src.anomaly import P2Quantile, AnomalyDetector
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+class TestP2Quantile:
+    """Test the streaming quantile estimate."""
+    
+    @pytest.mark.parametrize('p', [0.5, 0.9, 0.99])
+    def test_tracks_exact_quantile(self, p):
+        """Test that the five-marker estimate stays close to the exact quantile."""
+        rng = random.Random(1)
+        values = [rng.lognormvariate(0, 0.5) for _ in range(20000)]
+        sketch = P2Quantile(p)
+        for value in values:
+            sketch.add(value)
+        
+        exact = sorted(values)[int(p * (len(values) - 1))]
+        assert sketch.value() == pytest.approx(exact, rel=0.05)
+    
+    def test_round_trips_through_state(self):
+        """Test that a restored sketch continues where it stopped."""
+        sketch = P2Quantile(0.5)
+        for value in range(100):
+            sketch.add(value)
+        restored = P2Quantile(0.5, json.loads(json.dumps(sketch.to_dict())))
+        
+        for value in range(100, 200):
+            sketch.add(value)
+            restored.add(value)
+        
+        assert restored.value() == sketch.value()
+
+
+class TestAnomalyDetector:
+    """Test per-model scoring, adaptation and persistence."""
+    
+    def warm(self, detector, model, cost, seconds, n=200):
+        rng = random.Random(2)
+        for _ in range(n):
+            s = seconds * rng.uniform(0.8, 1.2)
+            detector.observe(model, cost / seconds * s, s)
+    
+    def test_flags_outliers_per_model(self):
+        """Test that each model is judged against its own history."""
+        detector = AnomalyDetector()
+        self.warm(detector, 'cheap', cost=1.0, seconds=10)
+        self.warm(detector, 'premium', cost=25.0, seconds=100)
+        
+        assert detector.observe('cheap', 1.1, 11) is None
+        assert detector.observe('cheap', 8.0, 12) == 'cost'
+        assert detector.observe('premium', 24.0, 95) is None
+        assert detector.observe('premium', 25.0, 400) == 'seconds'
+    
+    def test_cold_model_is_not_scored(self):
+        """Test that too little history never flags a job."""
+        detector = AnomalyDetector()
+        self.warm(detector, 'new', cost=1.0, seconds=10, n=anomaly.ANOMALY_MIN_SAMPLES - 1)
+        
+        assert detector.observe('new', 100.0, 10) is None
+    
+    def test_adapts_to_price_change(self):
+        """Test that a new price level stops being anomalous after a window."""
+        detector = AnomalyDetector()
+        with patch.object(anomaly, 'ANOMALY_WINDOW', 100):
+            self.warm(detector, 'model', cost=1.0, seconds=10, n=300)
+            assert detector.observe('model', 3.0, 10) is not None
+            
+            self.warm(detector, 'model', cost=3.0, seconds=10, n=250)
+            assert detector.observe('model', 3.0, 10) is None
+    
+    def test_sketch_persisted_as_one_item_per_model(self):
+        """Test flush/load through the anomaly table."""
+        with mock_aws():
+            table = boto3.resource('dynamodb', region_name='us-east-1').create_table(
+                TableName='test-anomaly-stats',
+                KeySchema=[{'AttributeName': 'model', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'model', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            writer = AnomalyDetector(table)
+            self.warm(writer, 'cheap', cost=1.0, seconds=10)
+            writer.flush()
+            
+            items = table.scan()['Items']
+            assert [item['model'] for item in items] == ['cheap']
+            assert len(items[0]['sketch']) < 2000
+            
+            reader = AnomalyDetector(table)
+            assert reader.observe('cheap', 8.0, 12) is not None
+    
+    def test_clean_sketch_is_reloaded_after_cache_ttl(self):
+        """Test that containers pick up other writers' sketches once the cache expires."""
+        table = MagicMock()
+        table.get_item.return_value = {}
+        clock = FakeClock()
+        detector = AnomalyDetector(table, clock=clock)
+        
+        detector.observe('model', 1.0, 10)
+        detector.flush()
+        detector.observe('model', 1.0, 10)
+        assert table.get_item.call_count == 1
+        
+        detector.flush()
+        clock.now += anomaly.ANOMALY_CACHE_SECONDS
+        detector.observe('model', 1.0, 10)
+        assert table.get_item.call_count == 2
+    
+    def test_score_does_not_add(self):
+        """Test that scoring leaves the history to the caller's add."""
+        detector = AnomalyDetector()
+        self.warm(detector, 'model', cost=1.0, seconds=10, n=anomaly.ANOMALY_MIN_SAMPLES - 1)
+        
+        assert detector.score('model', 1.0, 10) is None
+        assert detector.score('model', 8.0, 10) is None
+        detector.add('model', 1.0, 10)
+        assert detector.score('model', 8.0, 10) == 'cost'
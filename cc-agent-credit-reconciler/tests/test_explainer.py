@@ -0,0 +1,158 @@
+import json
+import boto3
+import pytest
+from decimal import Decimal
+from moto import mock_aws
+from unittest.mock import MagicMock, patch
+
+from src.explainer import (
+    AnomalyExplainer, ANOMALY_PLACEHOLDER, ANOMALY_FALLBACK, anomaly_signature
+)
+
+
+@pytest.fixture
+def tables():
+    """Ledger and explanation cache tables."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        ledger = dynamodb.create_table(
+            TableName='test-ledger',
+            KeySchema=[{'AttributeName': 'ledgerId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'ledgerId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        cache = dynamodb.create_table(
+            TableName='test-explanations',
+            KeySchema=[{'AttributeName': 'signature', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'signature', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        yield {'ledger': ledger, 'cache': cache}
+
+
+def queued(ledger, job_id, model, cost, reason):
+    """Write a placeholder ledger entry and return its SQS record."""
+    ledger_id = f'{job_id}#debit'
+    ledger.put_item(Item={
+        'ledgerId': ledger_id,
+        'jobId': job_id,
+        'amount': Decimal(cost),
+        'anomaly': ANOMALY_PLACEHOLDER
+    })
+    body = {
+        'ledgerId': ledger_id,
+        'jobId': job_id,
+        'model': model,
+        'cost': cost,
+        'seconds': '10',
+        'reason': reason,
+        'signature': anomaly_signature(model, cost, reason)
+    }
+    return {'messageId': job_id, 'body': json.dumps(body)}
+
+
+class TestAnomalyExplainer:
+    """Test batched, cached anomaly explanations."""
+    
+    def test_one_llm_request_per_batch_of_signatures(self, tables):
+        """Test that anomalies sharing a signature share one explanation."""
+        records = [
+            queued(tables['ledger'], 'job1', 'default', '60.00', 'cost_over_limit'),
+            queued(tables['ledger'], 'job2', 'default', '61.00', 'cost_over_limit'),
+            queued(tables['ledger'], 'job3', 'premium', '5.00', 'missing_result_url')
+        ]
+        llm = MagicMock(return_value=json.dumps({'1': 'Long render.', '2': 'No output stored.'}))
+        
+        response = AnomalyExplainer(llm, tables['ledger']).process(records)
+        
+        assert response == {'batchItemFailures': []}
+        llm.assert_called_once()
+        anomalies = {
+            item['jobId']: item['anomaly'] for item in tables['ledger'].scan()['Items']
+        }
+        assert anomalies == {'job1': 'Long render.', 'job2': 'Long render.', 'job3': 'No output stored.'}
+    
+    def test_cached_signatures_skip_the_llm(self, tables):
+        """Test the in-memory and persistent explanation caches."""
+        llm = MagicMock(return_value=json.dumps({'1': 'Long render.'}))
+        first = AnomalyExplainer(llm, tables['ledger'], tables['cache'])
+        first.process([queued(tables['ledger'], 'job1', 'default', '60.00', 'cost_over_limit')])
+        first.process([queued(tables['ledger'], 'job2', 'default', '62.00', 'cost_over_limit')])
+        
+        # A new container reads the persisted explanation
+        second = AnomalyExplainer(llm, tables['ledger'], tables['cache'])
+        second.process([queued(tables['ledger'], 'job3', 'default', '63.00', 'cost_over_limit')])
+        
+        assert llm.call_count == 1
+        job3 = tables['ledger'].get_item(Key={'ledgerId': 'job3#debit'})['Item']
+        assert job3['anomaly'] == 'Long render.'
+    
+    def test_llm_failure_leaves_placeholder_for_retry(self, tables):
+        """Test that unexplained anomalies are reported as batch item failures."""
+        llm = MagicMock(return_value=ANOMALY_FALLBACK)
+        record = queued(tables['ledger'], 'job1', 'default', '60.00', 'cost_over_limit')
+        
+        response = AnomalyExplainer(llm, tables['ledger']).process([record])
+        
+        assert response == {'batchItemFailures': [{'itemIdentifier': 'job1'}]}
+        item = tables['ledger'].get_item(Key={'ledgerId': 'job1#debit'})['Item']
+        assert item['anomaly'] == ANOMALY_PLACEHOLDER
+    
+    def test_patch_skips_missing_or_explained_entries(self, tables):
+        """Test that a rolled-back debit or an earlier patch is not overwritten."""
+        explainer = AnomalyExplainer(MagicMock(), tables['ledger'])
+        tables['ledger'].put_item(Item={'ledgerId': 'job1#debit', 'anomaly': 'Reviewed by ops.'})
+        
+        explainer.patch_ledger('job1#debit', 'Long render.')
+        explainer.patch_ledger('job2#debit', 'Long render.')
+        
+        assert tables['ledger'].get_item(Key={'ledgerId': 'job1#debit'})['Item']['anomaly'] == 'Reviewed by ops.'
+        assert 'Item' not in tables['ledger'].get_item(Key={'ledgerId': 'job2#debit'})
+
+
+class TestDebitPath:
+    """Test that debits only queue anomalies."""
+    
+    def test_anomalous_debit_writes_placeholder_and_queues(self):
+        """Test that the LLM is not called while debiting."""
+        from src import handler
+        
+        with patch.object(handler.anomaly_queue, 'queue_url', 'https://sqs/anomalies'), \
+             patch.object(handler.anomaly_queue, 'sqs') as mock_sqs, \
+             patch.object(handler, 'get_model_price', return_value=0.10), \
+             patch.object(handler, 'reconcile_transaction', return_value=True) as transaction, \
+             patch.object(handler, 'invoke_llm') as mock_llm, \
+             patch.object(handler, 'emit_metric'):
+            mock_sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}]}
+            handler.lambda_handler({
+                'source': 'aws.events',
+                'detail-type': 'video.rendered',
+                'detail': {'jobId': 'job1', 'userId': 'user1', 'seconds': 400, 'model': 'default'}
+            }, None)
+        
+        mock_llm.assert_not_called()
+        ledger_item = transaction.call_args[0][0]
+        assert ledger_item['anomaly'] == ANOMALY_PLACEHOLDER
+        entries = mock_sqs.send_message_batch.call_args[1]['Entries']
+        body = json.loads(entries[0]['MessageBody'])
+        assert body['ledgerId'] == 'job1#debit'
+        assert body['reason'] == 'duration_over_limit'
+        assert body['signature'] == 'default|2^5|duration_over_limit'
+    
+    def test_replayed_debit_is_not_queued(self):
+        """Test that nothing is queued when the debit transaction is skipped."""
+        from src import handler
+        
+        with patch.object(handler.anomaly_queue, 'queue_url', 'https://sqs/anomalies'), \
+             patch.object(handler.anomaly_queue, 'sqs') as mock_sqs, \
+             patch.object(handler, 'get_model_price', return_value=0.10), \
+             patch.object(handler, 'reconcile_transaction', return_value=False), \
+             patch.object(handler, 'emit_metric'):
+            response = handler.lambda_handler({
+                'source': 'aws.events',
+                'detail-type': 'video.rendered',
+                'detail': {'jobId': 'job1', 'userId': 'user1', 'seconds': 400, 'model': 'default'}
+            }, None)
+        
+        assert 'Already processed' in response['body']
+        mock_sqs.send_message_batch.assert_not_called()
@@ -79,6 +79,9 @@ def ssm_parameters():
             Value='0.25',
             Type='String'
         )
+        from src.handler import pricing_cache, anomaly_detector
+        pricing_cache.invalidate()
+        anomaly_detector.reset()
         yield ssm
 
 
@@ -205,9 +208,14 @@ class TestVideoRenderedHandler:
     
     def test_idempotent_debit(self, dynamodb_tables, ssm_parameters):
         """Test that duplicate debits are prevented."""
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('95.00')
+        })
+        
         # Setup existing debit
         dynamodb_tables['ledger'].put_item(Item={
-            'ledgerId': 'user123#2024-01-01#job123',
+            'ledgerId': 'job123#debit',
             'userId': 'user123',
             'type': 'debit',
             'amount': Decimal('5.00'),
@@ -226,6 +234,71 @@ class TestVideoRenderedHandler:
         
         assert response['statusCode'] == 200
         assert 'Already processed' in response['body']
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('95.00')
+    
+    def test_replayed_debit_is_observed_once(self, dynamodb_tables, ssm_parameters):
+        """Test that only the committed debit joins the model's history."""
+        from src.handler import anomaly_detector
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        detail = {
+            'jobId': 'job123',
+            'userId': 'user123',
+            'seconds': 20,
+            'model': 'default',
+            'result_url': 's3://bucket/video.mp4'
+        }
+        
+        with patch('src.handler.cloudwatch'), \
+             patch.object(anomaly_detector, 'add') as mock_add:
+            handle_video_rendered(detail)
+            response = handle_video_rendered(detail)
+        
+        assert 'Already processed' in response['body']
+        mock_add.assert_called_once_with('default', Decimal('2.00'), 20)
+    
+    def test_debit_skips_job_reconciled_before_deterministic_keys(self, dynamodb_tables, ssm_parameters):
+        """Test that a job reconciled under an old ledger key is not debited again."""
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('95.00')
+        })
+        dynamodb_tables['jobs'].put_item(Item={
+            'jobId': 'job123',
+            'userId': 'user123',
+            'status': 'completed',
+            'reconciled': True
+        })
+        
+        response = handle_video_rendered({
+            'jobId': 'job123',
+            'userId': 'user123',
+            'seconds': 20,
+            'model': 'default'
+        })
+        
+        assert 'Already processed' in response['body']
+        assert dynamodb_tables['ledger'].scan()['Items'] == []
+    
+    def test_debit_is_atomic(self, dynamodb_tables, ssm_parameters):
+        """Test that a failed balance update leaves no ledger entry or reconciled flag."""
+        from botocore.exceptions import ClientError
+        
+        # No credits row: the balance update fails inside the transaction
+        with pytest.raises(ClientError):
+            handle_video_rendered({
+                'jobId': 'job123',
+                'userId': 'user123',
+                'seconds': 20,
+                'model': 'default',
+                'result_url': 'https://example.com/video.mp4'
+            })
+        
+        assert dynamodb_tables['ledger'].scan()['Items'] == []
+        assert 'Item' not in dynamodb_tables['jobs'].get_item(Key={'jobId': 'job123'})
     
     @patch('src.handler.invoke_llm')
     def test_anomaly_detection(self, mock_llm, dynamodb_tables, ssm_parameters):
@@ -300,6 +373,8 @@ class TestVideoFailedHandler:
         
         assert response['statusCode'] == 200
         assert 'No debit to refund' in response['body']
+        # Events for jobs the Jobs table does not hold create no item there
+        assert 'Item' not in dynamodb_tables['jobs'].get_item(Key={'jobId': 'job999'})
     
     def test_idempotent_refund(self, dynamodb_tables):
         """Test that duplicate refunds are prevented."""
@@ -331,6 +406,33 @@ class TestVideoFailedHandler:
         
         assert response['statusCode'] == 200
         assert 'Already refunded' in response['body']
+    
+    def test_refund_uses_deterministic_keys(self, dynamodb_tables):
+        """Test that a refund of a keyed debit is written once."""
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('90.00')
+        })
+        dynamodb_tables['ledger'].put_item(Item={
+            'ledgerId': 'job123#debit',
+            'userId': 'user123',
+            'type': 'debit',
+            'amount': Decimal('10.00'),
+            'jobId': 'job123',
+            'reference': 'job123'
+        })
+        detail = {'jobId': 'job123', 'userId': 'user123'}
+        
+        with patch('src.handler.cloudwatch'):
+            first = handle_video_failed(detail)
+            second = handle_video_failed(detail)
+        
+        assert 'Credit refunded' in first['body']
+        assert 'Already refunded' in second['body']
+        refund = dynamodb_tables['ledger'].get_item(Key={'ledgerId': 'job123#refund'})['Item']
+        assert refund['amount'] == Decimal('10.00')
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('100.00')
 
 
 class TestTimerScan:
@@ -392,6 +494,564 @@ class TestTimerScan:
         body = json.loads(response['body'])
         assert body['processed'] == 30
 
+    
+    def test_sweep_queries_sparse_index(self, dynamodb_tables, ssm_parameters):
+        """Test that the sweep reads only indexed jobs and clears their index key."""
+        from src import handler
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb_tables['jobs'].delete()
+        jobs_table = dynamodb.create_table(
+            TableName='test-jobs',
+            KeySchema=[{'AttributeName': 'jobId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'jobId', 'AttributeType': 'S'},
+                {'AttributeName': 'reconcilePending', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'UnreconciledIndex',
+                'KeySchema': [{'AttributeName': 'reconcilePending', 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        jobs_table.put_item(Item={
+            'jobId': 'job-pending',
+            'userId': 'user123',
+            'status': 'completed',
+            'seconds': 10,
+            'model': 'default',
+            'reconcilePending': handler.reconcile_pending_key('job-pending', 'completed')
+        })
+        # Already reconciled: no index key, never read by the sweep
+        jobs_table.put_item(Item={
+            'jobId': 'job-done',
+            'userId': 'user123',
+            'status': 'completed',
+            'seconds': 10,
+            'reconciled': True
+        })
+        
+        with patch('src.handler.cloudwatch'), \
+             patch.object(jobs_table.meta.client, 'scan') as mock_scan:
+            response = handle_timer_scan()
+        
+        assert json.loads(response['body'])['processed'] == 1
+        mock_scan.assert_not_called()
+        job = jobs_table.get_item(Key={'jobId': 'job-pending'})['Item']
+        assert job['reconciled'] is True
+        assert 'reconcilePending' not in job
+    
+    def test_sweep_settles_failed_job_without_debit(self, dynamodb_tables, ssm_parameters):
+        """Test that a failed job with nothing to refund leaves the index and is not swept again."""
+        from src import handler
+        jobs_table = create_indexed_jobs_table(dynamodb_tables)
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        # Four shards per status; the two jobs hash to shards 0 and 2
+        with patch('src.handler.cloudwatch'), \
+             patch.object(handler, 'RECONCILE_INDEX_SHARDS', 4):
+            for job_id, status in (('job-failed', 'failed'), ('job-completed', 'completed')):
+                jobs_table.put_item(Item={
+                    'jobId': job_id,
+                    'userId': 'user123',
+                    'status': status,
+                    'seconds': 10,
+                    'model': 'default',
+                    'reconcilePending': handler.reconcile_pending_key(job_id, status)
+                })
+            first = handle_timer_scan()
+            second = handle_timer_scan()
+        
+        assert json.loads(first['body'])['processed'] == 2
+        assert json.loads(second['body'])['processed'] == 0
+        job = jobs_table.get_item(Key={'jobId': 'job-failed'})['Item']
+        assert job['reconciled'] is True
+        assert 'reconcilePending' not in job
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('99.00')
+    
+    def test_parallel_scan_fallback_uses_segments(self, dynamodb_tables):
+        """Test that tables without the index are scanned in parallel segments."""
+        from src import handler
+        
+        for i in range(12):
+            dynamodb_tables['jobs'].put_item(Item={
+                'jobId': f'job{i:03d}',
+                'userId': 'user123',
+                'status': 'failed' if i % 2 else 'completed',
+                'reconciled': i % 3 == 0
+            })
+        
+        with patch.object(handler, 'SCAN_SEGMENTS', 3):
+            jobs = handler.find_unreconciled_jobs()
+        
+        assert sorted(job['jobId'] for job in jobs) == [
+            f'job{i:03d}' for i in range(12) if i % 3 != 0
+        ]
+    
+    def test_batch_reconciler_nets_per_user(self, dynamodb_tables, ssm_parameters):
+        """Test one ledger read and one transaction per user for a page of jobs."""
+        from src import handler
+        
+        for user_id in ('user1', 'user2'):
+            dynamodb_tables['credits'].put_item(Item={
+                'userId': user_id,
+                'remaining': Decimal('100.00')
+            })
+        jobs = [
+            {'jobId': f'job{i}', 'userId': 'user1', 'status': 'completed', 'seconds': 10, 'model': 'default'}
+            for i in range(3)
+        ]
+        jobs.append({'jobId': 'job3', 'userId': 'user1', 'status': 'failed'})
+        jobs.append({'jobId': 'job4', 'userId': 'user2', 'status': 'completed', 'seconds': 10, 'model': 'premium'})
+        jobs.append({'jobId': 'job5', 'userId': 'user2', 'status': 'completed', 'seconds': 10})
+        for job in jobs:
+            dynamodb_tables['jobs'].put_item(
+                Item=dict(job, reconcilePending=handler.reconcile_pending_key(job['jobId'], job['status']))
+            )
+        # job3 was debited earlier; job5's debit exists but the job was never flagged
+        for job_id, user_id in (('job3', 'user1'), ('job5', 'user2')):
+            dynamodb_tables['ledger'].put_item(Item={
+                'ledgerId': f'{job_id}#debit',
+                'userId': user_id,
+                'type': 'debit',
+                'amount': Decimal('4.00'),
+                'jobId': job_id
+            })
+        
+        client = handler.dynamodb.meta.client
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'), \
+             patch.object(client, 'transact_write_items', wraps=client.transact_write_items) as transact, \
+             patch.object(handler.dynamodb, 'batch_get_item', wraps=handler.dynamodb.batch_get_item) as batch_get:
+            processed, errors = handler.reconcile_jobs_batch(jobs)
+        
+        assert (processed, errors) == (6, 0)
+        assert batch_get.call_count == 1
+        assert transact.call_count == 2
+        
+        credits = {
+            user_id: dynamodb_tables['credits'].get_item(Key={'userId': user_id})['Item']['remaining']
+            for user_id in ('user1', 'user2')
+        }
+        # user1: three 1.00 debits and a 4.00 refund; user2: one 2.50 debit
+        assert credits == {'user1': Decimal('101.00'), 'user2': Decimal('97.50')}
+        for job in jobs:
+            item = dynamodb_tables['jobs'].get_item(Key={'jobId': job['jobId']})['Item']
+            assert item['reconciled'] is True
+            assert 'reconcilePending' not in item
+    
+    def test_batch_reconciler_falls_back_per_job(self, dynamodb_tables, ssm_parameters):
+        """Test that a debit written after the ledger read is not charged twice."""
+        from src import handler
+        
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user1',
+            'remaining': Decimal('100.00')
+        })
+        dynamodb_tables['ledger'].put_item(Item={
+            'ledgerId': 'job1#debit',
+            'userId': 'user1',
+            'type': 'debit',
+            'amount': Decimal('1.00'),
+            'jobId': 'job1'
+        })
+        jobs = [
+            {'jobId': 'job1', 'userId': 'user1', 'status': 'completed', 'seconds': 10},
+            {'jobId': 'job2', 'userId': 'user1', 'status': 'completed', 'seconds': 10}
+        ]
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'), \
+             patch('src.handler.get_ledger_entries', return_value={}):
+            processed, errors = handler.reconcile_jobs_batch(jobs)
+        
+        assert (processed, errors) == (2, 0)
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user1'})['Item']
+        assert credits['remaining'] == Decimal('99.00')
+
+
+@pytest.fixture
+def sweep_state_table(dynamodb_tables):
+    """Create the sweep state table and point the handler at it."""
+    from src import handler
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    table = dynamodb.create_table(
+        TableName='test-sweep-state',
+        KeySchema=[{'AttributeName': 'sweepId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'sweepId', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    with patch.object(handler, 'SWEEP_STATE_TABLE', 'test-sweep-state'):
+        yield table
+
+
+def create_indexed_jobs_table(dynamodb_tables):
+    """Replace the Jobs table with one carrying the sparse unreconciled index."""
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    dynamodb_tables['jobs'].delete()
+    return dynamodb.create_table(
+        TableName='test-jobs',
+        KeySchema=[{'AttributeName': 'jobId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'jobId', 'AttributeType': 'S'},
+            {'AttributeName': 'reconcilePending', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'UnreconciledIndex',
+            'KeySchema': [{'AttributeName': 'reconcilePending', 'KeyType': 'HASH'}],
+            'Projection': {
+                'ProjectionType': 'INCLUDE',
+                'NonKeyAttributes': ['userId', 'status', 'seconds', 'model']
+            }
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def lambda_context(remaining_ms):
+    """Lambda context whose remaining time follows the given values."""
+    context = MagicMock()
+    context.invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:reconciler'
+    context.get_remaining_time_in_millis.side_effect = remaining_ms
+    return context
+
+
+class TestResumableSweep:
+    """Test timer scans that span several invocations."""
+    
+    def seed_jobs(self, dynamodb_tables, count):
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('1000.00')
+        })
+        for i in range(count):
+            dynamodb_tables['jobs'].put_item(Item={
+                'jobId': f'job{i:03d}',
+                'userId': 'user123',
+                'status': 'completed',
+                'seconds': 5,
+                'model': 'default',
+                'reconciled': False
+            })
+    
+    def test_sweep_hands_over_before_time_runs_out(self, dynamodb_tables, ssm_parameters, sweep_state_table):
+        """Test that the cursor is saved and the continuation finishes the sweep."""
+        from src import handler
+        self.seed_jobs(dynamodb_tables, 12)
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'), \
+             patch.object(handler, 'RECONCILE_BATCH_SIZE', 5), \
+             patch.object(handler, 'SCAN_SEGMENTS', 1), \
+             patch.object(handler, 'lambda_client') as mock_lambda:
+            first = lambda_handler(
+                {'source': 'aws.events', 'detail-type': 'Scheduled Event'},
+                lambda_context([900000, 0])
+            )
+            
+            body = json.loads(first['body'])
+            assert body['message'] == 'Timer scan continuing'
+            assert body['processed'] == 5
+            state = sweep_state_table.get_item(Key={'sweepId': 'timer-scan'})['Item']
+            assert state['status'] == 'running'
+            assert json.loads(state['cursor'])['mode'] == 'scan'
+            
+            mock_lambda.invoke.assert_called_once()
+            invoke = mock_lambda.invoke.call_args.kwargs
+            assert invoke['InvocationType'] == 'Event'
+            payload = json.loads(invoke['Payload'])
+            assert payload == {'action': 'continue_sweep', 'sweepId': 'timer-scan', 'version': int(state['version'])}
+            
+            second = lambda_handler(payload, lambda_context(lambda: 900000))
+        
+        body = json.loads(second['body'])
+        assert body['message'] == 'Timer scan completed'
+        assert body['processed'] == 12
+        assert body['invocations'] == 2
+        assert mock_lambda.invoke.call_count == 1
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('994.00')
+    
+    def test_stale_continuation_and_overlapping_start_are_skipped(self, dynamodb_tables, sweep_state_table):
+        """Test that only the latest continuation resumes and schedules do not overlap."""
+        import time
+        sweep_state_table.put_item(Item={
+            'sweepId': 'timer-scan',
+            'status': 'running',
+            'cursor': json.dumps({'mode': 'index', 'status': 1}),
+            'processed': 7,
+            'errors': 0,
+            'invocations': 2,
+            'version': 4,
+            'updatedAt': int(time.time())
+        })
+        
+        with patch('src.handler.reconcile_jobs_batch') as mock_batch:
+            stale = handle_timer_scan({'action': 'continue_sweep', 'sweepId': 'timer-scan', 'version': 3})
+            scheduled = handle_timer_scan({'source': 'aws.events'})
+        
+        assert json.loads(stale['body'])['message'] == 'Timer scan skipped'
+        assert json.loads(scheduled['body'])['message'] == 'Timer scan skipped'
+        mock_batch.assert_not_called()
+    
+    def test_stalled_sweep_is_resumed(self, dynamodb_tables, ssm_parameters, sweep_state_table):
+        """Test that a scheduled start picks up a sweep whose continuation was lost."""
+        self.seed_jobs(dynamodb_tables, 3)
+        sweep_state_table.put_item(Item={
+            'sweepId': 'timer-scan',
+            'status': 'running',
+            'cursor': '',
+            'processed': 7,
+            'errors': 1,
+            'invocations': 2,
+            'version': 4,
+            'updatedAt': 0
+        })
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'):
+            response = handle_timer_scan({'source': 'aws.events'})
+        
+        body = json.loads(response['body'])
+        assert body['message'] == 'Timer scan completed'
+        assert (body['processed'], body['errors']) == (10, 1)
+        state = sweep_state_table.get_item(Key={'sweepId': 'timer-scan'})['Item']
+        assert state['status'] == 'completed'
+        assert state['version'] == 6
+
+
+def stream_record(sequence_number, new_image, old_image=None, event_name='MODIFY'):
+    """Build a Jobs stream record from plain job attributes."""
+    from boto3.dynamodb.types import TypeSerializer
+    serializer = TypeSerializer()
+    images = {
+        'SequenceNumber': sequence_number,
+        'NewImage': {k: serializer.serialize(v) for k, v in new_image.items()}
+    }
+    if old_image is not None:
+        images['OldImage'] = {k: serializer.serialize(v) for k, v in old_image.items()}
+    return {'eventSource': 'aws:dynamodb', 'eventName': event_name, 'dynamodb': images}
+
+
+class TestJobsStream:
+    """Test Jobs table stream processing."""
+    
+    def test_status_transitions_are_reconciled(self, dynamodb_tables, ssm_parameters):
+        """Test that only transitions to completed/failed are reconciled."""
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        running = {'jobId': 'job1', 'userId': 'user123', 'status': 'running'}
+        completed = dict(running, status='completed', seconds=10, model='default')
+        records = [
+            stream_record('1', running, event_name='INSERT'),
+            stream_record('2', completed, running),
+            # Our own reconciled flag update: same status, not a transition
+            stream_record('3', dict(completed, reconciled=True), completed)
+        ]
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'):
+            response = lambda_handler({'Records': records}, None)
+        
+        assert response == {'batchItemFailures': []}
+        ledger_items = dynamodb_tables['ledger'].scan()['Items']
+        assert [item['ledgerId'] for item in ledger_items] == ['job1#debit']
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('99.00')
+    
+    def test_failed_job_without_debit_leaves_the_index(self, dynamodb_tables):
+        """Test that a failed job with nothing to refund is indexed, then settled, by its stream record."""
+        from src import handler
+        jobs_table = create_indexed_jobs_table(dynamodb_tables)
+        running = {'jobId': 'job1', 'userId': 'user123', 'status': 'running'}
+        failed = dict(running, status='failed')
+        jobs_table.put_item(Item=failed)
+        
+        with patch('src.handler.cloudwatch'), \
+             patch.object(handler, 'mark_reconcile_pending', wraps=handler.mark_reconcile_pending) as mark:
+            response = lambda_handler({'Records': [stream_record('1', failed, running)]}, None)
+        
+        assert response == {'batchItemFailures': []}
+        assert mark.call_count == 1
+        job = jobs_table.get_item(Key={'jobId': 'job1'})['Item']
+        assert job['reconciled'] is True
+        assert 'reconcilePending' not in job
+        assert handler.find_unreconciled_jobs() == []
+        assert dynamodb_tables['ledger'].scan()['Items'] == []
+    
+    def test_stream_debit_is_not_anomalous(self, dynamodb_tables, ssm_parameters):
+        """Test that a normal job without a result_url on its item is not flagged."""
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        running = {'jobId': 'job1', 'userId': 'user123', 'status': 'running'}
+        completed = dict(running, status='completed', seconds=10, model='default')
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm') as mock_llm:
+            response = lambda_handler({'Records': [stream_record('1', completed, running)]}, None)
+        
+        assert response == {'batchItemFailures': []}
+        mock_llm.assert_not_called()
+        debit = dynamodb_tables['ledger'].get_item(Key={'ledgerId': 'job1#debit'})['Item']
+        assert 'anomaly' not in debit
+    
+    def test_failure_reports_first_failed_record(self, dynamodb_tables, ssm_parameters):
+        """Test that processing stops at the first failure to keep shard order."""
+        records = [
+            stream_record(str(i), {'jobId': f'job{i}', 'userId': 'user123', 'status': 'failed'},
+                          {'jobId': f'job{i}', 'userId': 'user123', 'status': 'running'})
+            for i in range(1, 4)
+        ]
+        calls = []
+        
+        def reconcile(job, source):
+            calls.append(job['jobId'])
+            if job['jobId'] == 'job2':
+                raise Exception('throttled')
+            return {'statusCode': 200, 'body': 'ok'}
+        
+        with patch('src.handler.reconcile_job', side_effect=reconcile), \
+             patch('src.handler.outcome_counter') as counter:
+            response = lambda_handler({'Records': records}, None)
+        
+        assert response == {'batchItemFailures': [{'itemIdentifier': '2'}]}
+        assert calls == ['job1', 'job2']
+        # Health outcomes: job1 reconciled, job2 failed, job3 not attempted
+        counter.record.assert_any_call(True, 1)
+        counter.record.assert_any_call(False)
+        counter.flush.assert_called_once()
+    
+    def test_failed_record_is_left_for_the_sweep(self, dynamodb_tables, ssm_parameters):
+        """Test that a job written by the producer, whose stream record fails, is reconciled by the sweep."""
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb_tables['jobs'].delete()
+        jobs_table = dynamodb.create_table(
+            TableName='test-jobs',
+            KeySchema=[{'AttributeName': 'jobId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'jobId', 'AttributeType': 'S'},
+                {'AttributeName': 'reconcilePending', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'UnreconciledIndex',
+                'KeySchema': [{'AttributeName': 'reconcilePending', 'KeyType': 'HASH'}],
+                'Projection': {
+                    'ProjectionType': 'INCLUDE',
+                    'NonKeyAttributes': ['userId', 'status', 'seconds', 'model']
+                }
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dynamodb_tables['credits'].put_item(Item={
+            'userId': 'user123',
+            'remaining': Decimal('100.00')
+        })
+        # Written the way the video service writes it: no reconcilePending
+        running = {'jobId': 'job1', 'userId': 'user123', 'status': 'running'}
+        completed = dict(running, status='completed', seconds=10, model='default')
+        jobs_table.put_item(Item=completed)
+        
+        with patch('src.handler.reconcile_job', side_effect=Exception('throttled')):
+            response = lambda_handler({'Records': [stream_record('1', completed, running)]}, None)
+        assert response == {'batchItemFailures': [{'itemIdentifier': '1'}]}
+        
+        with patch('src.handler.cloudwatch'), \
+             patch('src.handler.invoke_llm', return_value='n/a'), \
+             patch.object(jobs_table.meta.client, 'scan') as mock_scan:
+            result = handle_timer_scan()
+        
+        mock_scan.assert_not_called()
+        assert json.loads(result['body'])['processed'] == 1
+        job = jobs_table.get_item(Key={'jobId': 'job1'})['Item']
+        assert job['reconciled'] is True
+        assert 'reconcilePending' not in job
+        credits = dynamodb_tables['credits'].get_item(Key={'userId': 'user123'})['Item']
+        assert credits['remaining'] == Decimal('99.00')
+
+
+def intake_record(message_id, detail_type, detail):
+    """Build an SQS record carrying an EventBridge event."""
+    return {
+        'eventSource': 'aws:sqs',
+        'messageId': message_id,
+        'body': json.dumps({'source': 'video.generation', 'detail-type': detail_type, 'detail': detail}),
+        'attributes': {'SentTimestamp': '1700000000000'}
+    }
+
+
+class TestIntakeQueue:
+    """Test SQS-buffered event intake."""
+    
+    def test_batch_debits_and_refunds(self, dynamodb_tables, ssm_parameters):
+        """Test that a batch is applied and reported with one metrics call."""
+        for user_id in ('user1', 'user2'):
+            dynamodb_tables['credits'].put_item(Item={
+                'userId': user_id,
+                'remaining': Decimal('100.00')
+            })
+        records = [
+            intake_record('m1', 'video.rendered', {'jobId': 'job1', 'userId': 'user1', 'seconds': 10,
+                                                   'model': 'default', 'result_url': 'https://x/1.mp4'}),
+            intake_record('m2', 'video.rendered', {'jobId': 'job2', 'userId': 'user2', 'seconds': 20,
+                                                   'model': 'default', 'result_url': 'https://x/2.mp4'}),
+            intake_record('m3', 'video.failed', {'jobId': 'job1', 'userId': 'user1'}),
+            intake_record('m4', 'video.rendered', {'jobId': 'job3'})
+        ]
+        
+        with patch('src.handler.cloudwatch') as mock_cw:
+            response = lambda_handler({'Records': records}, {})
+        
+        assert response == {'batchItemFailures': []}
+        user1 = dynamodb_tables['credits'].get_item(Key={'userId': 'user1'})['Item']
+        user2 = dynamodb_tables['credits'].get_item(Key={'userId': 'user2'})['Item']
+        assert user1['remaining'] == Decimal('100.00')
+        assert user2['remaining'] == Decimal('98.00')
+        
+        batch_metrics = [
+            c.kwargs['MetricData'] for c in mock_cw.put_metric_data.call_args_list
+            if c.kwargs['MetricData'][0]['MetricName'] == 'IntakeBatchSize'
+        ]
+        assert len(batch_metrics) == 1
+        metrics = {m['MetricName']: m['Value'] for m in batch_metrics[0]}
+        assert metrics['IntakeBatchSize'] == 4
+        assert metrics['IntakeFailures'] == 0
+        assert metrics['IntakeQueueLatency'] > 0
+    
+    def test_failure_holds_back_later_events_of_the_same_user(self, dynamodb_tables):
+        """Test that a failed event and the user's later events are retried, others are not."""
+        from src import handler
+        
+        def rendered(detail):
+            if detail['jobId'] == 'job1':
+                raise RuntimeError('throttled')
+            return {'statusCode': 200, 'body': 'ok'}
+        
+        records = [
+            intake_record('m1', 'video.rendered', {'jobId': 'job1', 'userId': 'user1', 'seconds': 10}),
+            intake_record('m2', 'video.rendered', {'jobId': 'job2', 'userId': 'user2', 'seconds': 10}),
+            intake_record('m3', 'video.failed', {'jobId': 'job1', 'userId': 'user1'})
+        ]
+        
+        with patch('src.handler.cloudwatch'), \
+             patch.object(handler, 'handle_video_rendered', side_effect=rendered) as mock_rendered, \
+             patch.object(handler, 'handle_video_failed') as mock_failed:
+            response = handler.handle_intake_batch(records)
+        
+        assert sorted(f['itemIdentifier'] for f in response['batchItemFailures']) == ['m1', 'm3']
+        assert mock_rendered.call_count == 2
+        mock_failed.assert_not_called()
+
 
 class TestUtilityFunctions:
     """Test utility functions."""
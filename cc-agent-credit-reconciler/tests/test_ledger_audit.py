@@ -0,0 +1,134 @@
+import boto3
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from moto import mock_aws
+
+from src.ledger_audit import LedgerAuditor
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def auditor():
+    """Ledger (with UserIdIndex), Credits and checkpoint tables."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        ledger = dynamodb.create_table(
+            TableName='test-ledger',
+            KeySchema=[{'AttributeName': 'ledgerId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'ledgerId', 'AttributeType': 'S'},
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'UserIdIndex',
+                'KeySchema': [
+                    {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        tables = {}
+        for name in ('test-credits', 'test-checkpoints'):
+            tables[name] = dynamodb.create_table(
+                TableName=name,
+                KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+        yield LedgerAuditor(ledger, tables['test-credits'], tables['test-checkpoints'],
+                            clock=lambda: (NOW - datetime(1970, 1, 1)).total_seconds())
+
+
+def add_entry(auditor, user_id, n, entry_type, amount, minutes_ago):
+    auditor.ledger_table.put_item(Item={
+        'ledgerId': f'{user_id}-{n}',
+        'userId': user_id,
+        'timestamp': (NOW - timedelta(minutes=minutes_ago)).isoformat(),
+        'type': entry_type,
+        'amount': Decimal(amount)
+    })
+
+
+class TestCheckpoints:
+    """Test checkpoint creation and replay from checkpoints."""
+    
+    def test_replay_starts_after_checkpoint(self, auditor):
+        """Test that only entries after the checkpoint are replayed."""
+        add_entry(auditor, 'u1', 1, 'credit', '100', minutes_ago=60)
+        add_entry(auditor, 'u1', 2, 'debit', '10', minutes_ago=30)
+        add_entry(auditor, 'u1', 3, 'debit', '5', minutes_ago=20)
+        
+        assert auditor.checkpoint_user('u1')
+        checkpoint = auditor.checkpoints_table.get_item(Key={'userId': 'u1'})['Item']
+        assert checkpoint['balance'] == Decimal('85')
+        assert checkpoint['entryCount'] == 3
+        
+        add_entry(auditor, 'u1', 4, 'credit', '2.5', minutes_ago=1)
+        balance, replay = auditor.ledger_balance('u1')
+        assert balance == Decimal('87.5')
+        assert replay['replayed'] == 1
+    
+    def test_unsettled_entries_stay_out_of_checkpoints(self, auditor):
+        """Test that entries inside the settle window are left for the next checkpoint."""
+        add_entry(auditor, 'u1', 1, 'credit', '100', minutes_ago=60)
+        add_entry(auditor, 'u1', 2, 'debit', '10', minutes_ago=1)
+        
+        auditor.checkpoint_user('u1')
+        
+        checkpoint = auditor.checkpoints_table.get_item(Key={'userId': 'u1'})['Item']
+        assert checkpoint['balance'] == Decimal('100')
+        assert not auditor.checkpoint_user('u1')
+    
+    def test_checkpoint_never_moves_backwards(self, auditor):
+        """Test the monotonic checkpoint condition."""
+        add_entry(auditor, 'u1', 1, 'credit', '100', minutes_ago=60)
+        auditor.checkpoints_table.put_item(Item={
+            'userId': 'u1',
+            'asOf': (NOW - timedelta(minutes=10)).isoformat(),
+            'balance': Decimal('42'),
+            'entryCount': 7
+        })
+        
+        assert not auditor.checkpoint_user('u1')
+        assert auditor.checkpoints_table.get_item(Key={'userId': 'u1'})['Item']['balance'] == Decimal('42')
+
+
+class TestAudit:
+    """Test the all-user balance audit."""
+    
+    def test_reports_only_drifting_users(self, auditor):
+        """Test a parallel audit over many users with one drifting balance."""
+        for i in range(20):
+            user_id = f'u{i}'
+            add_entry(auditor, user_id, 1, 'credit', '50', minutes_ago=60)
+            add_entry(auditor, user_id, 2, 'debit', '7.25', minutes_ago=30)
+            remaining = Decimal('42.75') if i != 13 else Decimal('40.00')
+            auditor.credits_table.put_item(Item={'userId': user_id, 'remaining': remaining})
+        
+        report = auditor.audit_all(segments=3, checkpoint=True)
+        
+        assert report['users'] == 20
+        assert report['checkpointed'] == 20
+        assert report['drifting'] == 1
+        assert report['drift'] == [{
+            'userId': 'u13',
+            'remaining': '40.00',
+            'ledgerBalance': '42.75',
+            'drift': '-2.75',
+            'replayed': 0
+        }]
+    
+    def test_report_is_capped(self, auditor):
+        """Test that only max_report drifting users are kept."""
+        for i in range(5):
+            auditor.credits_table.put_item(Item={'userId': f'u{i}', 'remaining': Decimal('1')})
+        
+        report = auditor.audit_all(segments=2, max_report=2)
+        
+        assert report['drifting'] == 5
+        assert len(report['drift']) == 2
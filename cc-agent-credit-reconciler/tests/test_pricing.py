@@ -0,0 +1,159 @@
+import time
+import pytest
+import boto3
+from unittest.mock import MagicMock
+from moto import mock_aws
+from botocore.exceptions import ClientError
+
+from src.pricing import PricingCache, DEFAULT_PRICE_PER_SECOND
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+def parameters_response(prices, next_token=None):
+    response = {'Parameters': [
+        {'Name': f'/fertilia/pricing/{model}', 'Value': str(price)}
+        for model, price in prices.items()
+    ]}
+    if next_token:
+        response['NextToken'] = next_token
+    return response
+
+
+def not_found():
+    return ClientError({'Error': {'Code': 'ParameterNotFound'}}, 'GetParameter')
+
+
+def wait_for_refresh(cache):
+    deadline = time.time() + 2
+    while cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestPricingCache:
+    """Test the per-container pricing table."""
+    
+    def test_loads_every_price_in_one_paginated_sweep(self):
+        """Test that all models are loaded by path and then served from memory."""
+        with mock_aws():
+            ssm = boto3.client('ssm', region_name='us-east-1')
+            for i in range(25):
+                ssm.put_parameter(Name=f'/fertilia/pricing/model-{i}', Value=str(i / 100), Type='String')
+            cache = PricingCache(ssm)
+            ssm.get_parameter = MagicMock(side_effect=AssertionError('per-model read'))
+            
+            assert cache.price('model-0') == 0.0
+            assert cache.price('model-24') == 0.24
+            assert len(cache._prices) == 25
+    
+    def test_lookups_within_ttl_do_not_call_ssm(self):
+        """Test that a fresh table answers without SSM calls."""
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.return_value = parameters_response({'default': 0.1, 'premium': 0.25})
+        cache = PricingCache(ssm, clock=FakeClock())
+        
+        for _ in range(100):
+            assert cache.price('premium') == 0.25
+        
+        ssm.get_parameters_by_path.assert_called_once()
+    
+    def test_unknown_model_is_negatively_cached(self):
+        """Test that a model without a parameter is looked up once per negative TTL."""
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.return_value = parameters_response({'default': 0.1})
+        ssm.get_parameter.side_effect = not_found()
+        clock = FakeClock()
+        cache = PricingCache(ssm, negative_ttl=60, clock=clock)
+        
+        assert cache.price('unknown') == DEFAULT_PRICE_PER_SECOND
+        assert cache.price('unknown') == DEFAULT_PRICE_PER_SECOND
+        assert ssm.get_parameter.call_count == 1
+        
+        clock.now += 61
+        cache.price('unknown')
+        assert ssm.get_parameter.call_count == 2
+    
+    def test_refresh_ahead_serves_current_table(self):
+        """Test that lookups near expiry return immediately and reload in the background."""
+        import threading
+        release = threading.Event()
+        
+        def get_parameters_by_path(**kwargs):
+            if ssm.get_parameters_by_path.call_count == 1:
+                return parameters_response({'default': 0.1})
+            release.wait(2)
+            return parameters_response({'default': 0.2})
+        
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.side_effect = get_parameters_by_path
+        clock = FakeClock()
+        cache = PricingCache(ssm, ttl=300, refresh_ahead=60, clock=clock)
+        assert cache.price('default') == 0.1
+        
+        clock.now += 250
+        assert cache.price('default') == 0.1
+        assert cache.price('default') == 0.1
+        release.set()
+        wait_for_refresh(cache)
+        
+        assert ssm.get_parameters_by_path.call_count == 2
+        assert cache.price('default') == 0.2
+    
+    def test_failed_reload_keeps_previous_table(self):
+        """Test that SSM errors after the first load serve the last known prices."""
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.side_effect = [
+            parameters_response({'default': 0.1}),
+            ClientError({'Error': {'Code': 'ThrottlingException'}}, 'GetParametersByPath')
+        ]
+        clock = FakeClock()
+        cache = PricingCache(ssm, ttl=300, clock=clock)
+        cache.price('default')
+        
+        clock.now += 301
+        assert cache.price('default') == 0.1
+    
+    def test_first_load_error_is_raised(self):
+        """Test that a cold container surfaces SSM errors."""
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException'}}, 'GetParametersByPath'
+        )
+        
+        with pytest.raises(ClientError):
+            PricingCache(ssm).price('default')
+    
+    def test_invalidate_model(self):
+        """Test that invalidating one model re-reads only that parameter."""
+        ssm = MagicMock()
+        ssm.get_parameters_by_path.return_value = parameters_response({'default': 0.1})
+        ssm.get_parameter.return_value = {'Parameter': {'Value': '0.15'}}
+        cache = PricingCache(ssm, clock=FakeClock())
+        cache.price('default')
+        
+        cache.invalidate('default')
+        
+        assert cache.price('default') == 0.15
+        ssm.get_parameters_by_path.assert_called_once()
+    
+    def test_parameter_change_event_invalidates_handler_cache(self):
+        """Test that SSM change events reach the handler's cache."""
+        from src.handler import lambda_handler, pricing_cache
+        
+        pricing_cache._prices = {'default': 0.1, 'premium': 0.25}
+        pricing_cache._expires = time.time() + 300
+        
+        lambda_handler({
+            'source': 'aws.ssm',
+            'detail-type': 'Parameter Store Change',
+            'detail': {'name': '/fertilia/pricing/premium', 'operation': 'Update'}
+        }, None)
+        
+        assert pricing_cache._prices == {'default': 0.1}
+        pricing_cache.invalidate()
@@ -1,5 +1,7 @@
 import os
 import json
+import time
+import hashlib
 import logging
 import boto3
 import asyncio
@@ -11,8 +13,10 @@ from pythonjsonlogger import jsonlogger
 import sys
 sys.path.insert(0, '/opt')  # For Lambda layer
 from secrets_manager import secrets_manager
+from outcome_counters import OutcomeCounter
 
 from .sources.trends_scrapers import TrendsScraper
+from .sources.snapshots import SnapshotStore, RAW_SOURCES_PATH
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -28,6 +32,19 @@ cloudwatch = boto3.client("cloudwatch")
 TABLE_NAME = os.environ.get("DDB_TABLE_NAME")
 BUCKET = os.environ.get("S3_BUCKET")
 LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4")
+RAW_SOURCES_KEY = "snapshots/raw_sources.json"
+# Phrases generated at once, and the deadline for each phrase's completion (seconds)
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "10"))
+LLM_CALL_TIMEOUT = float(os.environ.get("LLM_CALL_TIMEOUT", "8"))
+# "batch": one structured request for all phrases; "per_phrase": one request each
+PROMPT_GENERATION_MODE = os.environ.get("PROMPT_GENERATION_MODE", "batch")
+LLM_BATCH_TIMEOUT = float(os.environ.get("LLM_BATCH_TIMEOUT", "20"))
+# Generated prompts are reused for recurring phrases this long; 0 disables the cache
+GENERATION_CACHE_TTL_DAYS = float(os.environ.get("GENERATION_CACHE_TTL_DAYS", "7"))
+# Minute-bucketed success/error counters read by the routing manager's health monitor
+AGENT_ID = os.environ.get("AGENT_ID", "prompt-curator")
+AGENT_OUTCOMES_TABLE = os.environ.get("AGENT_OUTCOMES_TABLE")
+outcome_counter = OutcomeCounter(ddb.Table(AGENT_OUTCOMES_TABLE) if AGENT_OUTCOMES_TABLE else None, AGENT_ID)
 
 def lambda_handler(event, context):
     run_date = datetime.utcnow().strftime("%Y-%m-%d")
@@ -58,6 +75,7 @@ def lambda_handler(event, context):
             "generated_count": len(prompts),
             "took_ms": int((datetime.utcnow() - start_time).total_seconds() * 1000)
         })
+        outcome_counter.record(True)
         
         return {
             "statusCode": 200,
@@ -74,11 +92,35 @@ def lambda_handler(event, context):
             "error": str(e),
             "took_ms": int((datetime.utcnow() - start_time).total_seconds() * 1000)
         })
+        outcome_counter.record(False)
         raise
+    finally:
+        outcome_counter.flush()
 
 async def collect_trending_phrases() -> List[Dict[str, str]]:
-    async with TrendsScraper() as scraper:
-        return await scraper.collect_all_trends()
+    restore_raw_sources()
+    async with TrendsScraper(snapshots=SnapshotStore(RAW_SOURCES_PATH)) as scraper:
+        phrases = await scraper.collect_all_trends()
+    backup_raw_sources()
+    emit_source_metrics(scraper.stats)
+    return phrases
+
+def restore_raw_sources():
+    # /tmp does not outlive the container; the bucket copy carries validators between runs
+    if os.path.exists(RAW_SOURCES_PATH):
+        return
+    try:
+        s3.download_file(BUCKET, RAW_SOURCES_KEY, RAW_SOURCES_PATH)
+    except Exception as e:
+        logger.info("No raw source snapshot restored", extra={"key": RAW_SOURCES_KEY, "error": str(e)})
+
+def backup_raw_sources():
+    if not os.path.exists(RAW_SOURCES_PATH):
+        return
+    try:
+        s3.upload_file(RAW_SOURCES_PATH, BUCKET, RAW_SOURCES_KEY)
+    except Exception as e:
+        logger.error("Failed to back up raw source snapshot", extra={"key": RAW_SOURCES_KEY, "error": str(e)})
 
 def dedupe_and_score(phrases: List[Dict[str, str]]) -> List[Dict[str, Any]]:
     phrase_counts = Counter()
@@ -121,64 +163,272 @@ def calculate_score(phrase: str, count: int, source_count: int) -> float:
     
     return frequency_score + diversity_bonus + length_bonus + hashtag_bonus
 
+SYSTEM_PROMPT = "You are a viral-video copywriter specializing in creating engaging text-to-video prompts."
+PHRASE_PROMPT = """Create a SHORT, vivid text prompt (≤80 characters) suitable for an 8-second 720p AI video based on this trending topic: "{phrase}"
+
+Include cinematic cues and make it visually compelling. Return only the prompt text, nothing else."""
+
+BATCH_PROMPT = """For each trending topic below, create a SHORT, vivid text prompt (≤80 characters) suitable for an 8-second 720p AI video, with cinematic cues that make it visually compelling, and pick the mood that fits it.
+
+Return one template per topic, with the topic copied exactly as its title.
+{topics}"""
+
+MOODS = ["upbeat", "dramatic", "serene", "energetic", "neutral"]
+# Appended in JSON mode, for models that reject the json_schema response format
+JSON_MODE_PROMPT = """
+
+Answer with a JSON object of the form {{"templates": [{{"title": "...", "prompt_text": "...", "mood": "..."}}]}}, where mood is one of: {moods}."""
+TEMPLATES_SCHEMA = {
+    "name": "prompt_templates",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "templates": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string"},
+                        "prompt_text": {"type": "string"},
+                        "mood": {"type": "string", "enum": MOODS}
+                    },
+                    "required": ["title", "prompt_text", "mood"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["templates"],
+        "additionalProperties": False
+    }
+}
+
 def generate_prompts(scored_phrases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    prompts = []
+    return asyncio.run(generate_prompts_async(scored_phrases))
+
+async def generate_prompts_async(scored_phrases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Serve cached phrases, generate the rest with the LLM and cache them; keeps score order."""
+    cached = load_cached_prompts(scored_phrases)
+    prompts = {
+        item["phrase"]: build_prompt(item, cached[cache_key(item["phrase"])]["prompt_text"],
+                                     cached[cache_key(item["phrase"])]["mood"])
+        for item in scored_phrases if cache_key(item["phrase"]) in cached
+    }
+    missing = [item for item in scored_phrases if item["phrase"] not in prompts]
+    if GENERATION_CACHE_TTL_DAYS > 0:
+        emit_cache_metrics(len(prompts), len(missing))
+    
+    if missing:
+        generated = await generate_with_llm(missing)
+        store_cached_prompts(generated)
+        prompts.update((prompt["title"], prompt) for prompt in generated)
+    
+    return [prompts[item["phrase"]] for item in scored_phrases if item["phrase"] in prompts]
+
+async def generate_with_llm(scored_phrases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    api_key = secrets_manager.get_openai_api_key()
+    if not api_key:
+        logger.error("OpenAI API key not found in Secrets Manager")
+        return []
+    
+    async with create_llm_client(api_key) as client:
+        if PROMPT_GENERATION_MODE == "batch" and len(scored_phrases) > 1:
+            return await generate_prompts_batched(client, scored_phrases)
+        return await generate_each(client, scored_phrases)
+
+def cache_key(phrase: str) -> str:
+    return clean_phrase(phrase)
+
+def cache_partition() -> str:
+    # A new model or prompt wording starts a fresh cache
+    template = json.dumps([SYSTEM_PROMPT, PHRASE_PROMPT, BATCH_PROMPT, TEMPLATES_SCHEMA], sort_keys=True)
+    template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+    return f"cache#{LLM_MODEL}#{template_hash}"
+
+def load_cached_prompts(scored_phrases: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Unexpired cache entries by phrase key; a failed read counts as all misses."""
+    if GENERATION_CACHE_TTL_DAYS <= 0 or not scored_phrases:
+        return {}
     
-    for item in scored_phrases:
-        phrase = item["phrase"]
+    partition = cache_partition()
+    now = int(time.time())
+    keys = list({cache_key(item["phrase"]) for item in scored_phrases})
+    found = {}
+    try:
+        client = ddb.meta.client
+        for start in range(0, len(keys), 100):
+            request = {TABLE_NAME: {"Keys": [{"date": partition, "slug": key} for key in keys[start:start + 100]]}}
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                for item in response["Responses"].get(TABLE_NAME, []):
+                    if int(item.get("expires_at", 0)) > now:
+                        found[item["slug"]] = item
+                request = response.get("UnprocessedKeys")
+    except Exception as e:
+        logger.error("Failed to read generation cache", extra={"error": str(e)})
+        return {}
+    return found
+
+def store_cached_prompts(prompts: List[Dict[str, Any]]):
+    if GENERATION_CACHE_TTL_DAYS <= 0 or not prompts:
+        return
+    
+    partition = cache_partition()
+    now = int(time.time())
+    try:
+        with ddb.Table(TABLE_NAME).batch_writer(overwrite_by_pkeys=["date", "slug"]) as batch:
+            for prompt in prompts:
+                batch.put_item(Item={
+                    "date": partition,
+                    "slug": cache_key(prompt["title"]),
+                    "prompt_text": prompt["prompt_text"],
+                    "mood": prompt["mood"],
+                    "created_at": now,
+                    "expires_at": now + int(GENERATION_CACHE_TTL_DAYS * 86400)
+                })
+    except Exception as e:
+        logger.error("Failed to write generation cache", extra={"error": str(e)})
+
+async def generate_each(client, scored_phrases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    
+    async def generate(item: Dict[str, Any]):
+        async with semaphore:
+            return await generate_prompt(client, item)
+    
+    results = await asyncio.gather(*(generate(item) for item in scored_phrases))
+    return [prompt for prompt in results if prompt]
+
+async def generate_prompts_batched(client, scored_phrases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One structured request for every phrase; items missing from the answer are asked for one by one."""
+    by_title = {item["phrase"]: item for item in scored_phrases}
+    prompts = {}
+    topics = "\n".join(f"- {item['phrase']}" for item in scored_phrases)
+    try:
+        json_mode = LLM_MODEL in json_schema_rejected
         try:
-            system_prompt = "You are a viral-video copywriter specializing in creating engaging text-to-video prompts."
-            user_prompt = f"""Create a SHORT, vivid text prompt (≤80 characters) suitable for an 8-second 720p AI video based on this trending topic: "{phrase}"
+            response = await request_templates(client, topics, len(scored_phrases), json_mode)
+        except Exception as e:
+            if json_mode or getattr(e, "status_code", None) != 400:
+                raise
+            # Models without structured outputs (gpt-4) reject json_schema; parse_templates checks the answer
+            logger.warning("Structured output rejected, retrying in JSON mode",
+                           extra={"model": LLM_MODEL, "error": str(e)})
+            json_schema_rejected.add(LLM_MODEL)
+            response = await request_templates(client, topics, len(scored_phrases), json_mode=True)
+        for template in parse_templates(response.choices[0].message.content):
+            item = by_title.get(clean_phrase(template["title"]))
+            if item and item["phrase"] not in prompts:
+                prompts[item["phrase"]] = build_prompt(item, template["prompt_text"], template["mood"])
+    except asyncio.TimeoutError:
+        logger.error("Batched prompt generation timed out", extra={"timeout_s": LLM_BATCH_TIMEOUT})
+    except Exception as e:
+        logger.error("Batched prompt generation failed", extra={"error": str(e)})
+    
+    missing = [item for item in scored_phrases if item["phrase"] not in prompts]
+    logger.info("Generated prompts in one request", extra={
+        "requested": len(scored_phrases), "returned": len(prompts), "retrying": len(missing)
+    })
+    for prompt in await generate_each(client, missing):
+        prompts[prompt["title"]] = prompt
+    
+    return [prompts[item["phrase"]] for item in scored_phrases if item["phrase"] in prompts]
 
-Include cinematic cues and make it visually compelling. Return only the prompt text, nothing else."""
+# Models that rejected the json_schema format in this container
+json_schema_rejected = set()
 
-            from openai import OpenAI
-            
-            # Get API key from Secrets Manager
-            api_key = secrets_manager.get_openai_api_key()
-            if not api_key:
-                logger.error("OpenAI API key not found in Secrets Manager")
-                continue
-                
-            # Initialize without proxy settings to avoid Lambda issues
-            import httpx
-            client = OpenAI(
-                api_key=api_key,
-                http_client=httpx.Client(proxies=None)
-            )
-            response = client.chat.completions.create(
+async def request_templates(client, topics: str, count: int, json_mode: bool):
+    """The batched completion, schema-enforced or, in JSON mode, only shaped by the prompt."""
+    prompt = BATCH_PROMPT.format(topics=topics)
+    if json_mode:
+        prompt += JSON_MODE_PROMPT.format(moods=", ".join(MOODS))
+        response_format = {"type": "json_object"}
+    else:
+        response_format = {"type": "json_schema", "json_schema": TEMPLATES_SCHEMA}
+    return await asyncio.wait_for(
+        client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format=response_format,
+            max_tokens=60 * count,
+            temperature=0.7
+        ),
+        timeout=LLM_BATCH_TIMEOUT
+    )
+
+def parse_templates(content: str) -> List[Dict[str, str]]:
+    """Templates from a structured answer that match TEMPLATES_SCHEMA; malformed items are dropped."""
+    try:
+        templates = json.loads(content)["templates"]
+    except (ValueError, TypeError, KeyError):
+        logger.warning("Unparseable batched prompt answer", extra={"answer": (content or "")[:200]})
+        return []
+    if not isinstance(templates, list):
+        return []
+    
+    valid = []
+    for template in templates:
+        if (isinstance(template, dict)
+                and isinstance(template.get("title"), str)
+                and isinstance(template.get("prompt_text"), str) and template["prompt_text"].strip()
+                and template.get("mood") in MOODS):
+            valid.append(template)
+        else:
+            logger.warning("Dropping malformed template", extra={"template": str(template)[:200]})
+    return valid
+
+def create_llm_client(api_key: str):
+    from openai import AsyncOpenAI
+    import httpx
+    
+    # One client per run: its connection pool is shared by every phrase
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(),
+        max_retries=1
+    )
+
+async def generate_prompt(client, item: Dict[str, Any]):
+    phrase = item["phrase"]
+    try:
+        response = await asyncio.wait_for(
+            client.chat.completions.create(
                 model=LLM_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": PHRASE_PROMPT.format(phrase=phrase)}
                 ],
                 max_tokens=50,
                 temperature=0.7
-            )
-            
-            prompt_text = response.choices[0].message.content.strip()
-            if len(prompt_text) > 80:
-                prompt_text = prompt_text[:77] + "..."
-            
-            slug = create_slug(phrase)
-            mood = determine_mood(phrase)
-            
-            prompts.append({
-                "title": phrase,
-                "slug": slug,
-                "prompt_text": prompt_text,
-                "mood": mood,
-                "score": item["score"],
-                "sources": item["sources"]
-            })
-            
-            logger.info("Generated prompt", extra={"phrase": phrase, "prompt_length": len(prompt_text)})
-            
-        except Exception as e:
-            logger.error("Failed to generate prompt", extra={"phrase": phrase, "error": str(e)})
-            continue
+            ),
+            timeout=LLM_CALL_TIMEOUT
+        )
+        prompt = build_prompt(item, response.choices[0].message.content)
+        logger.info("Generated prompt", extra={"phrase": phrase, "prompt_length": len(prompt["prompt_text"])})
+        return prompt
+    except asyncio.TimeoutError:
+        logger.error("Prompt generation timed out", extra={"phrase": phrase, "timeout_s": LLM_CALL_TIMEOUT})
+    except Exception as e:
+        logger.error("Failed to generate prompt", extra={"phrase": phrase, "error": str(e)})
+    return None
+
+def build_prompt(item: Dict[str, Any], prompt_text: str, mood: str = None) -> Dict[str, Any]:
+    phrase = item["phrase"]
+    prompt_text = prompt_text.strip()
+    if len(prompt_text) > 80:
+        prompt_text = prompt_text[:77] + "..."
     
-    return prompts
+    return {
+        "title": phrase,
+        "slug": create_slug(phrase),
+        "prompt_text": prompt_text,
+        "mood": mood or determine_mood(phrase),
+        "score": item["score"],
+        "sources": item["sources"]
+    }
 
 def create_slug(phrase: str) -> str:
     slug = re.sub(r'[^\w\s-]', '', phrase.lower())
@@ -269,6 +519,54 @@ def emit_invalidation_event(run_date: str):
     except Exception as e:
         logger.error("Failed to emit invalidation event", extra={"error": str(e)})
 
+def emit_source_metrics(stats: Dict[str, Dict[str, Any]]):
+    metric_data = []
+    for source, source_stats in stats.items():
+        dimensions = [{'Name': 'Source', 'Value': source}]
+        metric_data.extend([
+            {'MetricName': 'SourceLatency', 'Dimensions': dimensions,
+             'Value': source_stats.get('latency_ms', 0), 'Unit': 'Milliseconds'},
+            {'MetricName': 'SourceBytes', 'Dimensions': dimensions,
+             'Value': source_stats.get('bytes', 0), 'Unit': 'Bytes'},
+            {'MetricName': 'SourcePhrases', 'Dimensions': dimensions,
+             'Value': source_stats.get('phrases', 0), 'Unit': 'Count'},
+            {'MetricName': 'SourceFailures', 'Dimensions': dimensions,
+             'Value': 1 if source_stats.get('outcome') in ('failed', 'timeout') else 0, 'Unit': 'Count'}
+        ])
+    if not metric_data:
+        return
+    try:
+        # PutMetricData takes at most 1000 values per call
+        for start in range(0, len(metric_data), 1000):
+            cloudwatch.put_metric_data(
+                Namespace='ContentCraft/PromptCurator',
+                MetricData=metric_data[start:start + 1000]
+            )
+        logger.info("Trend source stats", extra={"sources": stats})
+    except Exception as e:
+        logger.error("Failed to emit source metrics", extra={"error": str(e)})
+
+def emit_cache_metrics(hits: int, misses: int):
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='ContentCraft/PromptCurator',
+            MetricData=[
+                {
+                    'MetricName': 'GenerationCacheHits',
+                    'Value': hits,
+                    'Unit': 'Count'
+                },
+                {
+                    'MetricName': 'GenerationCacheMisses',
+                    'Value': misses,
+                    'Unit': 'Count'
+                }
+            ]
+        )
+        logger.info("Generation cache lookup", extra={"hits": hits, "misses": misses})
+    except Exception as e:
+        logger.error("Failed to emit cache metrics", extra={"error": str(e)})
+
 def emit_metrics(prompt_count: int, start_time: datetime):
     try:
         duration_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
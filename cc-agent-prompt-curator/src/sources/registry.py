@@ -0,0 +1,84 @@
+import importlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field, replace
+from importlib.metadata import entry_points
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "cc_prompt_curator.trend_sources"
+
+@dataclass
+class TrendSource:
+    name: str
+    url: str
+    parse: Callable[[bytes], List[str]]
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Deadline for the whole fetch, retries included (seconds)
+    timeout: float = 5.0
+    retries: int = 2
+    # Full-jitter backoff: sleep up to backoff * 2**attempt before each retry (seconds)
+    backoff: float = 0.25
+    # Requests in flight to this source at once
+    concurrency: int = 1
+    enabled: bool = True
+
+def builtin_sources() -> List[TrendSource]:
+    from .trends_scrapers import parse_trends24, parse_tiktok_trends, parse_google_trends, TIKTOK_HEADERS
+    return [
+        TrendSource("trends24", "https://trends24.in/api/trending.json", parse_trends24),
+        TrendSource("tiktok", "https://www.tiktok.com/api/trending/feed/", parse_tiktok_trends,
+                    headers=TIKTOK_HEADERS),
+        TrendSource("google", "https://trends.google.com/trends/trendingsearches/daily/rss", parse_google_trends)
+    ]
+
+def load_sources(config: Optional[str] = None) -> List[TrendSource]:
+    """Built-in sources, then entry-point plugins, then TREND_SOURCES config overrides, by name."""
+    sources = {source.name: source for source in builtin_sources()}
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            plugin = entry_point.load()
+            source = plugin() if callable(plugin) and not isinstance(plugin, TrendSource) else plugin
+            sources[source.name] = source
+        except Exception as e:
+            logger.error(f"Failed to load trend source plugin {entry_point.name}: {e}")
+
+    config = config if config is not None else os.environ.get("TREND_SOURCES", "")
+    try:
+        overrides = json.loads(config) if config else []
+        if not isinstance(overrides, list):
+            raise ValueError("expected a JSON list")
+    except ValueError as e:
+        logger.error(f"Ignoring invalid TREND_SOURCES: {e}")
+        overrides = []
+
+    for settings in overrides:
+        try:
+            source = configure(sources, settings)
+            sources[source.name] = source
+        except Exception as e:
+            logger.error(f"Skipping trend source config {settings!r}: {e}")
+
+    return [source for source in sources.values() if source.enabled]
+
+def configure(sources: Dict[str, TrendSource], settings: Dict) -> TrendSource:
+    """One config entry applied to the source of that name, or a new source (needs name, url and parser)."""
+    settings = dict(settings)
+    name = settings.pop("name", None)
+    if not name:
+        raise ValueError("missing name")
+    if "parser" in settings:
+        settings["parse"] = resolve(settings.pop("parser"))
+    if name in sources:
+        return replace(sources[name], **settings)
+    if "url" not in settings or "parse" not in settings:
+        raise ValueError("a new source needs url and parser")
+    return TrendSource(name=name, **settings)
+
+def resolve(reference: str) -> Callable[[bytes], List[str]]:
+    """Import a "module:function" parser reference."""
+    module, _, attribute = reference.partition(":")
+    return getattr(importlib.import_module(module), attribute)
@@ -0,0 +1,78 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RAW_SOURCES_PATH = os.environ.get("RAW_SOURCES_PATH", "/tmp/raw_sources.json")
+RAW_SOURCES_MAX_BYTES = 10 * 1024 * 1024
+
+class SnapshotStore:
+    """Last raw payload of each trend source, gzipped, with the validators it was served with.
+
+    The file doubles as a fixture: a scraper in replay mode parses these
+    payloads instead of fetching, so pipeline runs can be reproduced exactly.
+    """
+
+    def __init__(self, path: str = RAW_SOURCES_PATH):
+        self.path = path
+        self.dirty = False
+        self.entries: Dict[str, Dict] = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot file {path}: {e}")
+
+    def get(self, source: str) -> Optional[Dict]:
+        return self.entries.get(source)
+
+    def raw(self, source: str) -> Optional[bytes]:
+        entry = self.entries.get(source)
+        if not entry or not entry.get("body"):
+            return None
+        return gzip.decompress(base64.b64decode(entry["body"]))
+
+    def conditional_headers(self, source: str) -> Dict[str, str]:
+        entry = self.entries.get(source) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, source: str, raw: bytes, etag: Optional[str], last_modified: Optional[str],
+            phrases: List[str]):
+        self.entries[source] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": int(time.time()),
+            "size": len(raw),
+            "body": base64.b64encode(gzip.compress(raw)).decode("ascii"),
+            "phrases": phrases
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = json.dumps(self.entries)
+        # Keep under the spec's 10 MB by dropping the largest snapshots first
+        while len(data) > RAW_SOURCES_MAX_BYTES and self.entries:
+            largest = max(self.entries, key=lambda s: len(self.entries[s].get("body", "")))
+            logger.warning(f"Dropping oversized snapshot for {largest}")
+            del self.entries[largest]
+            data = json.dumps(self.entries)
+        try:
+            with open(self.path, "w") as f:
+                f.write(data)
+            self.dirty = False
+        except OSError as e:
+            logger.error(f"Failed to write snapshot file {self.path}: {e}")
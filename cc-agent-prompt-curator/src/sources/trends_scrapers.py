@@ -1,18 +1,68 @@
 import asyncio
 import aiohttp
+import functools
 import json
 import logging
+import random
 import re
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 from urllib.parse import urljoin
 import xml.etree.ElementTree as ET
 
+from .snapshots import SnapshotStore
+from .registry import TrendSource, load_sources, builtin_sources
+
 logger = logging.getLogger(__name__)
 
+TIKTOK_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+def parse_trends24(raw: bytes) -> List[str]:
+    data = json.loads(raw)
+    trends = []
+    for location_data in data.values():
+        if isinstance(location_data, list):
+            trends.extend([item.get('name', '') for item in location_data[:10]])
+    return [trend for trend in trends if trend and len(trend) > 2][:20]
+
+def parse_tiktok_trends(raw: bytes) -> List[str]:
+    data = json.loads(raw)
+    trends = []
+    if 'itemList' in data:
+        for item in data['itemList'][:20]:
+            desc = item.get('desc', '')
+            hashtags = re.findall(r'#(\w+)', desc)
+            trends.extend(hashtags)
+    return trends[:20]
+
+def parse_google_trends(raw: bytes) -> List[str]:
+    root = ET.fromstring(raw)
+    trends = []
+    for item in root.findall('.//item')[:20]:
+        title = item.find('title')
+        if title is not None and title.text:
+            clean_title = re.sub(r'\s*-\s*Google\s+Trends.*$', '', title.text)
+            trends.append(clean_title.strip())
+    return trends
+
+class SourceUnavailable(Exception):
+    """A response worth retrying (throttled or server error)."""
+
 class TrendsScraper:
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, snapshots: Optional[SnapshotStore] = None, replay: bool = False,
+                 sources: Optional[List[TrendSource]] = None):
+        # Ceiling for a single request; each source's own deadline is usually tighter
         self.timeout = aiohttp.ClientTimeout(total=timeout)
         self.session = None
+        # With snapshots, unchanged sources are answered with 304 and not re-parsed
+        self.snapshots = snapshots
+        self.replay = replay
+        self.sources = sources if sources is not None else load_sources()
+        self._limits = {source.name: asyncio.Semaphore(source.concurrency) for source in self.sources}
+        # Per-source outcome of the last collection: latency, bytes, phrases, attempts
+        self.stats: Dict[str, Dict] = {}
 
     async def __aenter__(self):
         self.session = aiohttp.ClientSession(timeout=self.timeout)
@@ -21,65 +71,95 @@ class TrendsScraper:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
+        if self.snapshots:
+            self.snapshots.save()
+
+    def source(self, name: str) -> TrendSource:
+        return next(s for s in self.sources + builtin_sources() if s.name == name)
 
     async def fetch_trends24(self) -> List[str]:
         try:
-            url = "https://trends24.in/api/trending.json"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    trends = []
-                    for location_data in data.values():
-                        if isinstance(location_data, list):
-                            trends.extend([item.get('name', '') for item in location_data[:10]])
-                    return [trend for trend in trends if trend and len(trend) > 2][:20]
+            return await self.fetch_source(self.source("trends24"))
         except Exception as e:
             logger.error(f"Failed to fetch trends24: {e}")
         return []
 
     async def fetch_tiktok_trends(self) -> List[str]:
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            url = "https://www.tiktok.com/api/trending/feed/"
-            async with self.session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    trends = []
-                    if 'itemList' in data:
-                        for item in data['itemList'][:20]:
-                            desc = item.get('desc', '')
-                            hashtags = re.findall(r'#(\w+)', desc)
-                            trends.extend(hashtags)
-                    return trends[:20]
+            return await self.fetch_source(self.source("tiktok"))
         except Exception as e:
             logger.error(f"Failed to fetch TikTok trends: {e}")
         return []
 
     async def fetch_google_trends(self) -> List[str]:
         try:
-            url = "https://trends.google.com/trends/trendingsearches/daily/rss"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    xml_content = await response.text()
-                    root = ET.fromstring(xml_content)
-                    trends = []
-                    for item in root.findall('.//item')[:20]:
-                        title = item.find('title')
-                        if title is not None and title.text:
-                            clean_title = re.sub(r'\s*-\s*Google\s+Trends.*$', '', title.text)
-                            trends.append(clean_title.strip())
-                    return trends
+            return await self.fetch_source(self.source("google"))
         except Exception as e:
             logger.error(f"Failed to fetch Google trends: {e}")
         return []
 
+    async def fetch_source(self, source: TrendSource) -> List[str]:
+        """Fetch one source within its deadline, retrying transient failures with jittered backoff."""
+        stats = {"attempts": 0, "bytes": 0, "phrases": 0, "outcome": "failed"}
+        self.stats[source.name] = stats
+        started = time.monotonic()
+        try:
+            phrases = await asyncio.wait_for(self._fetch_with_retries(source, stats), timeout=source.timeout)
+            stats["phrases"] = len(phrases)
+            return phrases
+        except asyncio.TimeoutError:
+            stats["outcome"] = "timeout"
+            raise
+        finally:
+            stats["latency_ms"] = int((time.monotonic() - started) * 1000)
+
+    async def _fetch_with_retries(self, source: TrendSource, stats: Dict) -> List[str]:
+        for attempt in range(source.retries + 1):
+            stats["attempts"] = attempt + 1
+            try:
+                async with self._limits.setdefault(source.name, asyncio.Semaphore(source.concurrency)):
+                    return await self._fetch_source(source, stats)
+            except (SourceUnavailable, aiohttp.ClientError) as e:
+                if attempt == source.retries:
+                    raise
+                delay = random.uniform(0, source.backoff * 2 ** attempt)
+                logger.warning(f"{source.name} attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _fetch_source(self, source: TrendSource, stats: Dict) -> List[str]:
+        snapshot = self.snapshots.get(source.name) if self.snapshots else None
+        if self.replay:
+            raw = self.snapshots.raw(source.name) if self.snapshots else None
+            stats["outcome"] = "replayed"
+            return source.parse(raw) if raw is not None else []
+
+        headers = dict(source.headers)
+        if snapshot and snapshot.get("phrases") is not None:
+            headers.update(self.snapshots.conditional_headers(source.name))
+
+        async with self.session.get(source.url, headers=headers) as response:
+            if response.status == 304 and snapshot:
+                logger.info(f"{source.name} unchanged since last fetch, reusing snapshot")
+                stats["outcome"] = "not_modified"
+                return snapshot["phrases"]
+            if response.status == 429 or response.status >= 500:
+                raise SourceUnavailable(f"HTTP {response.status}")
+            if response.status != 200:
+                stats["outcome"] = f"http_{response.status}"
+                return []
+            raw = await response.read()
+            stats["bytes"] = len(raw)
+            phrases = source.parse(raw)
+            stats["outcome"] = "fetched"
+            if self.snapshots:
+                self.snapshots.put(source.name, raw, response.headers.get('ETag'),
+                                   response.headers.get('Last-Modified'), phrases)
+            return phrases
+
     async def collect_all_trends(self) -> List[Dict[str, str]]:
         tasks = [
-            self._safe_fetch("trends24", self.fetch_trends24),
-            self._safe_fetch("tiktok", self.fetch_tiktok_trends),
-            self._safe_fetch("google", self.fetch_google_trends)
+            self._safe_fetch(source.name, functools.partial(self.fetch_source, source))
+            for source in self.sources
         ]
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -100,5 +180,5 @@ class TrendsScraper:
             logger.info(f"Fetched {len(phrases)} phrases from {source_name}")
             return source_name, phrases
         except Exception as e:
-            logger.error(f"Error fetching from {source_name}: {e}")
+            logger.error(f"Error fetching from {source_name}: {e!r}")
             return source_name, []
@@ -1,7 +1,9 @@
 import pytest
 import json
 import os
-from unittest.mock import Mock, patch, AsyncMock
+import time
+import asyncio
+from unittest.mock import Mock, MagicMock, patch, AsyncMock
 from datetime import datetime
 from moto import mock_aws
 import boto3
@@ -111,13 +113,26 @@ class TestDetermineMood:
     def test_determine_mood_neutral(self):
         assert determine_mood("random phrase") == "neutral"
 
+def llm_client(create):
+    client = MagicMock()
+    client.chat.completions.create = create
+    client.__aenter__.return_value = client
+    return client
+
+def completion(content):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+@patch('src.handler.GENERATION_CACHE_TTL_DAYS', 0)
+@patch('src.handler.secrets_manager.get_openai_api_key', return_value='test-key')
 class TestGeneratePrompts:
-    @patch('src.handler.openai.ChatCompletion.create')
-    def test_generate_prompts_success(self, mock_openai, sample_scored_phrases):
-        mock_response = Mock()
-        mock_response.choices = [Mock()]
-        mock_response.choices[0].message.content = "Stunning AI revolution in neon-lit cityscape"
-        mock_openai.return_value = mock_response
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_success(self, mock_client, mock_key, sample_scored_phrases):
+        mock_client.return_value = llm_client(AsyncMock(
+            return_value=completion("Stunning AI revolution in neon-lit cityscape")
+        ))
         
         result = generate_prompts(sample_scored_phrases[:1])
         
@@ -129,12 +144,9 @@ class TestGeneratePrompts:
         assert "score" in result[0]
         assert "sources" in result[0]
     
-    @patch('src.handler.openai.ChatCompletion.create')
-    def test_generate_prompts_long_response(self, mock_openai, sample_scored_phrases):
-        mock_response = Mock()
-        mock_response.choices = [Mock()]
-        mock_response.choices[0].message.content = "A" * 100
-        mock_openai.return_value = mock_response
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_long_response(self, mock_client, mock_key, sample_scored_phrases):
+        mock_client.return_value = llm_client(AsyncMock(return_value=completion("A" * 100)))
         
         result = generate_prompts(sample_scored_phrases[:1])
         
@@ -142,13 +154,195 @@ class TestGeneratePrompts:
         assert len(result[0]["prompt_text"]) == 80
         assert result[0]["prompt_text"].endswith("...")
     
-    @patch('src.handler.openai.ChatCompletion.create')
-    def test_generate_prompts_api_failure(self, mock_openai, sample_scored_phrases):
-        mock_openai.side_effect = Exception("API Error")
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_api_failure(self, mock_client, mock_key, sample_scored_phrases):
+        mock_client.return_value = llm_client(AsyncMock(side_effect=Exception("API Error")))
         
         result = generate_prompts(sample_scored_phrases)
         
         assert len(result) == 0
+    
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_concurrently_with_deadline(self, mock_client, mock_key, sample_scored_phrases):
+        async def create(**kwargs):
+            phrase = kwargs["messages"][1]["content"]
+            await asyncio.sleep(5 if "climate change" in phrase else 0.2)
+            return completion("Neon skyline")
+        
+        mock_client.return_value = llm_client(create)
+        phrases = [dict(sample_scored_phrases[0], phrase=f"ai revolution {i}") for i in range(5)]
+        phrases.append(sample_scored_phrases[1])
+        
+        started = time.monotonic()
+        with patch('src.handler.LLM_CALL_TIMEOUT', 0.5), \
+             patch('src.handler.PROMPT_GENERATION_MODE', 'per_phrase'):
+            result = generate_prompts(phrases)
+        
+        # Five calls overlap and the slow one is cut off at its deadline
+        assert time.monotonic() - started < 1.5
+        assert [p["title"] for p in result] == [f"ai revolution {i}" for i in range(5)]
+        mock_client.assert_called_once_with('test-key')
+    
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_bounded_concurrency(self, mock_client, mock_key, sample_scored_phrases):
+        running = {"now": 0, "max": 0}
+        
+        async def create(**kwargs):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return completion("Neon skyline")
+        
+        mock_client.return_value = llm_client(create)
+        phrases = [dict(sample_scored_phrases[0], phrase=f"topic {i}") for i in range(10)]
+        
+        with patch('src.handler.LLM_CONCURRENCY', 3), \
+             patch('src.handler.PROMPT_GENERATION_MODE', 'per_phrase'):
+            result = generate_prompts(phrases)
+        
+        assert len(result) == 10
+        assert running["max"] == 3
+    
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_in_one_structured_request(self, mock_client, mock_key, sample_scored_phrases):
+        create = AsyncMock(return_value=completion(json.dumps({"templates": [
+            {"title": "Climate Change", "prompt_text": "Glaciers crumble under a red sky", "mood": "dramatic"},
+            {"title": "ai revolution", "prompt_text": "Robots paint a neon mural at dawn", "mood": "upbeat"}
+        ]})))
+        mock_client.return_value = llm_client(create)
+        
+        result = generate_prompts(sample_scored_phrases)
+        
+        create.assert_called_once()
+        assert create.call_args.kwargs["response_format"]["type"] == "json_schema"
+        assert [(p["title"], p["mood"]) for p in result] == [
+            ("ai revolution", "upbeat"), ("climate change", "dramatic")
+        ]
+        assert result[1]["prompt_text"] == "Glaciers crumble under a red sky"
+    
+    @patch('src.handler.create_llm_client')
+    @patch('src.handler.json_schema_rejected', set())
+    def test_generate_prompts_falls_back_to_json_mode(self, mock_client, mock_key, sample_scored_phrases):
+        import httpx
+        import openai
+        rejected = openai.BadRequestError(
+            "Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model.",
+            response=httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")),
+            body=None
+        )
+        answer = completion(json.dumps({"templates": [
+            {"title": "ai revolution", "prompt_text": "Robots paint a neon mural at dawn", "mood": "upbeat"},
+            {"title": "climate change", "prompt_text": "Glaciers crumble under a red sky", "mood": "dramatic"}
+        ]}))
+        create = AsyncMock(side_effect=[rejected, answer, answer])
+        mock_client.return_value = llm_client(create)
+        
+        result = generate_prompts(sample_scored_phrases)
+        
+        formats = [c.kwargs["response_format"]["type"] for c in create.call_args_list]
+        assert formats == ["json_schema", "json_object"]
+        assert "JSON" in create.call_args.kwargs["messages"][1]["content"]
+        assert [(p["title"], p["mood"]) for p in result] == [
+            ("ai revolution", "upbeat"), ("climate change", "dramatic")
+        ]
+        
+        # The rejection is remembered, so later runs go straight to JSON mode
+        generate_prompts(sample_scored_phrases)
+        assert create.call_args.kwargs["response_format"]["type"] == "json_object"
+        assert create.call_count == 3
+    
+    @patch('src.handler.create_llm_client')
+    def test_generate_prompts_rerequests_malformed_items(self, mock_client, mock_key, sample_scored_phrases):
+        create = AsyncMock(side_effect=[
+            completion(json.dumps({"templates": [
+                {"title": "ai revolution", "prompt_text": "Robots paint a neon mural at dawn", "mood": "upbeat"},
+                {"title": "climate change", "mood": "gloomy"}
+            ]})),
+            completion("Glaciers crumble under a red sky")
+        ])
+        mock_client.return_value = llm_client(create)
+        
+        result = generate_prompts(sample_scored_phrases)
+        
+        assert create.call_count == 2
+        retry = create.call_args_list[1].kwargs
+        assert "response_format" not in retry
+        assert "climate change" in retry["messages"][1]["content"]
+        assert [(p["title"], p["prompt_text"]) for p in result] == [
+            ("ai revolution", "Robots paint a neon mural at dawn"),
+            ("climate change", "Glaciers crumble under a red sky")
+        ]
+
+@pytest.fixture
+def templates_table():
+    with mock_aws():
+        table = boto3.resource('dynamodb', region_name='us-east-1').create_table(
+            TableName='test-table',
+            KeySchema=[
+                {'AttributeName': 'date', 'KeyType': 'HASH'},
+                {'AttributeName': 'slug', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'date', 'AttributeType': 'S'},
+                {'AttributeName': 'slug', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        with patch('src.handler.TABLE_NAME', 'test-table'):
+            yield table
+
+@patch('src.handler.cloudwatch')
+@patch('src.handler.secrets_manager.get_openai_api_key', return_value='test-key')
+class TestGenerationCache:
+    def batch_answer(self, *titles):
+        return completion(json.dumps({"templates": [
+            {"title": title, "prompt_text": f"Cinematic {title}", "mood": "upbeat"} for title in titles
+        ]}))
+    
+    @patch('src.handler.create_llm_client')
+    def test_repeated_phrases_skip_the_llm(self, mock_client, mock_key, mock_cw,
+                                           templates_table, sample_scored_phrases):
+        create = AsyncMock(return_value=self.batch_answer("ai revolution", "climate change"))
+        mock_client.return_value = llm_client(create)
+        
+        first = generate_prompts(sample_scored_phrases)
+        second = generate_prompts([dict(item, score=item["score"] + 1) for item in sample_scored_phrases])
+        
+        assert create.call_count == 1
+        assert mock_key.call_count == 1
+        assert [p["prompt_text"] for p in second] == [p["prompt_text"] for p in first]
+        assert [p["score"] for p in second] == [16.5, 9.2]
+        
+        lookups = [
+            {m['MetricName']: m['Value'] for m in c.kwargs['MetricData']}
+            for c in mock_cw.put_metric_data.call_args_list
+        ]
+        assert lookups == [
+            {'GenerationCacheHits': 0, 'GenerationCacheMisses': 2},
+            {'GenerationCacheHits': 2, 'GenerationCacheMisses': 0}
+        ]
+    
+    @patch('src.handler.create_llm_client')
+    def test_model_change_and_expiry_miss(self, mock_client, mock_key, mock_cw,
+                                          templates_table, sample_scored_phrases):
+        from src import handler
+        create = AsyncMock(return_value=self.batch_answer("ai revolution", "climate change"))
+        mock_client.return_value = llm_client(create)
+        
+        generate_prompts(sample_scored_phrases)
+        with patch('src.handler.LLM_MODEL', 'gpt-4o'):
+            generate_prompts(sample_scored_phrases)
+        assert create.call_count == 2
+        
+        with patch('src.handler.time.time', return_value=time.time() + 8 * 86400):
+            generate_prompts(sample_scored_phrases)
+        assert create.call_count == 3
+        
+        keys = templates_table.scan()['Items']
+        assert {item['date'] for item in keys} == {
+            handler.cache_partition(), handler.cache_partition().replace('gpt-4', 'gpt-4o', 1)
+        }
 
 @mock_aws
 class TestPersistResults:
@@ -267,9 +461,51 @@ class TestLambdaHandler:
         mock_emit_event.assert_called_once()
         mock_emit_metrics.assert_called_once()
     
+    @patch('src.handler.outcome_counter')
     @patch('src.handler.collect_trending_phrases')
-    def test_lambda_handler_failure(self, mock_collect):
+    def test_lambda_handler_failure(self, mock_collect, mock_counter):
         mock_collect.side_effect = Exception("Test error")
         
         with pytest.raises(Exception):
             lambda_handler({}, {})
+        
+        mock_counter.record.assert_called_once_with(False)
+        mock_counter.flush.assert_called_once()
+
+class TestCollectTrendingPhrases:
+    @patch('src.handler.cloudwatch')
+    @patch('src.handler.backup_raw_sources')
+    @patch('src.handler.restore_raw_sources')
+    def test_emits_per_source_metrics(self, mock_restore, mock_backup, mock_cloudwatch):
+        from src.handler import collect_trending_phrases
+        
+        class FakeScraper:
+            stats = {
+                "google": {"latency_ms": 120, "bytes": 2048, "phrases": 3, "attempts": 1, "outcome": "fetched"},
+                "tiktok": {"latency_ms": 5000, "bytes": 0, "phrases": 0, "attempts": 2, "outcome": "timeout"}
+            }
+            
+            def __init__(self, **kwargs):
+                pass
+            
+            async def __aenter__(self):
+                return self
+            
+            async def __aexit__(self, *args):
+                pass
+            
+            async def collect_all_trends(self):
+                return [{"source": "google", "phrase": "ai revolution"}]
+        
+        with patch('src.handler.TrendsScraper', FakeScraper):
+            phrases = asyncio.run(collect_trending_phrases())
+        
+        assert phrases == [{"source": "google", "phrase": "ai revolution"}]
+        mock_restore.assert_called_once()
+        mock_backup.assert_called_once()
+        metric_data = mock_cloudwatch.put_metric_data.call_args[1]['MetricData']
+        values = {(m['Dimensions'][0]['Value'], m['MetricName']): m['Value'] for m in metric_data}
+        assert values[("google", "SourceLatency")] == 120
+        assert values[("google", "SourceBytes")] == 2048
+        assert values[("google", "SourceFailures")] == 0
+        assert values[("tiktok", "SourceFailures")] == 1
@@ -1,10 +1,14 @@
 import pytest
+import pytest_asyncio
+import asyncio
 import json
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, Mock, patch
 import aiohttp
 from aioresponses import aioresponses
 
-from src.sources.trends_scrapers import TrendsScraper
+from src.sources.trends_scrapers import TrendsScraper, parse_trends24
+from src.sources.registry import TrendSource, load_sources
+from src.sources.snapshots import SnapshotStore
 
 @pytest.fixture
 def trends_scraper():
@@ -198,3 +202,171 @@ class TestTrendsScraper:
         
         assert source == "test_source"
         assert phrases == []
+
+@pytest_asyncio.fixture
+async def trends24_server(mock_trends24_response):
+    """Local trends24 stand-in that honours If-None-Match."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    
+    requests = []
+    body = json.dumps(mock_trends24_response)
+    
+    async def trending(request):
+        requests.append(dict(request.headers))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=body, content_type='application/json',
+                            headers={'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 06:00:00 GMT'})
+    
+    app = web.Application()
+    app.router.add_get('/trending.json', trending)
+    server = TestServer(app)
+    await server.start_server()
+    server.requests = requests
+    yield server
+    await server.close()
+
+class TestSnapshots:
+    @pytest.mark.asyncio
+    async def test_unchanged_source_is_not_downloaded_or_parsed(self, trends24_server, tmp_path):
+        path = str(tmp_path / 'raw_sources.json')
+        url = str(trends24_server.make_url('/trending.json'))
+        
+        async with TrendsScraper(snapshots=SnapshotStore(path),
+                                 sources=[TrendSource('trends24', url, parse_trends24)]) as scraper:
+            first = await scraper.fetch_trends24()
+        
+        parse = Mock(wraps=parse_trends24)
+        async with TrendsScraper(snapshots=SnapshotStore(path),
+                                 sources=[TrendSource('trends24', url, parse)]) as scraper:
+            second = await scraper.fetch_trends24()
+        
+        assert len(first) == 5
+        assert second == first
+        parse.assert_not_called()
+        assert scraper.stats['trends24']['outcome'] == 'not_modified'
+        assert 'If-None-Match' not in trends24_server.requests[0]
+        assert trends24_server.requests[1]['If-None-Match'] == '"v1"'
+        assert trends24_server.requests[1]['If-Modified-Since'] == 'Mon, 01 Jan 2024 06:00:00 GMT'
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_is_compressed_and_replayable(self, trends24_server, tmp_path):
+        path = str(tmp_path / 'raw_sources.json')
+        url = str(trends24_server.make_url('/trending.json'))
+        
+        async with TrendsScraper(snapshots=SnapshotStore(path),
+                                 sources=[TrendSource('trends24', url, parse_trends24)]) as scraper:
+            fetched = await scraper.fetch_trends24()
+        
+        with open(path) as f:
+            entry = json.load(f)['trends24']
+        assert entry['etag'] == '"v1"'
+        assert entry['size'] > 0
+        
+        unreachable = TrendSource('trends24', 'http://127.0.0.1:9/unreachable', parse_trends24)
+        async with TrendsScraper(snapshots=SnapshotStore(path), replay=True, sources=[unreachable]) as scraper:
+            replayed = await scraper.fetch_trends24()
+            missing = await scraper.fetch_google_trends()
+        
+        assert replayed == fetched
+        assert missing == []
+        assert len(trends24_server.requests) == 1
+
+@pytest_asyncio.fixture
+async def flaky_server(mock_trends24_response):
+    """Local server with a source that fails twice and one that never answers in time."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    
+    calls = {'flaky': 0}
+    
+    async def flaky(request):
+        calls['flaky'] += 1
+        if calls['flaky'] <= 2:
+            return web.Response(status=503)
+        return web.json_response(mock_trends24_response)
+    
+    async def slow(request):
+        await asyncio.sleep(2)
+        return web.json_response(mock_trends24_response)
+    
+    app = web.Application()
+    app.router.add_get('/flaky', flaky)
+    app.router.add_get('/slow', slow)
+    server = TestServer(app)
+    await server.start_server()
+    server.calls = calls
+    yield server
+    await server.close()
+
+class TestSourceRegistry:
+    def test_config_overrides_disables_and_adds_sources(self):
+        config = json.dumps([
+            {"name": "google", "timeout": 3, "retries": 0},
+            {"name": "tiktok", "enabled": False},
+            {"name": "reddit", "url": "https://example.com/rss",
+             "parser": "src.sources.trends_scrapers:parse_google_trends"}
+        ])
+        
+        with patch('src.sources.registry.entry_points', return_value=[]):
+            sources = {source.name: source for source in load_sources(config)}
+        
+        assert set(sources) == {"trends24", "google", "reddit"}
+        assert (sources["google"].timeout, sources["google"].retries) == (3, 0)
+        assert sources["reddit"].parse.__name__ == "parse_google_trends"
+    
+    def test_bad_config_entries_are_skipped(self):
+        config = json.dumps([
+            {"name": "google", "timeout": 3},
+            {"timeout": 1},
+            {"name": "reddit", "url": "https://example.com/rss"},
+            {"name": "news", "url": "https://example.com/news", "parser": "missing.module:parse"},
+            {"name": "tiktok", "retries": 1, "color": "red"},
+            "trends24"
+        ])
+        
+        with patch('src.sources.registry.entry_points', return_value=[]):
+            sources = {source.name: source for source in load_sources(config)}
+        
+        assert set(sources) == {"trends24", "tiktok", "google"}
+        assert sources["google"].timeout == 3
+        assert sources["tiktok"].retries == 2
+    
+    def test_invalid_config_json_keeps_builtin_sources(self):
+        with patch('src.sources.registry.entry_points', return_value=[]):
+            for config in ('[{"name": "google"', '{"name": "google"}'):
+                names = [source.name for source in load_sources(config)]
+                assert names == ["trends24", "tiktok", "google"]
+    
+    def test_entry_point_plugins_are_loaded(self):
+        plugin = Mock()
+        plugin.load.return_value = lambda: TrendSource("news", "https://example.com/news", parse_trends24)
+        broken = Mock()
+        broken.load.side_effect = ImportError("missing dependency")
+        
+        with patch('src.sources.registry.entry_points', return_value=[plugin, broken]):
+            names = [source.name for source in load_sources("")]
+        
+        assert names == ["trends24", "tiktok", "google", "news"]
+    
+    @pytest.mark.asyncio
+    async def test_retries_and_deadlines_are_per_source(self, flaky_server):
+        sources = [
+            TrendSource('flaky', str(flaky_server.make_url('/flaky')), parse_trends24, backoff=0.01),
+            TrendSource('slow', str(flaky_server.make_url('/slow')), parse_trends24, timeout=0.3)
+        ]
+        
+        started = asyncio.get_running_loop().time()
+        async with TrendsScraper(sources=sources) as scraper:
+            result = await scraper.collect_all_trends()
+        elapsed = asyncio.get_running_loop().time() - started
+        
+        assert elapsed < 1.5
+        assert {item["source"] for item in result} == {"flaky"}
+        assert scraper.stats['flaky']['attempts'] == 3
+        assert scraper.stats['flaky']['outcome'] == 'fetched'
+        assert scraper.stats['flaky']['bytes'] > 0
+        assert scraper.stats['flaky']['phrases'] == 5
+        assert scraper.stats['slow']['outcome'] == 'timeout'
+        assert scraper.stats['slow']['latency_ms'] < 1000
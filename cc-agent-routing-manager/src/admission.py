@@ -0,0 +1,180 @@
+"""
+Per-user admission control for the routing manager.
+Token buckets per (userId, tier), enforced before a job reaches a provider queue.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Per-tier bucket size (burst) and sustained rate; unknown tiers use 'standard'
+DEFAULT_RATE_LIMITS = {
+    "free": {"burst": 3, "perMinute": 6},
+    "standard": {"burst": 10, "perMinute": 30},
+    "premium": {"burst": 30, "perMinute": 120},
+    "enterprise": {"burst": 100, "perMinute": 600}
+}
+
+# Idle buckets expire from the table after this long (seconds)
+BUCKET_TTL_SECONDS = 24 * 60 * 60
+
+
+def rate_limits_from_env() -> Dict[str, Dict[str, float]]:
+    """Read per-tier limits from RATE_LIMITS (JSON), falling back to the defaults."""
+    raw = os.environ.get('RATE_LIMITS')
+    if not raw:
+        return DEFAULT_RATE_LIMITS
+    return {**DEFAULT_RATE_LIMITS, **json.loads(raw)}
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per (userId, tier), kept as a theoretical arrival time (GCRA).
+
+    A bucket with capacity `burst` refilling at `perMinute` tokens/minute is
+    stored as one number, `tat`: the time at which the bucket would be full
+    again. Admitting a job moves `tat` forward by one emission interval and is
+    allowed while `tat` stays within `burst` intervals of now. That keeps the
+    authoritative state in a single DynamoDB attribute updated by one atomic
+    conditional UpdateItem, with no read beforehand.
+
+    Each container remembers the last `tat` it saw per bucket. Because `tat`
+    only moves forward, a remembered value already past the limit proves the
+    user is still over it, so those jobs are rejected without a DynamoDB call.
+    Without a table the in-memory buckets are authoritative (per container).
+    """
+
+    def __init__(self, table: Any = None, limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 clock=time.time):
+        self.table = table
+        self.limits = limits or DEFAULT_RATE_LIMITS
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tat: Dict[str, float] = {}
+
+    def _bucket(self, tier: str):
+        limit = self.limits.get(tier) or self.limits['standard']
+        interval = 60.0 / float(limit['perMinute'])
+        tolerance = interval * max(float(limit['burst']) - 1, 0)
+        return interval, tolerance
+
+    def allow(self, user_id: str, tier: str) -> bool:
+        """
+        Take one token from the user's bucket for this tier.
+
+        Args:
+            user_id: Submitting user
+            tier: User tier from the job
+
+        Returns:
+            True if the job is admitted, False if the user is over the limit
+        """
+        key = f"{user_id}#{tier}"
+        interval, tolerance = self._bucket(tier)
+        now = self.clock()
+
+        with self._lock:
+            known_tat = self._tat.get(key, 0.0)
+            # Fast path: the last state we saw already rules this job out
+            if known_tat - now > tolerance:
+                return False
+            if self.table is None:
+                self._tat[key] = max(known_tat, now) + interval
+                return True
+
+        admitted, stored_tat = self._admit_in_table(key, now, interval, tolerance, known_tat)
+        if stored_tat is not None:
+            with self._lock:
+                self._tat[key] = max(self._tat.get(key, 0.0), stored_tat)
+        return admitted
+
+    def _admit_in_table(self, key: str, now: float, interval: float, tolerance: float,
+                        known_tat: float) -> Tuple[bool, Optional[float]]:
+        """
+        Atomically take a token in DynamoDB.
+
+        A full bucket (tat in the past) restarts from now; otherwise tat
+        advances by one interval while it stays within the tolerance. The
+        branch we expect from the remembered tat is tried first, so a steady
+        stream costs one conditional write per job.
+
+        Returns:
+            (admitted, tat now stored in the table if known)
+        """
+        attempts = [self._restart_bucket, self._advance_bucket]
+        if known_tat >= now:
+            attempts.reverse()
+
+        stored_tat = None
+        try:
+            for attempt in attempts:
+                admitted, stored_tat = attempt(key, now, interval, tolerance)
+                if admitted:
+                    return True, stored_tat
+            return False, stored_tat
+        except ClientError as e:
+            # Fail open: a throttled limiter table must not stop routing
+            logger.error(f"Rate limit check failed for {key}, admitting: {str(e)}")
+            return True, None
+
+    def _restart_bucket(self, key: str, now: float, interval: float,
+                        tolerance: float) -> Tuple[bool, Optional[float]]:
+        try:
+            self.table.update_item(
+                Key={'bucketKey': key},
+                UpdateExpression='SET tat = :tat, expiresAt = :expires',
+                ConditionExpression='attribute_not_exists(tat) OR tat < :now',
+                ExpressionAttributeValues={
+                    ':tat': _to_ms(now + interval),
+                    ':now': _to_ms(now),
+                    ':expires': int(now) + BUCKET_TTL_SECONDS
+                },
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return True, now + interval
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False, _stored_tat(e)
+            raise
+
+    def _advance_bucket(self, key: str, now: float, interval: float,
+                        tolerance: float) -> Tuple[bool, Optional[float]]:
+        try:
+            response = self.table.update_item(
+                Key={'bucketKey': key},
+                UpdateExpression='SET tat = tat + :interval, expiresAt = :expires',
+                ConditionExpression='tat BETWEEN :now AND :limit',
+                ExpressionAttributeValues={
+                    ':interval': _to_ms(interval),
+                    ':now': _to_ms(now),
+                    ':limit': _to_ms(now + tolerance),
+                    ':expires': int(now) + BUCKET_TTL_SECONDS
+                },
+                ReturnValues='UPDATED_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return True, int(response['Attributes']['tat']) / 1000.0
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False, _stored_tat(e)
+            raise
+
+
+def _stored_tat(error: ClientError) -> Optional[float]:
+    """Read tat from the item returned with a failed condition check."""
+    item = error.response.get('Item') or {}
+    if 'tat' not in item:
+        return None
+    return int(item['tat']['N']) / 1000.0
+
+
+def _to_ms(seconds: float) -> int:
+    """DynamoDB numbers are stored as integer milliseconds."""
+    return int(round(seconds * 1000))
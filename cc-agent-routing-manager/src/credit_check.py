@@ -0,0 +1,203 @@
+"""
+Credit-balance pre-check for the routing manager.
+Rejects jobs whose estimated cost exceeds the user's remaining credits.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Iterable
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger()
+
+# Balances are re-read at most this often per user and container (seconds)
+BALANCE_CACHE_SECONDS = float(os.environ.get('CREDIT_BALANCE_CACHE_SECONDS', '30'))
+# Model prices change rarely (seconds)
+PRICE_CACHE_SECONDS = float(os.environ.get('CREDIT_PRICE_CACHE_SECONDS', '300'))
+
+# Same SSM layout and fallback as the CreditReconciler
+PRICING_PARAMETER_PREFIX = '/fertilia/pricing/'
+DEFAULT_PRICE_PER_SECOND = 0.10
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_SIZE = 100
+BATCH_GET_RETRIES = 3
+
+# Expired balances are purged once the cache grows past this many users
+BALANCE_CACHE_SIZE = 10000
+
+
+class CreditChecker:
+    """
+    Read-through cache of user balances and model prices.
+
+    Balances come from `Credits-{Stage}` (`remaining`, keyed on userId) and
+    are cached for BALANCE_CACHE_SECONDS. Jobs admitted from a cached balance
+    are deducted from it locally, so a burst of jobs from one user cannot all
+    pass against the same stale balance. The reconciler still performs the
+    authoritative debit; this check only keeps jobs that cannot be paid for
+    away from paid providers. Lookup errors (including connection errors and
+    timeouts) admit the job. Users with no Credits item are rejected on
+    purpose: the reconciler's debit needs an existing `remaining` balance,
+    so their jobs could never be charged. Deductions for jobs that are not
+    sent after all are handed back with refund().
+    """
+
+    def __init__(self, dynamodb_resource: Any, credits_table_name: str, ssm_client: Any,
+                 balance_cache_seconds: float = BALANCE_CACHE_SECONDS,
+                 price_cache_seconds: float = PRICE_CACHE_SECONDS, clock=time.time):
+        self.dynamodb = dynamodb_resource
+        self.credits_table_name = credits_table_name
+        self.ssm = ssm_client
+        self.balance_cache_seconds = balance_cache_seconds
+        self.price_cache_seconds = price_cache_seconds
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._balances: Dict[str, Dict[str, float]] = {}
+        self._prices: Dict[str, Dict[str, float]] = {}
+
+    def estimate_cost(self, model: str, length_sec: float) -> float:
+        """
+        Estimate a job's cost the way the reconciler will charge it.
+
+        Args:
+            model: Selected model
+            length_sec: Requested video length
+
+        Returns:
+            Estimated cost in credits
+        """
+        return float(length_sec) * self.price(model)
+
+    def price(self, model: str) -> float:
+        """Price per second for a model, cached for price_cache_seconds."""
+        now = self.clock()
+        cached = self._prices.get(model)
+        if cached and cached['expires'] > now:
+            return cached['value']
+
+        ttl = self.price_cache_seconds
+        try:
+            response = self.ssm.get_parameter(Name=f"{PRICING_PARAMETER_PREFIX}{model}")
+            value = float(response['Parameter']['Value'])
+        except (ClientError, BotoCoreError) as e:
+            if isinstance(e, ClientError) and e.response['Error']['Code'] == 'ParameterNotFound':
+                value = DEFAULT_PRICE_PER_SECOND
+            else:
+                # Keep the last known price and retry after a short back-off
+                logger.error(f"Failed to read price for {model}: {str(e)}")
+                value = cached['value'] if cached else DEFAULT_PRICE_PER_SECOND
+                ttl = min(ttl, 30.0)
+
+        self._prices[model] = {'value': value, 'expires': now + ttl}
+        return value
+
+    def prefetch(self, user_ids: Iterable[str]):
+        """
+        Load balances for every uncached user with BatchGetItem.
+
+        Args:
+            user_ids: Users about to be checked
+        """
+        now = self.clock()
+        with self._lock:
+            missing = sorted({
+                user_id for user_id in user_ids
+                if not self._fresh(user_id, now)
+            })
+        for start in range(0, len(missing), BATCH_GET_SIZE):
+            self._batch_load(missing[start:start + BATCH_GET_SIZE], now)
+
+    def has_credit(self, user_id: str, model: str, length_sec: float) -> bool:
+        """
+        Check and provisionally deduct a job's estimated cost.
+
+        Args:
+            user_id: Submitting user
+            model: Selected model
+            length_sec: Requested video length
+
+        Returns:
+            False if the user's known balance cannot cover the job
+        """
+        cost = self.estimate_cost(model, length_sec)
+        now = self.clock()
+
+        with self._lock:
+            fresh = self._fresh(user_id, now)
+        if not fresh:
+            self._batch_load([user_id], now)
+
+        with self._lock:
+            entry = self._balances.get(user_id)
+            if entry is None:
+                # Balance unavailable: leave the decision to the reconciler
+                return True
+            if entry['remaining'] < cost:
+                return False
+            entry['remaining'] -= cost
+            return True
+
+    def refund(self, user_id: str, model: str, length_sec: float):
+        """
+        Hand back a provisional deduction for a job that was not sent after all.
+
+        Args:
+            user_id: Submitting user
+            model: Model the job was checked against
+            length_sec: Requested video length
+        """
+        cost = self.estimate_cost(model, length_sec)
+        with self._lock:
+            entry = self._balances.get(user_id)
+            if entry is not None:
+                entry['remaining'] += cost
+
+    def _fresh(self, user_id: str, now: float) -> bool:
+        entry = self._balances.get(user_id)
+        return entry is not None and entry['expires'] > now
+
+    def _batch_load(self, user_ids, now: float):
+        """Fetch balances for up to BATCH_GET_SIZE users; users without a credits item have 0.
+
+        Errors leave the users uncached, so has_credit admits them.
+        """
+        found: Dict[str, float] = {}
+        request = {
+            self.credits_table_name: {
+                'Keys': [{'userId': user_id} for user_id in user_ids],
+                'ProjectionExpression': 'userId, remaining'
+            }
+        }
+
+        try:
+            for _ in range(BATCH_GET_RETRIES):
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.credits_table_name, []):
+                    found[item['userId']] = float(item.get('remaining', 0))
+                request = response.get('UnprocessedKeys') or {}
+                if not request:
+                    break
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to read credit balances: {str(e)}")
+            return
+
+        unprocessed = {
+            key['userId'] for key in request.get(self.credits_table_name, {}).get('Keys', [])
+        }
+        with self._lock:
+            if len(self._balances) > BALANCE_CACHE_SIZE:
+                self._balances = {
+                    key: entry for key, entry in self._balances.items() if entry['expires'] > now
+                }
+            for user_id in user_ids:
+                if user_id in unprocessed:
+                    continue
+                self._balances[user_id] = {
+                    'remaining': found.get(user_id, 0.0),
+                    'expires': now + self.balance_cache_seconds
+                }
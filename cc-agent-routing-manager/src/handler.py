@@ -7,14 +7,19 @@ import json
 import logging
 import os
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import uuid
 
 import boto3
 from botocore.exceptions import ClientError
 
-from rules import RoutingRuleEngine
+from rules import RoutingRuleEngine, rule_source_from_env
+from provider_selector import ProviderLoadTracker, select_provider
+from admission import TokenBucketLimiter, rate_limits_from_env
+from credit_check import CreditChecker
+from outcome_counters import OutcomeCounter
 
 # Configure logging
 logger = logging.getLogger()
@@ -25,6 +30,7 @@ events_client = boto3.client('events')
 cloudwatch = boto3.client('cloudwatch')
 dynamodb = boto3.resource('dynamodb')
 sqs = boto3.client('sqs')
+ssm = boto3.client('ssm')
 
 # Environment variables
 STAGE = os.environ.get('STAGE', 'dev')
@@ -32,9 +38,30 @@ REGION = os.environ.get('AWS_REGION', 'us-east-1')
 FAL_QUEUE_URL = os.environ.get('FAL_QUEUE_URL')
 REPLICATE_QUEUE_URL = os.environ.get('REPLICATE_QUEUE_URL')
 JOBS_TABLE_NAME = f"Jobs-{STAGE}"
+CREDITS_TABLE_NAME = os.environ.get('CREDITS_TABLE', f"Credits-{STAGE}")
+CREDIT_CHECK_ENABLED = os.environ.get('CREDIT_CHECK', 'enabled') == 'enabled'
+ROUTING_MODE = os.environ.get('ROUTING_MODE', 'static')  # static | adaptive
 
-# Initialize rule engine
-rule_engine = RoutingRuleEngine()
+# Initialize rule engine (hot-reloads from SSM/file when configured)
+rule_engine = RoutingRuleEngine(source=rule_source_from_env())
+
+# Per-user admission control (DynamoDB-backed when RATE_LIMIT_TABLE is set)
+RATE_LIMIT_TABLE_NAME = os.environ.get('RATE_LIMIT_TABLE')
+admission_limiter = TokenBucketLimiter(
+    dynamodb.Table(RATE_LIMIT_TABLE_NAME) if RATE_LIMIT_TABLE_NAME else None,
+    rate_limits_from_env()
+)
+
+# Cached credit balances and model prices for the pre-routing credit check
+credit_checker = CreditChecker(dynamodb, CREDITS_TABLE_NAME, ssm)
+
+# Minute-bucketed success/error counters read by the health monitor
+AGENT_ID = os.environ.get('AGENT_ID', 'routing-manager')
+AGENT_OUTCOMES_TABLE = os.environ.get('AGENT_OUTCOMES_TABLE')
+outcome_counter = OutcomeCounter(
+    dynamodb.Table(AGENT_OUTCOMES_TABLE) if AGENT_OUTCOMES_TABLE else None,
+    AGENT_ID
+)
 
 # Queue mapping
 QUEUE_URLS = {
@@ -42,26 +69,55 @@ QUEUE_URLS = {
     "replicate": REPLICATE_QUEUE_URL
 }
 
+# Per-tier priority lanes: {"fal": {"premium": url, ...}, ...}
+# Tiers without a lane fall back to the provider queue above
+PRIORITY_QUEUE_URLS = json.loads(os.environ.get('PRIORITY_QUEUE_URLS') or '{}')
+
+# Cached provider queue load for adaptive routing, over each provider's base queue and lanes
+load_tracker = ProviderLoadTracker(
+    {
+        provider: [queue_url] + list(PRIORITY_QUEUE_URLS.get(provider, {}).values())
+        for provider, queue_url in QUEUE_URLS.items()
+    },
+    sqs, cloudwatch
+)
+
+# AWS API batch limits
+SQS_SEND_BATCH_SIZE = 10
+PUT_EVENTS_BATCH_SIZE = 10
+
+# Job statuses that mean the job must not be routed again
+ROUTED_STATUSES = ('ROUTED', 'PROCESSING', 'COMPLETED')
+
+# Per-container LRU of recently routed jobIds (skips DynamoDB on redelivery)
+ROUTED_CACHE_SIZE = int(os.environ.get('ROUTED_CACHE_SIZE', '2048'))
+_recently_routed: "OrderedDict[str, None]" = OrderedDict()
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for video job routing.
     
     Processes video.job.submitted events from EventBridge and routes them
-    to appropriate provider queues based on rules.
+    to appropriate provider queues based on rules. Events buffered through
+    the ingest SQS queue arrive as a batch of Records.
     
     Args:
-        event: EventBridge event containing video job
+        event: EventBridge event containing video job, or SQS batch event
         context: Lambda context
         
     Returns:
-        Response dict with status
+        Response dict with status, or partial batch response for SQS
     """
     try:
         # Handle EventBridge scheduled events (heartbeat)
         if event.get('source') == 'aws.events' and event.get('detail-type') == 'Scheduled Event':
             return handle_heartbeat()
         
+        # SQS-buffered batch of video.job.submitted events
+        if 'Records' in event:
+            return handle_sqs_batch(event['Records'])
+        
         # Extract video job from EventBridge event
         if 'detail' in event:
             video_job = event['detail']
@@ -79,29 +135,44 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         job_id = video_job['jobId']
         
-        # Check for duplicate processing (idempotency)
-        if is_job_already_routed(job_id):
+        # Cheap in-container duplicate check before touching DynamoDB
+        if was_recently_routed(job_id):
             logger.info(f"Job {job_id} already routed, skipping")
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'status': 'already_processed', 'jobId': job_id})
-            }
+            return already_processed_response(job_id)
+        
+        # Admission control before any provider spend
+        if not admission_limiter.allow(str(video_job['userId']), video_job.get('tier', 'standard')):
+            logger.info(f"Job {job_id} rejected: user {video_job['userId']} over rate limit")
+            send_rate_limited_metric(1)
+            return emit_rejection(job_id, 'rate_limited')
         
         # Apply routing rules
-        provider, model, rejection_reason = rule_engine.evaluate(video_job)
+        provider, model, rejection_reason = choose_route(video_job)
         
         if rejection_reason:
             logger.info(f"Job {job_id} rejected: {rejection_reason}")
             return emit_rejection(job_id, rejection_reason)
         
-        # Route to provider queue
-        queue_url = QUEUE_URLS.get(provider)
+        # Keep jobs the user cannot pay for away from paid providers
+        if not has_enough_credit(video_job, model):
+            logger.info(f"Job {job_id} rejected: insufficient credits for {model}")
+            return emit_rejection(job_id, 'insufficient_credits')
+        
+        # Route to provider queue (priority lane for the job's tier)
+        queue_url = resolve_queue_url(provider, video_job.get('tier', 'standard'))
         logger.info(f"Provider: {provider}, Queue URL: {queue_url}")
         logger.info(f"Available queues: {QUEUE_URLS}")
         if not queue_url:
             logger.error(f"No queue URL configured for provider: {provider}")
+            refund_credit(video_job, model)
             return emit_rejection(job_id, f"queue_not_configured:{provider}")
         
+        # Claim the job and record the routing decision in one conditional write
+        if not claim_job(job_id, provider, model, queue_url):
+            logger.info(f"Job {job_id} already routed, skipping")
+            refund_credit(video_job, model)
+            return already_processed_response(job_id)
+        
         # Send to SQS queue
         try:
             sqs.send_message(
@@ -110,22 +181,29 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 MessageAttributes={
                     'provider': {'StringValue': provider, 'DataType': 'String'},
                     'model': {'StringValue': model, 'DataType': 'String'},
-                    'jobId': {'StringValue': job_id, 'DataType': 'String'}
+                    'jobId': {'StringValue': job_id, 'DataType': 'String'},
+                    'userId': {'StringValue': str(video_job['userId']), 'DataType': 'String'},
+                    'tier': {'StringValue': str(video_job.get('tier', 'standard')), 'DataType': 'String'}
                 }
             )
             logger.info(f"Job {job_id} sent to {provider} queue")
+            if ROUTING_MODE == 'adaptive':
+                load_tracker.note_enqueued(provider)
         except Exception as e:
             logger.error(f"Failed to send job to SQS: {str(e)}")
+            release_claim(job_id)
+            refund_credit(video_job, model)
+            outcome_counter.record(False)
             return emit_rejection(job_id, f"queue_error:{str(e)}")
         
-        # Record routing in DynamoDB
-        record_routing_decision(job_id, provider, model, queue_url)
+        remember_routed(job_id)
         
         # Emit success event
         emit_routed_event(job_id, provider, model, queue_url)
         
         # Send metrics
         send_routing_metrics(provider, True)
+        outcome_counter.record(True)
         
         return {
             'statusCode': 200,
@@ -140,10 +218,297 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Unhandled error in lambda_handler: {str(e)}", exc_info=True)
         send_routing_metrics('error', False)
+        outcome_counter.record(False)
+        if isinstance(event, dict) and 'Records' in event:
+            # Records fail one by one once claims are made, so nothing is claimed here: redrive all
+            return {
+                'batchItemFailures': [
+                    {'itemIdentifier': record['messageId']} for record in event['Records']
+                    if isinstance(record, dict) and 'messageId' in record
+                ]
+            }
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Internal server error'})
         }
+    finally:
+        outcome_counter.flush()
+
+
+def handle_sqs_batch(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Route a batch of video.job.submitted events delivered through SQS.
+    
+    Each record body is the EventBridge event forwarded by the ingest rule
+    (or a bare job for manual sends). Jobs are validated and evaluated one by
+    one, then enqueued with send_message_batch and announced with packed
+    put_events calls. Only records that failed transiently are reported back
+    in batchItemFailures so SQS redrives them without replaying the rest of
+    the batch; rejected jobs are terminal and are not retried.
+    
+    Args:
+        records: SQS event records
+        
+    Returns:
+        Partial batch response with batchItemFailures
+    """
+    failed_message_ids: List[str] = []
+    pending: List[Dict[str, Any]] = []
+    rejections: List[Tuple[str, str]] = []
+    seen_job_ids = set()
+    rate_limited = 0
+    
+    jobs: List[Tuple[str, Dict[str, Any]]] = []
+    for record in records:
+        message_id = record['messageId']
+        try:
+            body = json.loads(record['body'])
+            jobs.append((message_id, body.get('detail', body)))
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Unreadable SQS record {message_id}: {str(e)}")
+            failed_message_ids.append(message_id)
+    
+    # One BatchGetItem for the balances of every user in the batch
+    if CREDIT_CHECK_ENABLED:
+        credit_checker.prefetch(
+            str(video_job['userId']) for _, video_job in jobs
+            if isinstance(video_job, dict) and 'userId' in video_job
+        )
+    
+    for message_id, video_job in jobs:
+        # A claim and credit deduction made for this record, undone if the record fails after them
+        claimed = None
+        deducted_model = None
+        try:
+            validation_error = rule_engine.validate_job(video_job)
+            if validation_error:
+                logger.error(f"Job validation failed: {validation_error}")
+                rejections.append((video_job.get('jobId', 'unknown'), validation_error))
+                continue
+            
+            job_id = video_job['jobId']
+            
+            # Duplicate deliveries can land in the same batch
+            if job_id in seen_job_ids or was_recently_routed(job_id):
+                logger.info(f"Job {job_id} already routed, skipping")
+                continue
+            seen_job_ids.add(job_id)
+            
+            if not admission_limiter.allow(str(video_job['userId']), video_job.get('tier', 'standard')):
+                logger.info(f"Job {job_id} rejected: user {video_job['userId']} over rate limit")
+                rejections.append((job_id, 'rate_limited'))
+                rate_limited += 1
+                continue
+            
+            provider, model, rejection_reason = choose_route(video_job)
+            if rejection_reason:
+                logger.info(f"Job {job_id} rejected: {rejection_reason}")
+                rejections.append((job_id, rejection_reason))
+                continue
+            
+            if not has_enough_credit(video_job, model):
+                logger.info(f"Job {job_id} rejected: insufficient credits for {model}")
+                rejections.append((job_id, 'insufficient_credits'))
+                continue
+            deducted_model = model
+            
+            queue_url = resolve_queue_url(provider, video_job.get('tier', 'standard'))
+            if not queue_url:
+                logger.error(f"No queue URL configured for provider: {provider}")
+                refund_credit(video_job, model)
+                rejections.append((job_id, f"queue_not_configured:{provider}"))
+                continue
+            
+            if not claim_job(job_id, provider, model, queue_url):
+                logger.info(f"Job {job_id} already routed, skipping")
+                refund_credit(video_job, model)
+                continue
+            claimed = job_id
+            
+            # Later jobs in this batch see the backlog this one adds
+            if ROUTING_MODE == 'adaptive':
+                load_tracker.note_enqueued(provider)
+            
+            pending.append({
+                'messageId': message_id,
+                'job': video_job,
+                'jobId': job_id,
+                'provider': provider,
+                'model': model,
+                'queueUrl': queue_url
+            })
+        except Exception as e:
+            # Only this record is redriven; jobs claimed for earlier records stay sent
+            logger.error(f"Failed to route SQS record {message_id}: {str(e)}", exc_info=True)
+            if claimed:
+                release_claim(claimed)
+            if deducted_model:
+                refund_credit(video_job, deducted_model)
+            failed_message_ids.append(message_id)
+    
+    routed, send_failures = send_jobs_batched(pending)
+    
+    # Give failed sends' claims and credit back so the redriven message can route them again
+    failed_sends = set(send_failures)
+    for item in pending:
+        if item['messageId'] in failed_sends:
+            release_claim(item['jobId'])
+            refund_credit(item['job'], item['model'])
+    failed_message_ids.extend(send_failures)
+    
+    for item in routed:
+        remember_routed(item['jobId'])
+    rejections = [
+        (job_id, reason) for job_id, reason in rejections
+        if mark_job_rejected(job_id, reason)
+    ]
+    
+    put_events_batched(
+        [routed_event_entry(item['jobId'], item['provider'], item['model'], item['queueUrl'])
+         for item in routed] +
+        [rejected_event_entry(job_id, reason) for job_id, reason in rejections]
+    )
+    
+    attempts: Dict[Tuple[str, bool], int] = {}
+    for item in routed:
+        key = (item['provider'], True)
+        attempts[key] = attempts.get(key, 0) + 1
+    if send_failures:
+        attempts[('error', False)] = len(send_failures)
+    send_routing_metrics_batch(attempts)
+    outcome_counter.record(True, len(routed))
+    outcome_counter.record(False, len(failed_message_ids))
+    if rate_limited:
+        send_rate_limited_metric(rate_limited)
+    
+    logger.info(
+        f"Processed SQS batch: {len(records)} records, {len(routed)} routed, "
+        f"{len(rejections)} rejected, {len(failed_message_ids)} failed"
+    )
+    
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_message_ids]
+    }
+
+
+def has_enough_credit(video_job: Dict[str, Any], model: str) -> bool:
+    """
+    Check the job's estimated cost (lengthSec × model price) against the user's balance.
+    
+    Args:
+        video_job: Validated video job
+        model: Selected model
+        
+    Returns:
+        True if the job may be routed
+    """
+    if not CREDIT_CHECK_ENABLED:
+        return True
+    return credit_checker.has_credit(str(video_job['userId']), model, video_job.get('lengthSec', 0))
+
+
+def refund_credit(video_job: Dict[str, Any], model: str):
+    """
+    Give back the cached deduction of a job that passed the credit check but was not sent.
+    
+    Args:
+        video_job: Validated video job
+        model: Model the job was checked against
+    """
+    if CREDIT_CHECK_ENABLED:
+        credit_checker.refund(str(video_job['userId']), model, video_job.get('lengthSec', 0))
+
+
+def resolve_queue_url(provider: str, tier: str) -> Optional[str]:
+    """
+    Find the queue for a provider, preferring the priority lane for the tier.
+    
+    Args:
+        provider: Selected provider
+        tier: User tier from the job
+        
+    Returns:
+        Queue URL, or None if the provider has no queue configured
+    """
+    lane_url = PRIORITY_QUEUE_URLS.get(provider, {}).get(tier)
+    return lane_url or QUEUE_URLS.get(provider)
+
+
+def choose_route(video_job: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Apply routing rules, and in adaptive mode pick the least loaded eligible provider.
+    
+    Args:
+        video_job: Validated video job
+        
+    Returns:
+        Tuple of (provider, model, rejection_reason)
+    """
+    if ROUTING_MODE != 'adaptive':
+        return rule_engine.evaluate(video_job)
+    
+    candidates, rejection_reason = rule_engine.evaluate_candidates(video_job)
+    if rejection_reason:
+        return None, None, rejection_reason
+    
+    # Only providers with a configured queue can absorb load
+    eligible = [candidate for candidate in candidates if QUEUE_URLS.get(candidate[0])] or candidates
+    provider, model = select_provider(eligible, load_tracker.snapshot())
+    return provider, model, None
+
+
+def send_jobs_batched(pending: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Send routed jobs to their provider queues with send_message_batch.
+    
+    Args:
+        pending: Routing decisions with job, provider, model and queueUrl
+        
+    Returns:
+        Tuple of (successfully sent items, SQS message IDs that failed)
+    """
+    sent = []
+    failed = []
+    
+    by_queue: Dict[str, List[Dict[str, Any]]] = {}
+    for item in pending:
+        by_queue.setdefault(item['queueUrl'], []).append(item)
+    
+    for queue_url, items in by_queue.items():
+        for start in range(0, len(items), SQS_SEND_BATCH_SIZE):
+            chunk = items[start:start + SQS_SEND_BATCH_SIZE]
+            entries = [
+                {
+                    'Id': str(index),
+                    'MessageBody': json.dumps(item['job']),
+                    'MessageAttributes': {
+                        'provider': {'StringValue': item['provider'], 'DataType': 'String'},
+                        'model': {'StringValue': item['model'], 'DataType': 'String'},
+                        'jobId': {'StringValue': item['jobId'], 'DataType': 'String'},
+                        'userId': {'StringValue': str(item['job']['userId']), 'DataType': 'String'},
+                        'tier': {'StringValue': str(item['job'].get('tier', 'standard')), 'DataType': 'String'}
+                    }
+                }
+                for index, item in enumerate(chunk)
+            ]
+            try:
+                response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            except Exception as e:
+                logger.error(f"Failed to send job batch to SQS: {str(e)}")
+                failed.extend(item['messageId'] for item in chunk)
+                continue
+            
+            failed_ids = {entry['Id'] for entry in response.get('Failed', [])}
+            for entry in response.get('Failed', []):
+                logger.error(f"SQS rejected job {chunk[int(entry['Id'])]['jobId']}: "
+                             f"{entry.get('Code')} {entry.get('Message', '')}")
+            for index, item in enumerate(chunk):
+                if str(index) in failed_ids:
+                    failed.append(item['messageId'])
+                else:
+                    sent.append(item)
+    
+    return sent, failed
 
 
 def handle_heartbeat() -> Dict[str, Any]:
@@ -167,45 +532,63 @@ def handle_heartbeat() -> Dict[str, Any]:
         return {'statusCode': 500, 'body': 'Heartbeat failed'}
 
 
-def is_job_already_routed(job_id: str) -> bool:
+def already_processed_response(job_id: str) -> Dict[str, Any]:
+    """Response for a job that another delivery has already routed."""
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'status': 'already_processed', 'jobId': job_id})
+    }
+
+
+def was_recently_routed(job_id: str) -> bool:
     """
-    Check if job has already been routed (idempotency check).
+    Check the per-container LRU of jobs this container has routed.
+    
+    A hit only saves a DynamoDB round trip; a miss says nothing, the
+    conditional write in claim_job remains the source of truth.
     
     Args:
         job_id: Unique job identifier
         
     Returns:
-        True if job was already processed
+        True if the job was recently routed by this container
     """
-    try:
-        table = dynamodb.Table(JOBS_TABLE_NAME)
-        response = table.get_item(
-            Key={'jobId': job_id},
-            ProjectionExpression='#s',
-            ExpressionAttributeNames={'#s': 'status'}
-        )
-        
-        if 'Item' in response:
-            status = response['Item'].get('status')
-            return status in ['ROUTED', 'PROCESSING', 'COMPLETED']
-        
-        return False
-        
-    except Exception as e:
-        logger.error(f"Error checking job status: {str(e)}")
-        # Conservative approach: assume not routed to avoid skipping
-        return False
+    if job_id in _recently_routed:
+        _recently_routed.move_to_end(job_id)
+        return True
+    return False
 
 
-def record_routing_decision(job_id: str, provider: str, model: str, queue_url: str):
+def remember_routed(job_id: str):
     """
-    Record routing decision in DynamoDB Jobs table.
+    Add a job to the per-container LRU of routed jobs.
+    
+    Args:
+        job_id: Unique job identifier
+    """
+    _recently_routed[job_id] = None
+    _recently_routed.move_to_end(job_id)
+    while len(_recently_routed) > ROUTED_CACHE_SIZE:
+        _recently_routed.popitem(last=False)
+
+
+def claim_job(job_id: str, provider: str, model: str, queue_url: str) -> bool:
+    """
+    Claim a job for routing and record the routing decision.
+    
+    A single conditional UpdateItem replaces the former read-then-write
+    pair: it only succeeds while the job status is not ROUTED, PROCESSING
+    or COMPLETED, so two concurrent deliveries of the same jobId cannot
+    both enqueue it.
     
     Args:
         job_id: Job identifier
         provider: Selected provider
         model: Selected model
         queue_url: Target queue URL
+        
+    Returns:
+        True if this invocation owns the job and should enqueue it
     """
     try:
         table = dynamodb.Table(JOBS_TABLE_NAME)
@@ -213,6 +596,7 @@ def record_routing_decision(job_id: str, provider: str, model: str, queue_url: s
             Key={'jobId': job_id},
             UpdateExpression='SET #s = :status, provider = :provider, model = :model, '
                            'routedAt = :ts, routedBy = :agent, #q = :queue',
+            ConditionExpression='attribute_not_exists(#s) OR NOT #s IN (:routed, :processing, :completed)',
             ExpressionAttributeNames={
                 '#s': 'status',
                 '#q': 'queue'
@@ -223,13 +607,122 @@ def record_routing_decision(job_id: str, provider: str, model: str, queue_url: s
                 ':model': model,
                 ':ts': datetime.now(timezone.utc).isoformat(),
                 ':agent': 'RoutingManager',
-                ':queue': queue_url.split('/')[-1]  # Just queue name
+                ':queue': queue_url.split('/')[-1],  # Just queue name
+                ':routed': ROUTED_STATUSES[0],
+                ':processing': ROUTED_STATUSES[1],
+                ':completed': ROUTED_STATUSES[2]
             }
         )
-        logger.info(f"Recorded routing decision for job {job_id}")
+        logger.info(f"Claimed job {job_id} for {provider}")
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            remember_routed(job_id)
+            return False
+        logger.error(f"Error claiming job {job_id}: {str(e)}")
     except Exception as e:
-        logger.error(f"Failed to record routing decision: {str(e)}")
-        # Don't fail the request if recording fails
+        logger.error(f"Error claiming job {job_id}: {str(e)}")
+    
+    # Conservative approach: route anyway rather than drop the job
+    return True
+
+
+def release_claim(job_id: str):
+    """
+    Release a claim after the job could not be enqueued.
+    
+    Args:
+        job_id: Job identifier
+    """
+    try:
+        table = dynamodb.Table(JOBS_TABLE_NAME)
+        table.update_item(
+            Key={'jobId': job_id},
+            UpdateExpression='SET #s = :submitted REMOVE provider, model, routedAt, routedBy, #q',
+            ConditionExpression='#s = :routed',
+            ExpressionAttributeNames={
+                '#s': 'status',
+                '#q': 'queue'
+            },
+            ExpressionAttributeValues={
+                ':submitted': 'SUBMITTED',
+                ':routed': 'ROUTED'
+            }
+        )
+        logger.info(f"Released routing claim for job {job_id}")
+    except Exception as e:
+        logger.error(f"Failed to release routing claim for job {job_id}: {str(e)}")
+
+
+def routed_event_entry(job_id: str, provider: str, model: str, queue_url: str) -> Dict[str, Any]:
+    """
+    Build the EventBridge entry for a video.job.routed event.
+    
+    Args:
+        job_id: Job identifier
+        provider: Selected provider
+        model: Selected model
+        queue_url: Target queue URL
+        
+    Returns:
+        PutEvents entry
+    """
+    event_detail = {
+        'jobId': job_id,
+        'provider': provider,
+        'model': model,
+        'queue': queue_url.split('/')[-1],
+        'routedBy': 'RoutingManager',
+        'ts': datetime.now(timezone.utc).isoformat()
+    }
+    
+    return {
+        'Source': 'routing.manager',
+        'DetailType': 'video.job.routed',
+        'Detail': json.dumps(event_detail)
+    }
+
+
+def rejected_event_entry(job_id: str, reason: str) -> Dict[str, Any]:
+    """
+    Build the EventBridge entry for a video.job.rejected event.
+    
+    Args:
+        job_id: Job identifier
+        reason: Rejection reason
+        
+    Returns:
+        PutEvents entry
+    """
+    event_detail = {
+        'jobId': job_id,
+        'status': 'rejected',
+        'reason': reason,
+        'ts': datetime.now(timezone.utc).isoformat()
+    }
+    
+    return {
+        'Source': 'routing.manager',
+        'DetailType': 'video.job.rejected',
+        'Detail': json.dumps(event_detail)
+    }
+
+
+def put_events_batched(entries: List[Dict[str, Any]]):
+    """
+    Publish EventBridge entries, packing them PUT_EVENTS_BATCH_SIZE per call.
+    
+    Args:
+        entries: PutEvents entries
+    """
+    for start in range(0, len(entries), PUT_EVENTS_BATCH_SIZE):
+        chunk = entries[start:start + PUT_EVENTS_BATCH_SIZE]
+        try:
+            response = events_client.put_events(Entries=chunk)
+            if response.get('FailedEntryCount'):
+                logger.error(f"Failed to emit {response['FailedEntryCount']} of {len(chunk)} events")
+        except Exception as e:
+            logger.error(f"Failed to emit events: {str(e)}")
 
 
 def emit_routed_event(job_id: str, provider: str, model: str, queue_url: str):
@@ -243,70 +736,73 @@ def emit_routed_event(job_id: str, provider: str, model: str, queue_url: str):
         queue_url: Target queue URL
     """
     try:
-        event_detail = {
-            'jobId': job_id,
-            'provider': provider,
-            'model': model,
-            'queue': queue_url.split('/')[-1],
-            'routedBy': 'RoutingManager',
-            'ts': datetime.now(timezone.utc).isoformat()
-        }
-        
         events_client.put_events(
-            Entries=[
-                {
-                    'Source': 'routing.manager',
-                    'DetailType': 'video.job.routed',
-                    'Detail': json.dumps(event_detail)
-                }
-            ]
+            Entries=[routed_event_entry(job_id, provider, model, queue_url)]
         )
         logger.info(f"Emitted video.job.routed event for job {job_id}")
     except Exception as e:
         logger.error(f"Failed to emit routed event: {str(e)}")
 
 
-def emit_rejection(job_id: str, reason: str) -> Dict[str, Any]:
+def mark_job_rejected(job_id: str, reason: str) -> bool:
     """
-    Emit video.job.rejected event and return error response.
+    Record a rejection in the DynamoDB Jobs table.
+    
+    Uses the same status condition as claim_job so a late duplicate
+    delivery cannot overwrite a job that was already routed.
     
     Args:
         job_id: Job identifier
         reason: Rejection reason
         
     Returns:
-        Lambda response
+        False if the job had already been routed
     """
     try:
-        # Update job status in DynamoDB
         table = dynamodb.Table(JOBS_TABLE_NAME)
         table.update_item(
             Key={'jobId': job_id},
             UpdateExpression='SET #s = :status, rejectionReason = :reason, rejectedAt = :ts',
+            ConditionExpression='attribute_not_exists(#s) OR NOT #s IN (:routed, :processing, :completed)',
             ExpressionAttributeNames={'#s': 'status'},
             ExpressionAttributeValues={
                 ':status': 'REJECTED',
                 ':reason': reason,
-                ':ts': datetime.now(timezone.utc).isoformat()
+                ':ts': datetime.now(timezone.utc).isoformat(),
+                ':routed': ROUTED_STATUSES[0],
+                ':processing': ROUTED_STATUSES[1],
+                ':completed': ROUTED_STATUSES[2]
             }
         )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info(f"Job {job_id} already routed, not rejecting")
+            return False
+        logger.error(f"Failed to record rejection for job {job_id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Failed to record rejection for job {job_id}: {str(e)}")
+    return True
+
+
+def emit_rejection(job_id: str, reason: str) -> Dict[str, Any]:
+    """
+    Emit video.job.rejected event and return error response.
+    
+    Args:
+        job_id: Job identifier
+        reason: Rejection reason
         
+    Returns:
+        Lambda response
+    """
+    # Update job status in DynamoDB
+    if not mark_job_rejected(job_id, reason):
+        return already_processed_response(job_id)
+    
+    try:
         # Emit rejection event
-        event_detail = {
-            'jobId': job_id,
-            'status': 'rejected',
-            'reason': reason,
-            'ts': datetime.now(timezone.utc).isoformat()
-        }
-        
         events_client.put_events(
-            Entries=[
-                {
-                    'Source': 'routing.manager',
-                    'DetailType': 'video.job.rejected',
-                    'Detail': json.dumps(event_detail)
-                }
-            ]
+            Entries=[rejected_event_entry(job_id, reason)]
         )
         
         logger.info(f"Emitted video.job.rejected event for job {job_id}")
@@ -354,6 +850,62 @@ def send_routing_metrics(provider: str, success: bool):
         logger.error(f"Failed to send metrics: {str(e)}")
 
 
+def send_routing_metrics_batch(attempts: Dict[Tuple[str, bool], int]):
+    """
+    Send aggregated routing metrics for a batch in a single CloudWatch call.
+    
+    Args:
+        attempts: Routing attempt counts keyed by (provider, success)
+    """
+    if not attempts:
+        return
+    
+    try:
+        metrics = [
+            {
+                'MetricName': 'RoutingAttempts',
+                'Value': count,
+                'Unit': 'Count',
+                'Dimensions': [
+                    {'Name': 'Provider', 'Value': provider},
+                    {'Name': 'Success', 'Value': str(success)},
+                    {'Name': 'Stage', 'Value': STAGE}
+                ]
+            }
+            for (provider, success), count in attempts.items()
+        ]
+        
+        cloudwatch.put_metric_data(
+            Namespace='VideoJobRouting',
+            MetricData=metrics
+        )
+    except Exception as e:
+        logger.error(f"Failed to send metrics: {str(e)}")
+
+
+def send_rate_limited_metric(count: int):
+    """
+    Send the number of jobs turned away by admission control.
+
+    Args:
+        count: Rate-limited jobs
+    """
+    try:
+        cloudwatch.put_metric_data(
+            Namespace='VideoJobRouting',
+            MetricData=[
+                {
+                    'MetricName': 'RateLimitedJobs',
+                    'Value': count,
+                    'Unit': 'Count',
+                    'Dimensions': [{'Name': 'Stage', 'Value': STAGE}]
+                }
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Failed to send metrics: {str(e)}")
+
+
 # Health check handler for direct invocation
 def health_check(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
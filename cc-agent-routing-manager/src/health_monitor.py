@@ -3,14 +3,18 @@ Health monitor for CC Agent Routing Manager.
 Periodically checks health of all registered agents.
 """
 
+import asyncio
 import json
 import os
 import time
+from decimal import Decimal
 from typing import Dict, Any, List
 import logging
 import boto3
 from botocore.exceptions import ClientError
-from datetime import datetime
+
+from outcome_counters import error_rates
+from datetime import datetime, timezone
 import concurrent.futures
 
 # Set up logging
@@ -26,10 +30,38 @@ cloudwatch = boto3.client('cloudwatch')
 HEALTH_TABLE = os.environ.get('HEALTH_TABLE')
 AGENT_ENDPOINTS = json.loads(os.environ.get('AGENT_ENDPOINTS', '{}'))
 ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
+# Minute-bucketed success/error counters written by each agent
+AGENT_OUTCOMES_TABLE = os.environ.get('AGENT_OUTCOMES_TABLE')
+# passive = derive health from CloudWatch metrics, invoking only agents with stale heartbeats;
+# active = probe every agent
+HEALTH_CHECK_MODE = os.environ.get('HEALTH_CHECK_MODE', 'passive')
+# Optional agentId -> heartbeat namespace overrides (default Agent/<CamelCaseId>)
+AGENT_HEARTBEAT_NAMESPACES = json.loads(os.environ.get('AGENT_HEARTBEAT_NAMESPACES', '{}'))
 
 # Health check configuration
-HEALTH_CHECK_TIMEOUT = 5  # seconds
-MAX_WORKERS = 5  # concurrent health checks
+HEALTH_CHECK_TIMEOUT = 5  # seconds, deadline for agents without latency history
+# Never below a Lambda cold start, so an agent idle since its last probe is not failed for it
+MIN_PROBE_TIMEOUT = 5.0  # seconds
+MAX_PROBE_TIMEOUT = 10.0  # seconds
+
+# Latency history (smoothed mean and deviation, as in TCP RTO estimation)
+LATENCY_SMOOTHING = 0.125
+DEVIATION_SMOOTHING = 0.25
+DEVIATION_MULTIPLIER = 4
+
+# Circuit breaker: open after N consecutive failures, retry with exponential backoff
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_BACKOFF = 60  # seconds
+BREAKER_MAX_BACKOFF = 30 * 60  # seconds
+
+# Passive checks: agents heartbeat every 5 minutes
+HEARTBEAT_STALE_SECONDS = int(os.environ.get('HEARTBEAT_STALE_SECONDS', '900'))
+PASSIVE_MAX_ERROR_RATE = float(os.environ.get('PASSIVE_MAX_ERROR_RATE', '0.25'))
+METRIC_QUERIES_PER_CALL = 500  # GetMetricData limit
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -83,34 +115,342 @@ def check_all_agents_health() -> List[Dict[str, Any]]:
     """
     Check health of all registered agents concurrently.
     
+    Previous health records supply each agent's latency history and circuit
+    breaker state; the returned results carry the updated values.
+    
     Returns:
         List of health check results
     """
-    results = []
+    now = time.time()
+    previous = load_previous_health(list(AGENT_ENDPOINTS))
+    observed = observe_agents_from_metrics(now) if HEALTH_CHECK_MODE == 'passive' else {}
+    return asyncio.run(probe_all_agents(previous, now, observed))
+
+
+async def probe_all_agents(previous: Dict[str, Dict[str, Any]], now: float,
+                           observed: Dict[str, Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Probe every agent at once, each under its own deadline.
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit health checks for all agents
-        future_to_agent = {
-            executor.submit(check_agent_health, agent_id, function_arn): agent_id
+    A cycle takes as long as the largest deadline, not the sum of the slow
+    agents, and agents with an open breaker are not invoked at all. Agents
+    with a metric-based result in `observed` are not invoked either.
+    
+    Args:
+        previous: Last health record per agent
+        now: Cycle start (epoch seconds)
+        observed: Passive results for agents with a fresh heartbeat
+        
+    Returns:
+        List of health check results
+    """
+    observed = observed or {}
+    if not AGENT_ENDPOINTS:
+        return []
+    
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(AGENT_ENDPOINTS))
+    try:
+        return list(await asyncio.gather(*[
+            probe_agent(loop, executor, agent_id, function_arn, previous.get(agent_id, {}), now,
+                        observed.get(agent_id))
             for agent_id, function_arn in AGENT_ENDPOINTS.items()
+        ]))
+    finally:
+        # Don't wait for invokes that overran their deadline
+        executor.shutdown(wait=False)
+
+
+async def probe_agent(loop: asyncio.AbstractEventLoop, executor: concurrent.futures.Executor,
+                      agent_id: str, function_arn: str, record: Dict[str, Any],
+                      now: float, observed_result: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Probe one agent if its breaker allows it, then update its breaker and latency history.
+    
+    A passive result from metrics stands in for the probe, since observing
+    it costs the agent nothing.
+    
+    Args:
+        loop: Running event loop
+        executor: Pool running the blocking Lambda invokes
+        agent_id: Agent identifier
+        function_arn: Lambda function ARN
+        record: Previous health record for the agent
+        now: Cycle start (epoch seconds)
+        observed_result: Metric-based result, if the agent's heartbeat is fresh
+        
+    Returns:
+        Health check result including breaker and latency fields
+    """
+    breaker = breaker_from_record(record)
+    latency = latency_from_record(record)
+    
+    if observed_result is not None:
+        result = dict(observed_result)
+        result['breaker'] = update_breaker(breaker, result['healthy'], now)
+        result['latency'] = latency
+        return result
+    
+    if breaker['state'] == BREAKER_OPEN and now < breaker['retryAt']:
+        return {
+            'agentId': agent_id,
+            'healthy': False,
+            'error': 'circuit_open',
+            'timestamp': datetime.utcnow().isoformat(),
+            'skipped': True,
+            'breaker': breaker,
+            'latency': latency
         }
+    if breaker['state'] == BREAKER_OPEN:
+        breaker['state'] = BREAKER_HALF_OPEN
+    
+    timeout = probe_timeout(latency)
+    try:
+        result = await asyncio.wait_for(
+            loop.run_in_executor(executor, check_agent_health, agent_id, function_arn),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        result = {
+            'agentId': agent_id,
+            'healthy': False,
+            'error': f'Health check timed out after {timeout:.1f}s',
+            'responseTime': timeout * 1000,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error checking health for agent {agent_id}: {str(e)}")
+        result = {
+            'agentId': agent_id,
+            'healthy': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    if result['healthy'] and 'responseTime' in result:
+        latency = update_latency(latency, result['responseTime'] / 1000)
+    result['breaker'] = update_breaker(breaker, result['healthy'], now)
+    result['latency'] = latency
+    return result
+
+
+def probe_timeout(latency: Dict[str, float]) -> float:
+    """
+    Deadline for an agent's probe: smoothed latency plus a multiple of its deviation.
+    
+    Args:
+        latency: {'mean': seconds, 'deviation': seconds}, empty without history
         
-        # Collect results
-        for future in concurrent.futures.as_completed(future_to_agent):
-            agent_id = future_to_agent[future]
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Error checking health for agent {agent_id}: {str(e)}")
-                results.append({
-                    'agentId': agent_id,
-                    'healthy': False,
-                    'error': str(e),
-                    'timestamp': datetime.utcnow().isoformat()
-                })
-                
-    return results
+    Returns:
+        Timeout in seconds
+    """
+    if not latency:
+        return HEALTH_CHECK_TIMEOUT
+    timeout = latency['mean'] + DEVIATION_MULTIPLIER * latency['deviation']
+    return min(max(timeout, MIN_PROBE_TIMEOUT), MAX_PROBE_TIMEOUT)
+
+
+def update_latency(latency: Dict[str, float], sample: float) -> Dict[str, float]:
+    """
+    Fold a successful probe's latency into the agent's history.
+    
+    Args:
+        latency: Current history, empty for a new agent
+        sample: Observed latency in seconds
+        
+    Returns:
+        Updated {'mean', 'deviation'}
+    """
+    if not latency:
+        return {'mean': sample, 'deviation': sample / 2}
+    deviation = ((1 - DEVIATION_SMOOTHING) * latency['deviation'] +
+                 DEVIATION_SMOOTHING * abs(sample - latency['mean']))
+    mean = (1 - LATENCY_SMOOTHING) * latency['mean'] + LATENCY_SMOOTHING * sample
+    return {'mean': mean, 'deviation': deviation}
+
+
+def update_breaker(breaker: Dict[str, Any], healthy: bool, now: float) -> Dict[str, Any]:
+    """
+    Advance an agent's circuit breaker after a probe.
+    
+    Closed breakers open after BREAKER_FAILURE_THRESHOLD consecutive failures.
+    A half-open breaker closes on success, or re-opens with double the
+    previous backoff on failure.
+    
+    Args:
+        breaker: Current breaker state
+        healthy: Probe outcome
+        now: Cycle start (epoch seconds)
+        
+    Returns:
+        New breaker state
+    """
+    if healthy:
+        return {'state': BREAKER_CLOSED, 'failures': 0, 'openCount': 0, 'retryAt': 0}
+    
+    failures = breaker['failures'] + 1
+    if breaker['state'] == BREAKER_HALF_OPEN or failures >= BREAKER_FAILURE_THRESHOLD:
+        open_count = breaker['openCount'] + 1
+        backoff = min(BREAKER_BASE_BACKOFF * 2 ** (open_count - 1), BREAKER_MAX_BACKOFF)
+        return {'state': BREAKER_OPEN, 'failures': failures, 'openCount': open_count,
+                'retryAt': now + backoff}
+    return {'state': BREAKER_CLOSED, 'failures': failures, 'openCount': breaker['openCount'],
+            'retryAt': 0}
+
+
+def breaker_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Read breaker state from a health record (closed if the agent is new)."""
+    return {
+        'state': record.get('breakerState', BREAKER_CLOSED),
+        'failures': int(record.get('consecutiveFailures', 0)),
+        'openCount': int(record.get('breakerOpenCount', 0)),
+        'retryAt': float(record.get('breakerRetryAt', 0))
+    }
+
+
+def latency_from_record(record: Dict[str, Any]) -> Dict[str, float]:
+    """Read latency history from a health record (empty if none yet)."""
+    if 'latencyMean' not in record:
+        return {}
+    return {
+        'mean': float(record['latencyMean']),
+        'deviation': float(record.get('latencyDeviation', 0))
+    }
+
+
+def load_previous_health(agent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the last health record of each agent with BatchGetItem.
+    
+    Args:
+        agent_ids: Agents to load
+        
+    Returns:
+        Dict of agentId -> record (missing agents are omitted)
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    if not agent_ids:
+        return records
+    
+    try:
+        for i in range(0, len(agent_ids), 100):
+            request = {HEALTH_TABLE: {'Keys': [{'agentId': agent_id} for agent_id in agent_ids[i:i+100]]}}
+            while request:
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(HEALTH_TABLE, []):
+                    records[item['agentId']] = item
+                request = response.get('UnprocessedKeys') or {}
+    except Exception as e:
+        # Without history every agent gets the default deadline and a closed breaker
+        logger.error(f"Error loading previous health records: {str(e)}")
+    
+    return records
+
+
+def observe_agents_from_metrics(now: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Derive agent health from CloudWatch without invoking any agent.
+    
+    One batched GetMetricData call reads, per agent, its Agent/<Name>
+    Heartbeat and its Lambda Errors and Invocations over the last
+    HEARTBEAT_STALE_SECONDS. Agents with a recent heartbeat get a result
+    (unhealthy if their error rate exceeds PASSIVE_MAX_ERROR_RATE); agents
+    whose heartbeat is stale or unreadable are left out so they get an
+    active probe.
+    
+    Args:
+        now: Cycle start (epoch seconds)
+        
+    Returns:
+        Dict of agentId -> health check result
+    """
+    agents = list(AGENT_ENDPOINTS.items())
+    queries = []
+    for index, (agent_id, function_arn) in enumerate(agents):
+        function_name = lambda_function_name(function_arn)
+        for prefix, namespace, metric, dimensions in (
+            ('hb', heartbeat_namespace(agent_id), 'Heartbeat', []),
+            ('err', 'AWS/Lambda', 'Errors', [{'Name': 'FunctionName', 'Value': function_name}]),
+            ('inv', 'AWS/Lambda', 'Invocations', [{'Name': 'FunctionName', 'Value': function_name}])
+        ):
+            queries.append({
+                'Id': f'{prefix}{index}',
+                'MetricStat': {
+                    'Metric': {'Namespace': namespace, 'MetricName': metric, 'Dimensions': dimensions},
+                    'Period': 60,
+                    'Stat': 'Sum'
+                }
+            })
+    
+    series: Dict[str, Dict[str, Any]] = {}
+    try:
+        for i in range(0, len(queries), METRIC_QUERIES_PER_CALL):
+            request = {
+                'MetricDataQueries': queries[i:i + METRIC_QUERIES_PER_CALL],
+                'StartTime': datetime.fromtimestamp(now - HEARTBEAT_STALE_SECONDS, timezone.utc),
+                'EndTime': datetime.fromtimestamp(now, timezone.utc),
+                'ScanBy': 'TimestampDescending'
+            }
+            while True:
+                response = cloudwatch.get_metric_data(**request)
+                for result in response.get('MetricDataResults', []):
+                    entry = series.setdefault(result['Id'], {'Timestamps': [], 'Values': []})
+                    entry['Timestamps'].extend(result.get('Timestamps', []))
+                    entry['Values'].extend(result.get('Values', []))
+                if not response.get('NextToken'):
+                    break
+                request['NextToken'] = response['NextToken']
+    except Exception as e:
+        # Fall back to active probes for everyone
+        logger.error(f"Error reading agent health metrics: {str(e)}")
+        return {}
+    
+    observed = {}
+    for index, (agent_id, _) in enumerate(agents):
+        heartbeat = series.get(f'hb{index}', {})
+        beats = [ts for ts, value in zip(heartbeat.get('Timestamps', []), heartbeat.get('Values', []))
+                 if value > 0]
+        if not beats:
+            continue
+        
+        last_beat = max(beats)
+        errors = sum(series.get(f'err{index}', {}).get('Values', []))
+        invocations = sum(series.get(f'inv{index}', {}).get('Values', []))
+        error_rate = errors / invocations if invocations else 0.0
+        healthy = error_rate <= PASSIVE_MAX_ERROR_RATE
+        
+        result = {
+            'agentId': agent_id,
+            'healthy': healthy,
+            'status': 'healthy' if healthy else 'degraded',
+            'source': 'metrics',
+            'timestamp': datetime.utcnow().isoformat(),
+            'details': {
+                'lastHeartbeat': last_beat.isoformat(),
+                'errors': errors,
+                'invocations': invocations,
+                'errorRate': error_rate
+            }
+        }
+        if not healthy:
+            result['error'] = f'Error rate {error_rate:.0%} over {HEARTBEAT_STALE_SECONDS // 60} minutes'
+        observed[agent_id] = result
+    
+    logger.info(f"Passive health: {len(observed)}/{len(agents)} agents observed from metrics")
+    return observed
+
+
+def heartbeat_namespace(agent_id: str) -> str:
+    """Heartbeat namespace for an agent, e.g. routing-manager -> Agent/RoutingManager."""
+    if agent_id in AGENT_HEARTBEAT_NAMESPACES:
+        return AGENT_HEARTBEAT_NAMESPACES[agent_id]
+    return 'Agent/' + ''.join(part.capitalize() for part in agent_id.replace('_', '-').split('-'))
+
+
+def lambda_function_name(function_arn: str) -> str:
+    """Function name from a Lambda ARN (or the name itself)."""
+    parts = function_arn.split(':')
+    return parts[6] if len(parts) >= 7 else function_arn
 
 
 def check_agent_health(agent_id: str, function_arn: str) -> Dict[str, Any]:
@@ -205,21 +545,35 @@ def update_health_records(health_results: List[Dict[str, Any]]):
     with table.batch_writer() as batch:
         for result in health_results:
             try:
-                # Calculate error rate from recent history
-                error_rate = calculate_error_rate(result['agentId'])
+                # Sliding-window error rates from the agent's outcome counters
+                rates = calculate_error_rates(result['agentId'])
                 
                 item = {
                     'agentId': result['agentId'],
                     'status': 'healthy' if result['healthy'] else 'unhealthy',
                     'lastCheck': result['timestamp'],
                     'responseTime': result.get('responseTime', 0),
-                    'errorRate': error_rate,
+                    'errorRate': rates.get('5m', 0.0),
+                    'errorRates': rates,
                     'error': result.get('error'),
                     'details': result.get('details', {}),
                     'ttl': int(time.time()) + (24 * 60 * 60)  # 24 hour TTL
                 }
                 
-                batch.put_item(Item=item)
+                # Breaker state for the router and the next cycle
+                breaker = result.get('breaker')
+                if breaker:
+                    item['breakerState'] = breaker['state']
+                    item['consecutiveFailures'] = breaker['failures']
+                    item['breakerOpenCount'] = breaker['openCount']
+                    item['breakerRetryAt'] = int(breaker['retryAt'])
+                latency = result.get('latency')
+                if latency:
+                    item['latencyMean'] = latency['mean']
+                    item['latencyDeviation'] = latency['deviation']
+                
+                # DynamoDB rejects floats
+                batch.put_item(Item=json.loads(json.dumps(item), parse_float=Decimal))
                 
             except Exception as e:
                 logger.error(f"Error updating health record for {result['agentId']}: {str(e)}")
@@ -233,14 +587,30 @@ def calculate_error_rate(agent_id: str) -> float:
         agent_id: Agent identifier
         
     Returns:
-        Error rate as decimal (0.0 to 1.0)
+        Error rate as decimal (0.0 to 1.0) over the last 5 minutes
+    """
+    return calculate_error_rates(agent_id).get('5m', 0.0)
+
+
+def calculate_error_rates(agent_id: str) -> Dict[str, float]:
+    """
+    Calculate 5/15/60-minute error rates from the agent's minute buckets.
+    
+    Args:
+        agent_id: Agent identifier
+        
+    Returns:
+        Dict like {'5m': 0.02, '15m': 0.01, '60m': 0.01}; windows without
+        traffic are omitted
     """
+    if not AGENT_OUTCOMES_TABLE:
+        return {}
     try:
-        # This is a simplified calculation
-        # In production, would query routing history for actual error rate
-        return 0.0
-    except Exception:
-        return 0.0
+        rates = error_rates(dynamodb.Table(AGENT_OUTCOMES_TABLE), agent_id)
+    except Exception as e:
+        logger.error(f"Error reading outcome counters for {agent_id}: {str(e)}")
+        return {}
+    return {f'{window}m': rate for window, rate in rates.items() if rate is not None}
 
 
 def send_health_metrics(health_results: List[Dict[str, Any]]):
@@ -0,0 +1,219 @@
+"""
+Queue-depth and latency aware provider selection.
+Scores eligible providers from cached SQS backlog and queue latency signals.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+logger = logging.getLogger()
+
+# Signal refresh intervals (seconds)
+DEPTH_REFRESH_SECONDS = float(os.environ.get('ADAPTIVE_DEPTH_REFRESH_SECONDS', '5'))
+LATENCY_REFRESH_SECONDS = float(os.environ.get('ADAPTIVE_LATENCY_REFRESH_SECONDS', '60'))
+
+# Scoring: one waiting message costs 1 point, one second of queue age costs LATENCY_WEIGHT
+LATENCY_WEIGHT = float(os.environ.get('ADAPTIVE_LATENCY_WEIGHT', '0.1'))
+# The rule's preferred provider keeps the job unless another is this many points better
+SWITCH_MARGIN = float(os.environ.get('ADAPTIVE_SWITCH_MARGIN', '10'))
+
+
+class ProviderLoadTracker:
+    """
+    Per-container cache of provider queue load.
+
+    A provider may have several queues (its base queue and priority lanes).
+    Its depth is the sum of their SQS ApproximateNumberOfMessages (refreshed
+    at most every DEPTH_REFRESH_SECONDS); its latency is the largest
+    ApproximateAgeOfOldestMessage among them from CloudWatch (a 1-minute
+    metric, refreshed at most every LATENCY_REFRESH_SECONDS). Refreshes run on a background
+    thread so routing never waits on them; callers always read the last
+    snapshot.
+    """
+
+    def __init__(self, queue_urls: Dict[str, Union[Optional[str], List[str]]], sqs_client: Any,
+                 cloudwatch_client: Any, depth_refresh_seconds: float = DEPTH_REFRESH_SECONDS,
+                 latency_refresh_seconds: float = LATENCY_REFRESH_SECONDS):
+        # provider -> every queue it is fed from
+        self.queue_urls: Dict[str, List[str]] = {}
+        for provider, urls in queue_urls.items():
+            urls = [url for url in ([urls] if isinstance(urls, str) or urls is None else urls) if url]
+            if urls:
+                self.queue_urls[provider] = urls
+        self.sqs = sqs_client
+        self.cloudwatch = cloudwatch_client
+        self.depth_refresh_seconds = depth_refresh_seconds
+        self.latency_refresh_seconds = latency_refresh_seconds
+
+        self._lock = threading.Lock()
+        self._depth: Dict[str, float] = {}
+        self._latency: Dict[str, float] = {}
+        self._depth_refreshed_at = 0.0
+        self._latency_refreshed_at = 0.0
+        self._refreshing = False
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return the cached load signals, scheduling a background refresh if stale.
+
+        Returns:
+            Dict of provider -> {'depth': messages, 'latency': seconds}
+        """
+        now = time.time()
+        with self._lock:
+            stale = now - self._depth_refreshed_at >= self.depth_refresh_seconds
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return {
+                provider: {
+                    'depth': self._depth.get(provider, 0.0),
+                    'latency': self._latency.get(provider, 0.0)
+                }
+                for provider in self.queue_urls
+                if provider in self._depth
+            }
+
+    def note_enqueued(self, provider: str, count: int = 1):
+        """
+        Account for jobs this container just enqueued until the next refresh.
+
+        Args:
+            provider: Provider the jobs were sent to
+            count: Number of jobs
+        """
+        with self._lock:
+            if provider in self._depth:
+                self._depth[provider] += count
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh provider load: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self):
+        """Fetch queue depth (and latency when due) for every provider queue."""
+        depth = {}
+        for provider, queue_urls in self.queue_urls.items():
+            try:
+                depth[provider] = sum(
+                    float(self.sqs.get_queue_attributes(
+                        QueueUrl=queue_url,
+                        AttributeNames=['ApproximateNumberOfMessages']
+                    )['Attributes'].get('ApproximateNumberOfMessages', 0))
+                    for queue_url in queue_urls
+                )
+            except Exception as e:
+                # Keep the last full sum rather than undercount from some of the queues
+                logger.error(f"Failed to read depth of {provider} queues: {str(e)}")
+
+        now = time.time()
+        latency = None
+        if now - self._latency_refreshed_at >= self.latency_refresh_seconds:
+            latency = self._fetch_latency()
+
+        with self._lock:
+            self._depth.update(depth)
+            self._depth_refreshed_at = now
+            if latency is not None:
+                self._latency.update(latency)
+                self._latency_refreshed_at = now
+
+    def _fetch_latency(self) -> Optional[Dict[str, float]]:
+        """Read ApproximateAgeOfOldestMessage for all queues in one GetMetricData call."""
+        queues = [
+            (provider, queue_url)
+            for provider, queue_urls in self.queue_urls.items()
+            for queue_url in queue_urls
+        ]
+        end = datetime.now(timezone.utc)
+        try:
+            response = self.cloudwatch.get_metric_data(
+                MetricDataQueries=[
+                    {
+                        'Id': f'age{index}',
+                        'MetricStat': {
+                            'Metric': {
+                                'Namespace': 'AWS/SQS',
+                                'MetricName': 'ApproximateAgeOfOldestMessage',
+                                'Dimensions': [
+                                    {'Name': 'QueueName', 'Value': queue_url.split('/')[-1]}
+                                ]
+                            },
+                            'Period': 60,
+                            'Stat': 'Maximum'
+                        }
+                    }
+                    for index, (_, queue_url) in enumerate(queues)
+                ],
+                StartTime=end - timedelta(minutes=5),
+                EndTime=end,
+                ScanBy='TimestampDescending'
+            )
+        except Exception as e:
+            logger.error(f"Failed to read provider queue latency: {str(e)}")
+            return None
+
+        latency = {}
+        for result in response.get('MetricDataResults', []):
+            provider = queues[int(result['Id'][len('age'):])][0]
+            if result.get('Values'):
+                latency[provider] = max(latency.get(provider, 0.0), float(result['Values'][0]))
+        return latency
+
+
+def score_provider(signals: Dict[str, float]) -> float:
+    """
+    Score a provider's current load; lower is better.
+
+    Args:
+        signals: {'depth': messages, 'latency': seconds}
+
+    Returns:
+        Load score
+    """
+    return signals['depth'] + LATENCY_WEIGHT * signals['latency']
+
+
+def select_provider(candidates: List[Tuple[str, str]],
+                    snapshot: Dict[str, Dict[str, float]]) -> Tuple[str, str]:
+    """
+    Pick the least loaded eligible provider.
+
+    The first candidate (the rule's own route) is kept unless an alternative
+    scores better by more than SWITCH_MARGIN, which avoids flapping between
+    providers on small differences. Providers without signals are only used
+    as the fallback first candidate.
+
+    Args:
+        candidates: Eligible (provider, model) pairs, preferred first
+        snapshot: Cached load signals from ProviderLoadTracker
+
+    Returns:
+        Selected (provider, model)
+    """
+    preferred = candidates[0]
+    if len(candidates) == 1 or preferred[0] not in snapshot:
+        return preferred
+
+    best = preferred
+    best_score = score_provider(snapshot[preferred[0]]) - SWITCH_MARGIN
+    for candidate in candidates[1:]:
+        if candidate[0] not in snapshot:
+            continue
+        score = score_provider(snapshot[candidate[0]])
+        if score < best_score:
+            best, best_score = candidate, score
+
+    if best is not preferred:
+        logger.info(f"Adaptive routing: {preferred[0]} backlog {snapshot[preferred[0]]}, "
+                    f"using {best[0]} backlog {snapshot[best[0]]}")
+    return best
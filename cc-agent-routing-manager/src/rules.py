@@ -1,78 +1,399 @@
 """
 Rule Engine for Video Job Routing
-Phase-1 MVP implementation with static rules
+Data-driven rules compiled into an indexed decision structure
 """
+import heapq
+import itertools
+import json
 import logging
-from typing import Dict, Any, Optional, Tuple
+import os
+import time
+from bisect import bisect_right
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
 logger = logging.getLogger()
 
+# Match dimensions, in bucket-key order. None in a key means "any value".
+MATCH_DIMENSIONS = ("tier", "resolution", "audio", "provider")
+
+# Built-in rule document, used when no external document is configured
+DEFAULT_RULES_DOCUMENT = {
+    "version": "builtin-1",
+    "providers": {
+        "fal": "wan-i2v",
+        "replicate": "stable-video",
+        "veo": "veo-standard"
+    },
+    "rules": [
+        # Explicit provider preference is respected
+        {"id": "explicit-fal", "priority": 1000,
+         "match": {"provider": "fal"}, "route": {"provider": "fal", "model": "wan-i2v"}},
+        {"id": "explicit-replicate", "priority": 1000,
+         "match": {"provider": "replicate"}, "route": {"provider": "replicate", "model": "stable-video"}},
+        {"id": "explicit-veo", "priority": 1000,
+         "match": {"provider": "veo"}, "route": {"provider": "veo", "model": "veo-standard"}},
+        # ≤10s & 720p → fal with wan-i2v model (Replicate may absorb peaks)
+        {"id": "short-720p", "priority": 100,
+         "match": {"provider": "auto", "resolution": "720p", "lengthSec": {"min": 1, "max": 10}},
+         "route": {"provider": "fal", "model": "wan-i2v"},
+         "alternatives": [{"provider": "replicate", "model": "stable-video"}]}
+    ]
+}
+
+# Compiled rule sets, keyed by version tag, shared by engines in a warm container
+_compiled_cache: Dict[str, "CompiledRuleSet"] = {}
+COMPILED_CACHE_SIZE = 4
+
+# Minimum interval between polls of an external rule source
+RULES_REFRESH_SECONDS = float(os.environ.get('ROUTING_RULES_REFRESH_SECONDS', '60'))
+
+RuleSource = Callable[[], Tuple[str, Dict[str, Any]]]
+
+
+class CompiledRuleSet:
+    """
+    Rule document compiled for O(log n) evaluation.
+
+    Rules are grouped into exact-match buckets keyed by
+    (tier, resolution, audio, provider), with None standing for a wildcard.
+    Within a bucket the lengthSec intervals are flattened into sorted,
+    non-overlapping segments that each carry their winning rule, so a lookup
+    is a bisect per candidate bucket. At most 2^4 candidate buckets exist
+    and only dimensions that some rule constrains are expanded.
+    """
+
+    def __init__(self, document: Dict[str, Any]):
+        self.version = str(document.get("version", "unversioned"))
+        self.default_models = dict(document.get("providers", {}))
+        self.supported_providers = list(self.default_models)
+        self.rule_count = len(document.get("rules", []))
+
+        grouped: Dict[Tuple, List[Tuple[int, int, Tuple, Dict[str, Any]]]] = {}
+        for order, rule in enumerate(document.get("rules", [])):
+            match = rule.get("match", {})
+            key = tuple(
+                _normalize(dim, match[dim]) if dim in match else None
+                for dim in MATCH_DIMENSIONS
+            )
+            length = match.get("lengthSec", {})
+            low = int(length.get("min", 0))
+            high = int(length["max"]) + 1 if "max" in length else None
+            if high is not None and high <= low:
+                raise ValueError(f"rule {rule.get('id', order)}: empty lengthSec interval")
+            if "route" not in rule and "reject" not in rule:
+                raise ValueError(f"rule {rule.get('id', order)}: needs 'route' or 'reject'")
+            # Higher priority wins, then earlier position in the document
+            rank = (-int(rule.get("priority", 0)), order)
+            grouped.setdefault(key, []).append((low, high, rank, rule))
+
+        self.buckets = {key: _flatten_intervals(items) for key, items in grouped.items()}
+
+        # Only expand dimensions that some rule actually constrains
+        self._candidates = [
+            any(key[i] is not None for key in self.buckets)
+            for i in range(len(MATCH_DIMENSIONS))
+        ]
+
+    def lookup(self, attributes: Tuple, length_sec: int) -> Optional[Dict[str, Any]]:
+        """
+        Find the winning rule for a job.
+
+        Args:
+            attributes: Job values in MATCH_DIMENSIONS order
+            length_sec: Job length in seconds
+
+        Returns:
+            Winning rule, or None if no rule matches
+        """
+        choices = [
+            (value, None) if constrained else (None,)
+            for value, constrained in zip(attributes, self._candidates)
+        ]
+
+        best = None
+        for key in itertools.product(*choices):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            starts, winners = bucket
+            index = bisect_right(starts, length_sec) - 1
+            if index < 0:
+                continue
+            winner = winners[index]
+            if winner is not None and (best is None or winner[0] < best[0]):
+                best = winner
+
+        return best[1] if best else None
+
+
+def _normalize(dimension: str, value: Any) -> Any:
+    """Normalize a match value so rule keys and job keys compare equal."""
+    if dimension == "audio":
+        return bool(value)
+    return str(value)
+
+
+def _flatten_intervals(items: List[Tuple[int, Optional[int], Tuple, Dict[str, Any]]]) -> Tuple[List[int], List]:
+    """
+    Flatten overlapping [low, high) intervals into disjoint segments.
+
+    Sweeps the interval boundaries once with a heap of active rules, so
+    compilation is O(k log k) for k rules in the bucket.
+
+    Returns:
+        Tuple of (segment starts, winning (rank, rule) per segment or None)
+    """
+    starts_at: Dict[int, List] = {}
+    ends_at: Dict[int, List] = {}
+    for low, high, rank, rule in items:
+        starts_at.setdefault(low, []).append((rank, rule))
+        if high is not None:
+            ends_at.setdefault(high, []).append(rank)
+
+    active: List = []
+    ended = set()
+    starts: List[int] = []
+    winners: List = []
+    for point in sorted(set(starts_at) | set(ends_at)):
+        ended.update(ends_at.get(point, ()))
+        for rank, rule in starts_at.get(point, ()):
+            heapq.heappush(active, (rank, rule))
+        while active and active[0][0] in ended:
+            heapq.heappop(active)
+        winner = (active[0][0], active[0][1]) if active else None
+        # Merge adjacent segments with the same winner
+        if winners and (winners[-1] and winners[-1][0]) == (winner and winner[0]):
+            continue
+        starts.append(point)
+        winners.append(winner)
+
+    return starts, winners
+
+
+def compile_rules(document: Dict[str, Any], version: Optional[str] = None) -> CompiledRuleSet:
+    """
+    Compile a rule document.
+
+    When a version tag is given the result is cached for the life of the
+    warm container, so re-reading an unchanged document never recompiles.
+
+    Args:
+        document: Rule document with version, providers and rules
+        version: Version tag to cache under
+
+    Returns:
+        Compiled rule set
+    """
+    if version is None:
+        return CompiledRuleSet(document)
+
+    compiled = _compiled_cache.get(version)
+    if compiled is None:
+        started = time.time()
+        compiled = CompiledRuleSet(document)
+        _compiled_cache[version] = compiled
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.pop(next(iter(_compiled_cache)))
+        logger.info(f"Compiled {compiled.rule_count} routing rules (version {version}) "
+                    f"in {(time.time() - started) * 1000:.1f} ms")
+    return compiled
+
+
+def ssm_rule_source(parameter_name: str) -> RuleSource:
+    """
+    Rule source reading a JSON rule document from SSM Parameter Store.
+
+    The version tag combines the document version with the SSM parameter
+    version, so any edit to the parameter triggers a recompile.
+
+    Args:
+        parameter_name: SSM parameter holding the rule document
+
+    Returns:
+        Callable returning (version tag, document)
+    """
+    import boto3
+    ssm = boto3.client('ssm')
+
+    def load() -> Tuple[str, Dict[str, Any]]:
+        parameter = ssm.get_parameter(Name=parameter_name)['Parameter']
+        document = json.loads(parameter['Value'])
+        return f"{document.get('version', 'unversioned')}@{parameter['Version']}", document
+
+    return load
+
+
+def file_rule_source(path: str) -> RuleSource:
+    """
+    Rule source reading a JSON rule document from a file.
+
+    Args:
+        path: Path to the rule document
+
+    Returns:
+        Callable returning (version tag, document)
+    """
+    def load() -> Tuple[str, Dict[str, Any]]:
+        with open(path) as f:
+            document = json.load(f)
+        return f"{document.get('version', 'unversioned')}@{os.path.getmtime(path)}", document
+
+    return load
+
+
+def rule_source_from_env() -> Optional[RuleSource]:
+    """
+    Build the rule source configured through the environment.
+
+    ROUTING_RULES_PARAMETER (SSM) takes precedence over ROUTING_RULES_FILE.
+
+    Returns:
+        Rule source, or None to use the built-in rules
+    """
+    parameter_name = os.environ.get('ROUTING_RULES_PARAMETER')
+    if parameter_name:
+        return ssm_rule_source(parameter_name)
+    path = os.environ.get('ROUTING_RULES_FILE')
+    if path:
+        return file_rule_source(path)
+    return None
+
+
 class RoutingRuleEngine:
-    """Static rule engine for video job routing decisions"""
-    
-    def __init__(self):
-        self.supported_providers = ["fal", "replicate", "veo"]
-        self.default_models = {
-            "fal": "wan-i2v",
-            "replicate": "stable-video",
-            "veo": "veo-standard"
-        }
-    
+    """Data-driven rule engine for video job routing decisions"""
+
+    def __init__(self, document: Optional[Dict[str, Any]] = None,
+                 source: Optional[RuleSource] = None,
+                 refresh_seconds: float = RULES_REFRESH_SECONDS):
+        """
+        Args:
+            document: Static rule document (defaults to the built-in rules)
+            source: Optional callable returning (version tag, document);
+                polled at most every refresh_seconds for hot reload
+            refresh_seconds: Minimum interval between source polls
+        """
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self._last_refresh = 0.0
+        self._apply(compile_rules(document or DEFAULT_RULES_DOCUMENT))
+        if source:
+            self.refresh(force=True)
+
+    def _apply(self, compiled: CompiledRuleSet):
+        self.rules = compiled
+        self.version = compiled.version
+        self.supported_providers = compiled.supported_providers
+        self.default_models = compiled.default_models
+
+    def refresh(self, force: bool = False):
+        """
+        Reload rules from the source if the refresh interval has passed.
+
+        Compilation only happens when the version tag changes; on any error
+        the last good rule set stays in place.
+
+        Args:
+            force: Poll the source regardless of the refresh interval
+        """
+        if not self.source:
+            return
+        now = time.time()
+        if not force and now - self._last_refresh < self.refresh_seconds:
+            return
+        self._last_refresh = now
+        try:
+            tag, document = self.source()
+            if tag != self.version:
+                self._apply(compile_rules(document, tag))
+                self.version = tag
+                logger.info(f"Routing rules now at version {tag}")
+        except Exception as e:
+            logger.error(f"Failed to reload routing rules, keeping version {self.version}: {str(e)}")
+
     def evaluate(self, job: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         """
         Evaluate routing rules for a video job
-        
+
         Args:
             job: Video job request with tier, lengthSec, resolution, provider fields
-            
+
         Returns:
             Tuple of (provider, model, rejection_reason)
             - If routable: (provider, model, None)
             - If rejected: (None, None, reason)
         """
+        candidates, rejection_reason = self.evaluate_candidates(job)
+        if rejection_reason:
+            return None, None, rejection_reason
+        provider, model = candidates[0]
+        return provider, model, None
+
+    def evaluate_candidates(self, job: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+        """
+        Evaluate routing rules and list every eligible provider for a job
+
+        The winning rule's route comes first, followed by its optional
+        "alternatives"; adaptive routing may pick any of them.
+
+        Args:
+            job: Video job request with tier, lengthSec, resolution, provider fields
+
+        Returns:
+            Tuple of (candidates, rejection_reason)
+            - If routable: ([(provider, model), ...], None)
+            - If rejected: ([], reason)
+        """
         try:
+            self.refresh()
+
             # Extract job parameters
             tier = job.get("tier", "standard")
             length_sec = int(job.get("lengthSec", 0))
             resolution = job.get("resolution", "720p")
+            audio = bool((job.get("feature") or {}).get("audio", False))
             provider_pref = job.get("provider", "auto")
-            
-            # Rule 1: If provider explicitly specified, respect it
-            if provider_pref != "auto":
-                if provider_pref in self.supported_providers:
-                    model = self.default_models.get(provider_pref)
-                    logger.info(f"Using explicit provider: {provider_pref}, model: {model}")
-                    return provider_pref, model, None
-                else:
-                    logger.warning(f"Unsupported provider requested: {provider_pref}")
-                    return None, None, f"unsupported_provider:{provider_pref}"
-            
-            # Rule 2: ≤10s & 720p → fal with wan-i2v model
-            if length_sec <= 10 and resolution == "720p":
-                logger.info(f"Routing to fal (wan-i2v) for {length_sec}s {resolution} video")
-                return "fal", "wan-i2v", None
-            
-            # Rule 3: No matching route
-            logger.info(f"No route found for {length_sec}s {resolution} video")
-            return None, None, "no_route"
-            
+
+            if provider_pref != "auto" and provider_pref not in self.default_models:
+                logger.warning(f"Unsupported provider requested: {provider_pref}")
+                return [], f"unsupported_provider:{provider_pref}"
+
+            rule = self.rules.lookup(
+                (str(tier), str(resolution), audio, str(provider_pref)), length_sec
+            )
+
+            if rule is None:
+                logger.info(f"No route found for {length_sec}s {resolution} video")
+                return [], "no_route"
+
+            if "reject" in rule:
+                logger.info(f"Rule {rule.get('id')} rejected {length_sec}s {resolution} video")
+                return [], rule["reject"]
+
+            candidates = [
+                (route["provider"], route.get("model") or self.default_models.get(route["provider"]))
+                for route in [rule["route"]] + rule.get("alternatives", [])
+            ]
+            logger.info(f"Routing to {candidates[0][0]} ({candidates[0][1]}) for {length_sec}s "
+                        f"{resolution} video by rule {rule.get('id')}")
+            return candidates, None
+
         except Exception as e:
             logger.error(f"Rule evaluation error: {str(e)}", exc_info=True)
-            return None, None, f"rule_error:{str(e)}"
-    
+            return [], f"rule_error:{str(e)}"
+
     def validate_job(self, job: Dict[str, Any]) -> Optional[str]:
         """
         Validate job has required fields
-        
+
         Returns:
             None if valid, error message if invalid
         """
         required_fields = ["jobId", "userId", "prompt"]
-        
+
         for field in required_fields:
             if field not in job:
                 return f"missing_required_field:{field}"
-        
+
         # Validate numeric fields
         try:
             if "lengthSec" in job:
@@ -81,5 +402,5 @@ class RoutingRuleEngine:
                     return "invalid_length:must_be_1-300_seconds"
         except (ValueError, TypeError):
             return "invalid_length:not_a_number"
-        
-        return None
\ No newline at end of file
+
+        return None
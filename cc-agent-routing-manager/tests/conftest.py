@@ -0,0 +1,20 @@
+"""
+Shared fixtures for the routing manager tests
+"""
+import pytest
+
+
+class Clock:
+    """Controllable time source"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A Clock at a fixed epoch; advance it by changing clock.now"""
+    return Clock()
@@ -0,0 +1,102 @@
+"""
+Unit tests for per-user admission control
+"""
+from unittest import mock
+
+import boto3
+from moto import mock_aws
+
+from src.admission import TokenBucketLimiter
+
+LIMITS = {
+    "free": {"burst": 3, "perMinute": 6},
+    "standard": {"burst": 10, "perMinute": 30}
+}
+
+
+def create_table():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    return dynamodb.create_table(
+        TableName='test-rate-limits',
+        KeySchema=[{'AttributeName': 'bucketKey', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'bucketKey', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+class TestTokenBucketLimiter:
+    """Test token bucket admission"""
+
+    def test_in_memory_burst_then_refill(self, clock):
+        """Test burst capacity, rejection, and refill at the sustained rate"""
+        limiter = TokenBucketLimiter(limits=LIMITS, clock=clock)
+
+        assert [limiter.allow('user-1', 'free') for _ in range(4)] == [True, True, True, False]
+
+        # 6/minute refills one token every 10 seconds
+        clock.now += 10
+        assert limiter.allow('user-1', 'free')
+        assert not limiter.allow('user-1', 'free')
+
+    def test_buckets_are_per_user_and_tier(self, clock):
+        """Test that one user's bucket does not limit another"""
+        limiter = TokenBucketLimiter(limits=LIMITS, clock=clock)
+
+        for _ in range(3):
+            limiter.allow('user-1', 'free')
+
+        assert not limiter.allow('user-1', 'free')
+        assert limiter.allow('user-2', 'free')
+        assert limiter.allow('user-1', 'standard')
+
+    def test_unknown_tier_uses_standard(self, clock):
+        """Test that unlisted tiers fall back to the standard limits"""
+        limiter = TokenBucketLimiter(limits=LIMITS, clock=clock)
+
+        results = [limiter.allow('user-1', 'mystery') for _ in range(11)]
+
+        assert results.count(True) == 10
+
+    @mock_aws
+    def test_shared_bucket_across_containers(self, clock):
+        """Test that the DynamoDB bucket bounds a user across containers"""
+        table = create_table()
+        first = TokenBucketLimiter(table, LIMITS, clock)
+        second = TokenBucketLimiter(table, LIMITS, clock)
+
+        assert first.allow('user-1', 'free')
+        assert second.allow('user-1', 'free')
+        assert first.allow('user-1', 'free')
+        assert not second.allow('user-1', 'free')
+
+        clock.now += 10
+        assert second.allow('user-1', 'free')
+        assert not first.allow('user-1', 'free')
+
+        item = table.get_item(Key={'bucketKey': 'user-1#free'})['Item']
+        assert 'expiresAt' in item
+
+    @mock_aws
+    def test_known_over_limit_skips_dynamodb(self, clock):
+        """Test the in-memory fast path for users already over the limit"""
+        table = create_table()
+        limiter = TokenBucketLimiter(table, LIMITS, clock)
+        for _ in range(4):
+            limiter.allow('user-1', 'free')
+
+        with mock.patch.object(limiter, 'table') as mock_table:
+            assert not limiter.allow('user-1', 'free')
+            mock_table.update_item.assert_not_called()
+
+    def test_table_errors_fail_open(self, clock):
+        """Test that a failing limiter table does not block routing"""
+        from botocore.exceptions import ClientError
+
+        table = mock.Mock()
+        table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}},
+            'UpdateItem'
+        )
+        limiter = TokenBucketLimiter(table, LIMITS, clock)
+
+        assert limiter.allow('user-1', 'free')
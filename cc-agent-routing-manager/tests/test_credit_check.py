@@ -0,0 +1,125 @@
+"""
+Unit tests for the routing credit pre-check
+"""
+from decimal import Decimal
+from unittest import mock
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from moto import mock_aws
+
+from src.credit_check import CreditChecker
+
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        table = dynamodb.create_table(
+            TableName='Credits-test',
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        ssm = boto3.client('ssm', region_name='us-east-1')
+        ssm.put_parameter(Name='/fertilia/pricing/wan-i2v', Value='0.05', Type='String')
+        yield dynamodb, table, ssm
+
+
+class TestCreditChecker:
+    """Test balance checks and caching"""
+
+    def test_cost_uses_ssm_price_and_default(self, aws):
+        """Test cost estimation from SSM pricing with the reconciler's default"""
+        dynamodb, _, ssm = aws
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm)
+
+        assert checker.estimate_cost('wan-i2v', 10) == pytest.approx(0.5)
+        assert checker.estimate_cost('unknown-model', 10) == pytest.approx(1.0)
+
+    def test_balance_check_and_local_deduction(self, aws):
+        """Test that admitted jobs draw down the cached balance"""
+        dynamodb, table, ssm = aws
+        table.put_item(Item={'userId': 'user-1', 'remaining': Decimal('1.2')})
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm)
+
+        # 10s at 0.05/s = 0.5 per job
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
+        assert not checker.has_credit('user-1', 'wan-i2v', 10)
+
+    def test_user_without_credits_item_rejected(self, aws):
+        """Test that users with no credits record cannot route paid jobs the reconciler could not debit"""
+        dynamodb, _, ssm = aws
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm)
+
+        assert not checker.has_credit('user-new', 'wan-i2v', 5)
+
+    def test_balance_cached_until_ttl(self, aws, clock):
+        """Test the read-through cache serves repeat checks without DynamoDB"""
+        dynamodb, table, ssm = aws
+        table.put_item(Item={'userId': 'user-1', 'remaining': Decimal('100')})
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm, balance_cache_seconds=30, clock=clock)
+
+        with mock.patch.object(checker, 'dynamodb', wraps=dynamodb) as spy:
+            for _ in range(5):
+                checker.has_credit('user-1', 'wan-i2v', 1)
+            assert spy.batch_get_item.call_count == 1
+
+            clock.now += 31
+            checker.has_credit('user-1', 'wan-i2v', 1)
+            assert spy.batch_get_item.call_count == 2
+
+    def test_prefetch_chunks_batch_get(self, aws):
+        """Test that prefetch loads many users in BatchGetItem chunks"""
+        dynamodb, table, ssm = aws
+        with table.batch_writer() as batch:
+            for i in range(150):
+                batch.put_item(Item={'userId': f'user-{i}', 'remaining': Decimal('10')})
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm)
+
+        with mock.patch.object(checker, 'dynamodb', wraps=dynamodb) as spy:
+            checker.prefetch(f'user-{i}' for i in range(150))
+            assert spy.batch_get_item.call_count == 2
+            assert all(checker.has_credit(f'user-{i}', 'wan-i2v', 10) for i in range(150))
+            assert spy.batch_get_item.call_count == 2
+
+    def test_lookup_errors_admit(self):
+        """Test that a failing credits table does not block routing"""
+        resource = mock.Mock()
+        resource.batch_get_item.side_effect = ClientError(
+            {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}},
+            'BatchGetItem'
+        )
+        ssm = mock.Mock()
+        ssm.get_parameter.return_value = {'Parameter': {'Value': '0.1'}}
+        checker = CreditChecker(resource, 'Credits-test', ssm)
+
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
+
+    def test_connection_errors_admit(self):
+        """Test that botocore connection errors fail open like ClientErrors"""
+        resource = mock.Mock()
+        resource.batch_get_item.side_effect = EndpointConnectionError(
+            endpoint_url='https://dynamodb.us-east-1.amazonaws.com'
+        )
+        ssm = mock.Mock()
+        ssm.get_parameter.side_effect = EndpointConnectionError(
+            endpoint_url='https://ssm.us-east-1.amazonaws.com'
+        )
+        checker = CreditChecker(resource, 'Credits-test', ssm)
+
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
+        assert checker.price('wan-i2v') == pytest.approx(0.10)
+
+    def test_refund_restores_cached_balance(self, aws):
+        """Test that a job not sent after its check gives its deduction back"""
+        dynamodb, table, ssm = aws
+        table.put_item(Item={'userId': 'user-1', 'remaining': Decimal('0.5')})
+        checker = CreditChecker(dynamodb, 'Credits-test', ssm)
+
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
+        assert not checker.has_credit('user-1', 'wan-i2v', 10)
+        checker.refund('user-1', 'wan-i2v', 10)
+        assert checker.has_credit('user-1', 'wan-i2v', 10)
@@ -0,0 +1,149 @@
+"""
+Unit tests for the weighted fair dequeue helper in the shared layer
+"""
+import json
+from unittest import mock
+
+import boto3
+from moto import mock_aws
+
+from fair_queue import WeightedFairConsumer
+
+
+def _message(job_id, user_id):
+    return {
+        'MessageId': f'msg-{job_id}',
+        'Body': json.dumps({'jobId': job_id, 'userId': user_id}),
+        'ReceiptHandle': f'rh-{job_id}',
+        'MessageAttributes': {'userId': {'DataType': 'String', 'StringValue': user_id}}
+    }
+
+
+class TestWeightedFairConsumer:
+    """Test lane scheduling and per-user caps"""
+
+    def _consumer(self, sqs, **kwargs):
+        lanes = [('premium', 'premium-url', 6), ('standard', 'standard-url', 3), ('free', 'free-url', 1)]
+        return WeightedFairConsumer(lanes, sqs_client=sqs, **kwargs)
+
+    def test_lanes_served_by_weight(self):
+        """Test that busy lanes are polled in proportion to their weights"""
+        sqs = mock.Mock()
+        sqs.receive_message.side_effect = lambda **kwargs: {
+            'Messages': [_message(f"{kwargs['QueueUrl']}-{sqs.receive_message.call_count}", 'user-1')]
+        }
+        consumer = self._consumer(sqs, max_in_flight_per_user=1000)
+
+        lanes = [consumer.receive()[0]['lane'] for _ in range(10)]
+
+        assert lanes.count('premium') == 6
+        assert lanes.count('standard') == 3
+        assert lanes.count('free') == 1
+        # Smooth WRR interleaves rather than bursting a lane
+        assert lanes[:3] != ['premium'] * 3
+
+    def test_empty_lanes_are_skipped(self):
+        """Test that idle lanes do not stall the consumer"""
+        sqs = mock.Mock()
+        sqs.receive_message.side_effect = lambda **kwargs: (
+            {'Messages': [_message('job-free', 'user-1')]} if kwargs['QueueUrl'] == 'free-url' else {}
+        )
+        consumer = self._consumer(sqs)
+
+        items = consumer.receive()
+
+        assert [item['lane'] for item in items] == ['free']
+        assert items[0]['job']['jobId'] == 'job-free'
+
+    def test_user_over_cap_is_deferred(self):
+        """Test that a user's extra jobs are pushed back until a slot frees"""
+        sqs = mock.Mock()
+        sqs.receive_message.return_value = {
+            'Messages': [_message('job-1', 'user-1'), _message('job-2', 'user-1'), _message('job-3', 'user-2')]
+        }
+        consumer = self._consumer(sqs, max_in_flight_per_user=1, defer_seconds=15)
+
+        items = consumer.receive()
+
+        assert [item['job']['jobId'] for item in items] == ['job-1', 'job-3']
+        sqs.change_message_visibility.assert_called_once_with(
+            QueueUrl='premium-url', ReceiptHandle='rh-job-2', VisibilityTimeout=15
+        )
+
+        consumer.complete(items[0])
+        sqs.delete_message.assert_called_once_with(QueueUrl='premium-url', ReceiptHandle='rh-job-1')
+        assert consumer._acquire('user-1', 'msg-job-2')
+
+    def test_deferral_never_spends_the_last_receive(self):
+        """Test that a job deferred over and over is re-sent instead of reaching the DLQ"""
+        with mock_aws():
+            sqs = boto3.client('sqs', region_name='us-east-1')
+            dlq_url = sqs.create_queue(QueueName='lane-dlq')['QueueUrl']
+            dlq_arn = sqs.get_queue_attributes(
+                QueueUrl=dlq_url, AttributeNames=['QueueArn']
+            )['Attributes']['QueueArn']
+            lane_url = sqs.create_queue(QueueName='lane', Attributes={
+                'RedrivePolicy': json.dumps({'deadLetterTargetArn': dlq_arn, 'maxReceiveCount': '3'})
+            })['QueueUrl']
+            sqs.send_message(
+                QueueUrl=lane_url,
+                MessageBody=json.dumps({'jobId': 'job-1', 'userId': 'user-1'}),
+                MessageAttributes={'userId': {'DataType': 'String', 'StringValue': 'user-1'}}
+            )
+            consumer = WeightedFairConsumer([('standard', lane_url, 1)], sqs_client=sqs,
+                                            max_in_flight_per_user=1, defer_seconds=0, max_receive_count=3)
+            # The user's slot stays taken by a job that is still running
+            assert consumer._acquire('user-1', 'msg-running')
+
+            for _ in range(10):
+                assert consumer.receive() == []
+
+            assert 'Messages' not in sqs.receive_message(QueueUrl=dlq_url)
+            consumer.release({'userId': 'user-1', 'messageId': 'msg-running'})
+            items = consumer.receive()
+            assert [item['job']['jobId'] for item in items] == ['job-1']
+            assert items[0]['userId'] == 'user-1'
+
+    def test_expired_lease_frees_slot(self):
+        """Test that a job never completed stops counting once its lease expires"""
+        clock = mock.Mock(return_value=1000.0)
+        consumer = self._consumer(mock.Mock(), max_in_flight_per_user=1, lease_seconds=60, clock=clock)
+
+        assert consumer._acquire('user-1', 'msg-1')
+        assert not consumer._acquire('user-1', 'msg-2')
+        # A redelivery of the same job renews its own lease
+        assert consumer._acquire('user-1', 'msg-1')
+
+        clock.return_value = 1061.0
+        assert consumer._acquire('user-1', 'msg-2')
+        assert list(consumer._leases['user-1']) == ['msg-2']
+
+    @mock_aws
+    def test_shared_in_flight_counter(self):
+        """Test that the DynamoDB counter bounds a user across consumers"""
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb.create_table(
+            TableName='test-inflight',
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        clock = mock.Mock(return_value=1000.0)
+        first = self._consumer(mock.Mock(), max_in_flight_per_user=2, in_flight_table='test-inflight',
+                               lease_seconds=60, clock=clock)
+        second = self._consumer(mock.Mock(), max_in_flight_per_user=2, in_flight_table='test-inflight',
+                                lease_seconds=60, clock=clock)
+
+        assert first._acquire('user-1', 'msg-1')
+        assert second._acquire('user-1', 'msg-2')
+        assert not first._acquire('user-1', 'msg-3')
+
+        second.release({'userId': 'user-1', 'messageId': 'msg-2'})
+        assert first._acquire('user-1', 'msg-3')
+
+        # The worker holding msg-1 died; its lease expires and is pruned on the next acquire
+        clock.return_value = 1061.0
+        assert second._acquire('user-1', 'msg-4')
+        item = dynamodb.Table('test-inflight').get_item(Key={'userId': 'user-1'})['Item']
+        assert set(item['leases']) == {'msg-4'}
+        assert item['expiresAt'] == 1121
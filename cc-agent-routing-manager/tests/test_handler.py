@@ -29,14 +29,16 @@ class TestHandler:
             "fal": handler.FAL_QUEUE_URL,
             "replicate": handler.REPLICATE_QUEUE_URL
         }
+        handler._recently_routed.clear()
+        handler.admission_limiter._tat.clear()
+        handler.CREDIT_CHECK_ENABLED = False
     
-    @mock.patch('src.handler.is_job_already_routed')
     @mock.patch('src.handler.sqs')
     @mock.patch('src.handler.events_client')
-    @mock.patch('src.handler.record_routing_decision')
-    def test_successful_routing_to_fal(self, mock_record, mock_events, mock_sqs, mock_already_routed):
+    @mock.patch('src.handler.claim_job')
+    def test_successful_routing_to_fal(self, mock_claim, mock_events, mock_sqs):
         """Test successful routing to fal provider"""
-        mock_already_routed.return_value = False
+        mock_claim.return_value = True
         
         event = {
             'detail': {
@@ -69,10 +71,11 @@ class TestHandler:
         assert len(event_entries) == 1
         assert event_entries[0]['DetailType'] == 'video.job.routed'
     
-    @mock.patch('src.handler.is_job_already_routed')
-    def test_idempotency_check(self, mock_already_routed):
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.claim_job')
+    def test_idempotency_check(self, mock_claim, mock_sqs):
         """Test idempotency - job already routed"""
-        mock_already_routed.return_value = True
+        mock_claim.return_value = False
         
         event = {
             'detail': {
@@ -89,6 +92,54 @@ class TestHandler:
         assert result['statusCode'] == 200
         body = json.loads(result['body'])
         assert body['status'] == 'already_processed'
+        mock_sqs.send_message.assert_not_called()
+    
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.claim_job')
+    def test_recently_routed_skips_dynamodb(self, mock_claim, mock_events, mock_sqs):
+        """Test that a redelivery hitting the container LRU skips the claim"""
+        mock_claim.return_value = True
+        event = {
+            'detail': {
+                'jobId': 'test-lru',
+                'userId': 'user-456',
+                'prompt': 'test',
+                'lengthSec': 5,
+                'resolution': '720p'
+            }
+        }
+        
+        assert json.loads(handler.lambda_handler(event, None)['body'])['status'] == 'routed'
+        result = handler.lambda_handler(event, None)
+        
+        assert json.loads(result['body'])['status'] == 'already_processed'
+        mock_claim.assert_called_once()
+        mock_sqs.send_message.assert_called_once()
+    
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.release_claim')
+    @mock.patch('src.handler.claim_job', return_value=True)
+    def test_queue_error_releases_claim(self, mock_claim, mock_release, mock_events, mock_sqs):
+        """Test that a failed enqueue gives the claim back before rejecting"""
+        mock_sqs.send_message.side_effect = Exception('boom')
+        event = {
+            'detail': {
+                'jobId': 'test-sqs-down',
+                'userId': 'user-456',
+                'prompt': 'test',
+                'lengthSec': 5,
+                'resolution': '720p'
+            }
+        }
+        
+        result = handler.lambda_handler(event, None)
+        
+        assert result['statusCode'] == 400
+        assert json.loads(result['body'])['reason'].startswith('queue_error')
+        mock_release.assert_called_once_with('test-sqs-down')
+        assert 'test-sqs-down' not in handler._recently_routed
     
     @mock.patch('src.handler.events_client')
     def test_job_rejection_no_route(self, mock_events):
@@ -153,36 +204,56 @@ class TestHandler:
         assert 'missing_required_field:jobId' in body['reason']
     
     @mock.patch('src.handler.dynamodb')
-    def test_is_job_already_routed(self, mock_dynamodb):
-        """Test job routing status check"""
-        # Mock table response
+    def test_claim_job(self, mock_dynamodb):
+        """Test conditional claim of a job"""
+        from botocore.exceptions import ClientError
+        
         mock_table = mock.Mock()
         mock_dynamodb.Table.return_value = mock_table
+        queue_url = 'https://sqs.region.amazonaws.com/123/FalJobQueue'
         
-        # Test job exists and is routed
-        mock_table.get_item.return_value = {
-            'Item': {'jobId': 'test-123', 'status': 'ROUTED'}
-        }
-        assert handler.is_job_already_routed('test-123') is True
+        # Claim succeeds with one conditional write, no read
+        assert handler.claim_job('test-123', 'fal', 'wan-i2v', queue_url) is True
+        mock_table.get_item.assert_not_called()
+        kwargs = mock_table.update_item.call_args[1]
+        assert 'ConditionExpression' in kwargs
+        assert kwargs['ExpressionAttributeValues'][':status'] == 'ROUTED'
+        assert kwargs['ExpressionAttributeValues'][':queue'] == 'FalJobQueue'
         
-        # Test job doesn't exist
-        mock_table.get_item.return_value = {}
-        assert handler.is_job_already_routed('test-456') is False
+        # Condition failure means another delivery already routed the job
+        mock_table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}},
+            'UpdateItem'
+        )
+        assert handler.claim_job('test-456', 'fal', 'wan-i2v', queue_url) is False
+        assert handler.was_recently_routed('test-456') is True
         
-        # Test job exists but not routed
-        mock_table.get_item.return_value = {
-            'Item': {'jobId': 'test-789', 'status': 'SUBMITTED'}
-        }
-        assert handler.is_job_already_routed('test-789') is False
+        # Other errors fall back to routing rather than dropping the job
+        mock_table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}},
+            'UpdateItem'
+        )
+        assert handler.claim_job('test-789', 'fal', 'wan-i2v', queue_url) is True
+    
+    def test_recently_routed_lru_is_bounded(self):
+        """Test that the routed-job LRU evicts the oldest entries"""
+        with mock.patch.object(handler, 'ROUTED_CACHE_SIZE', 2):
+            handler.remember_routed('a')
+            handler.remember_routed('b')
+            handler.was_recently_routed('a')
+            handler.remember_routed('c')
+        
+        assert handler.was_recently_routed('a') is True
+        assert handler.was_recently_routed('b') is False
+        assert handler.was_recently_routed('c') is True
     
-    @mock.patch('src.handler.is_job_already_routed')
     @mock.patch('src.handler.sqs')
     @mock.patch('src.handler.events_client')
-    @mock.patch('src.handler.record_routing_decision')
+    @mock.patch('src.handler.claim_job')
     @mock.patch('src.handler.send_routing_metrics')
-    def test_full_routing_flow_with_metrics(self, mock_metrics, mock_record, mock_events, mock_sqs, mock_already_routed):
+    def test_full_routing_flow_with_metrics(self, mock_metrics, mock_claim, mock_events, mock_sqs):
         """Test complete routing flow including metrics"""
-        mock_already_routed.return_value = False
+        mock_claim.return_value = True
         
         # Test with explicit provider
         event = {
@@ -206,8 +277,8 @@ class TestHandler:
         # Verify metrics were sent
         mock_metrics.assert_called_with('replicate', True)
         
-        # Verify recording was called
-        mock_record.assert_called_once()
+        # Verify routing decision was claimed
+        mock_claim.assert_called_once()
     
     def test_direct_invocation_format(self):
         """Test handler accepts direct invocation format (no 'detail' wrapper)"""
@@ -220,10 +291,9 @@ class TestHandler:
             'provider': 'auto'
         }
         
-        with mock.patch('src.handler.is_job_already_routed', return_value=False), \
+        with mock.patch('src.handler.claim_job', return_value=True), \
              mock.patch('src.handler.sqs'), \
-             mock.patch('src.handler.events_client'), \
-             mock.patch('src.handler.record_routing_decision'):
+             mock.patch('src.handler.events_client'):
             
             result = handler.lambda_handler(event, None)
             
@@ -231,6 +301,118 @@ class TestHandler:
             body = json.loads(result['body'])
             assert body['provider'] == 'fal'
     
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.claim_job', return_value=True)
+    def test_adaptive_routing_spills_to_idle_provider(self, mock_claim, mock_events, mock_sqs):
+        """Test that adaptive mode moves jobs off a backed-up provider queue"""
+        event = {
+            'detail': {
+                'jobId': 'test-adaptive',
+                'userId': 'user-456',
+                'prompt': 'test',
+                'lengthSec': 8,
+                'resolution': '720p'
+            }
+        }
+        snapshot = {
+            'fal': {'depth': 500, 'latency': 300},
+            'replicate': {'depth': 2, 'latency': 5}
+        }
+        
+        with mock.patch.object(handler, 'ROUTING_MODE', 'adaptive'), \
+             mock.patch.object(handler.load_tracker, 'snapshot', return_value=snapshot), \
+             mock.patch.object(handler.load_tracker, 'note_enqueued') as mock_note:
+            result = handler.lambda_handler(event, None)
+        
+        body = json.loads(result['body'])
+        assert body['provider'] == 'replicate'
+        assert mock_sqs.send_message.call_args[1]['QueueUrl'] == handler.REPLICATE_QUEUE_URL
+        mock_note.assert_called_once_with('replicate')
+
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.claim_job', return_value=True)
+    def test_premium_job_uses_priority_lane(self, mock_claim, mock_events, mock_sqs):
+        """Test that tiers with a lane are enqueued there, others on the provider queue"""
+        lanes = {'fal': {'premium': 'https://sqs.region.amazonaws.com/123/FalJobQueue-premium'}}
+        event = {
+            'detail': {
+                'jobId': 'test-lane',
+                'userId': 'user-456',
+                'prompt': 'test',
+                'lengthSec': 8,
+                'resolution': '720p',
+                'tier': 'premium'
+            }
+        }
+
+        with mock.patch.object(handler, 'PRIORITY_QUEUE_URLS', lanes):
+            handler.lambda_handler(event, None)
+            assert handler.resolve_queue_url('fal', 'free') == handler.FAL_QUEUE_URL
+            assert handler.resolve_queue_url('replicate', 'premium') == handler.REPLICATE_QUEUE_URL
+
+        call_args = mock_sqs.send_message.call_args[1]
+        assert call_args['QueueUrl'] == lanes['fal']['premium']
+        assert call_args['MessageAttributes']['tier']['StringValue'] == 'premium'
+        assert call_args['MessageAttributes']['userId']['StringValue'] == 'user-456'
+
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.emit_rejection')
+    @mock.patch('src.handler.send_rate_limited_metric')
+    @mock.patch('src.handler.claim_job', return_value=True)
+    def test_rate_limited_user_rejected_before_enqueue(self, mock_claim, mock_metric,
+                                                       mock_rejection, mock_sqs):
+        """Test that a user over their tier's bucket is rejected without an SQS send"""
+        limiter = handler.TokenBucketLimiter(limits={'standard': {'burst': 1, 'perMinute': 1}})
+        event = {
+            'detail': {
+                'jobId': 'test-rate-1',
+                'userId': 'user-busy',
+                'prompt': 'test',
+                'lengthSec': 8,
+                'resolution': '720p'
+            }
+        }
+
+        with mock.patch.object(handler, 'admission_limiter', limiter), \
+             mock.patch.object(handler, 'emit_routed_event'), \
+             mock.patch.object(handler, 'send_routing_metrics'):
+            handler.lambda_handler(event, None)
+            event['detail']['jobId'] = 'test-rate-2'
+            handler.lambda_handler(event, None)
+
+        assert mock_sqs.send_message.call_count == 1
+        assert mock_claim.call_count == 1
+        mock_rejection.assert_called_once_with('test-rate-2', 'rate_limited')
+        mock_metric.assert_called_once_with(1)
+
+    @mock.patch('src.handler.sqs')
+    @mock.patch('src.handler.emit_rejection')
+    @mock.patch('src.handler.claim_job', return_value=True)
+    def test_insufficient_credits_rejected(self, mock_claim, mock_rejection, mock_sqs):
+        """Test that a job costing more than the user's balance is not routed"""
+        checker = mock.Mock()
+        checker.has_credit.return_value = False
+        event = {
+            'detail': {
+                'jobId': 'test-broke',
+                'userId': 'user-broke',
+                'prompt': 'test',
+                'lengthSec': 8,
+                'resolution': '720p'
+            }
+        }
+
+        with mock.patch.object(handler, 'CREDIT_CHECK_ENABLED', True), \
+             mock.patch.object(handler, 'credit_checker', checker):
+            handler.lambda_handler(event, None)
+
+        checker.has_credit.assert_called_once_with('user-broke', 'wan-i2v', 8)
+        mock_rejection.assert_called_once_with('test-broke', 'insufficient_credits')
+        mock_claim.assert_not_called()
+        mock_sqs.send_message.assert_not_called()
+
     @mock.patch('src.handler.send_routing_metrics')
     def test_error_handling_sends_metrics(self, mock_metrics):
         """Test that errors still send metrics"""
@@ -241,4 +423,253 @@ class TestHandler:
         
         assert result['statusCode'] == 500
         # Verify error metrics were sent
-        mock_metrics.assert_called_with('error', False)
\ No newline at end of file
+        mock_metrics.assert_called_with('error', False)
+
+class TestSqsBatch:
+    """Test SQS-buffered batch ingestion"""
+    
+    def setup_method(self):
+        """Set up test environment"""
+        handler.QUEUE_URLS = {
+            "fal": 'https://sqs.region.amazonaws.com/123/FalJobQueue',
+            "replicate": 'https://sqs.region.amazonaws.com/123/ReplicateJobQueue'
+        }
+        handler._recently_routed.clear()
+        handler.admission_limiter._tat.clear()
+        handler.CREDIT_CHECK_ENABLED = False
+    
+    @staticmethod
+    def make_record(message_id, job):
+        """Wrap a job the way the EventBridge -> SQS target delivers it"""
+        return {
+            'messageId': message_id,
+            'eventSource': 'aws:sqs',
+            'body': json.dumps({
+                'source': 'frontend.api',
+                'detail-type': 'video.job.submitted',
+                'detail': job
+            })
+        }
+    
+    @mock.patch('src.handler.claim_job', return_value=True)
+    @mock.patch('src.handler.mark_job_rejected', return_value=True)
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_routes_with_batched_calls(self, mock_sqs, mock_events, mock_cloudwatch,
+                                             mock_rejected, mock_claim):
+        """Test that a batch uses send_message_batch and packs put_events"""
+        mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        mock_events.put_events.return_value = {'FailedEntryCount': 0}
+        
+        records = [
+            self.make_record(f'msg-{i}', {
+                'jobId': f'job-{i}',
+                'userId': f'user-{i % 4}',
+                'prompt': 'corgi surfing',
+                'lengthSec': 8,
+                'resolution': '720p'
+            })
+            for i in range(12)
+        ]
+        records.append(self.make_record('msg-bad', {
+            'jobId': 'job-bad',
+            'userId': 'user-456',
+            'prompt': 'too long',
+            'lengthSec': 30,
+            'resolution': '1080p'
+        }))
+        
+        result = handler.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': []}
+        
+        # 12 fal jobs -> 2 SQS batch calls of at most 10
+        assert mock_sqs.send_message_batch.call_count == 2
+        assert len(mock_sqs.send_message_batch.call_args_list[0][1]['Entries']) == 10
+        mock_sqs.send_message.assert_not_called()
+        
+        # 12 routed + 1 rejected -> 2 put_events calls
+        assert mock_events.put_events.call_count == 2
+        detail_types = [
+            entry['DetailType']
+            for call in mock_events.put_events.call_args_list
+            for entry in call[1]['Entries']
+        ]
+        assert detail_types.count('video.job.routed') == 12
+        assert detail_types.count('video.job.rejected') == 1
+        
+        assert mock_claim.call_count == 12
+        mock_rejected.assert_called_once_with('job-bad', 'no_route')
+        
+        # One aggregated metrics call
+        mock_cloudwatch.put_metric_data.assert_called_once()
+        metric = mock_cloudwatch.put_metric_data.call_args[1]['MetricData'][0]
+        assert metric['Value'] == 12
+    
+    @mock.patch('src.handler.claim_job', return_value=True)
+    @mock.patch('src.handler.release_claim')
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_reports_partial_failures(self, mock_sqs, mock_events, mock_cloudwatch,
+                                            mock_release, mock_claim):
+        """Test that only failed sends and unreadable records are redriven"""
+        mock_sqs.send_message_batch.return_value = {
+            'Successful': [{'Id': '0'}],
+            'Failed': [{'Id': '1', 'Code': 'InternalError', 'SenderFault': False}]
+        }
+        
+        records = [
+            self.make_record('msg-ok', {
+                'jobId': 'job-ok', 'userId': 'u', 'prompt': 'p', 'lengthSec': 5, 'resolution': '720p'
+            }),
+            self.make_record('msg-fail', {
+                'jobId': 'job-fail', 'userId': 'u', 'prompt': 'p', 'lengthSec': 5, 'resolution': '720p'
+            }),
+            {'messageId': 'msg-garbage', 'body': 'not json'}
+        ]
+        
+        result = handler.lambda_handler({'Records': records}, None)
+        
+        failed = {item['itemIdentifier'] for item in result['batchItemFailures']}
+        assert failed == {'msg-fail', 'msg-garbage'}
+        mock_release.assert_called_once_with('job-fail')
+        assert handler.was_recently_routed('job-ok') is True
+        assert handler.was_recently_routed('job-fail') is False
+    
+    @mock.patch('src.handler.claim_job', return_value=True)
+    @mock.patch('src.handler.release_claim')
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_error_fails_only_its_record(self, mock_sqs, mock_events, mock_cloudwatch,
+                                               mock_release, mock_claim):
+        """Test that a record raising mid-batch does not redrive jobs already claimed"""
+        from botocore.exceptions import EndpointConnectionError
+        mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        records = [
+            self.make_record(f'msg-{i}', {
+                'jobId': f'job-{i}', 'userId': f'user-{i}', 'prompt': 'p', 'lengthSec': 5, 'resolution': '720p'
+            })
+            for i in range(3)
+        ]
+        
+        def credit(video_job, model):
+            if video_job['jobId'] == 'job-1':
+                raise EndpointConnectionError(endpoint_url='https://dynamodb.us-east-1.amazonaws.com')
+            return True
+        
+        def note_enqueued(provider):
+            if mock_claim.call_count == 2:
+                raise RuntimeError('boom')
+        
+        with mock.patch.object(handler, 'has_enough_credit', side_effect=credit), \
+             mock.patch.object(handler, 'ROUTING_MODE', 'adaptive'), \
+             mock.patch.object(handler, 'choose_route', return_value=('fal', 'fal-ai/veo3', None)), \
+             mock.patch.object(handler.load_tracker, 'note_enqueued', side_effect=note_enqueued):
+            result = handler.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-1'}, {'itemIdentifier': 'msg-2'}]}
+        routed = [json.loads(e['MessageBody'])['jobId']
+                  for e in mock_sqs.send_message_batch.call_args[1]['Entries']]
+        assert routed == ['job-0']
+        # job-1 failed before its claim; job-2 failed after it
+        mock_release.assert_called_once_with('job-2')
+    
+    @mock.patch('src.handler.claim_job', return_value=True)
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_deduplicates_job_ids(self, mock_sqs, mock_events, mock_cloudwatch, mock_claim):
+        """Test that duplicate deliveries within one batch are routed once"""
+        mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        job = {'jobId': 'job-dup', 'userId': 'u', 'prompt': 'p', 'lengthSec': 5, 'resolution': '720p'}
+        
+        result = handler.lambda_handler(
+            {'Records': [self.make_record('msg-1', job), self.make_record('msg-2', job)]}, None
+        )
+        
+        assert result == {'batchItemFailures': []}
+        entries = mock_sqs.send_message_batch.call_args[1]['Entries']
+        assert len(entries) == 1
+    
+    @mock.patch('src.handler.claim_job', return_value=True)
+    @mock.patch('src.handler.mark_job_rejected', return_value=True)
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_checks_credits_with_one_prefetch(self, mock_sqs, mock_events, mock_cloudwatch,
+                                                    mock_rejected, mock_claim):
+        """Test that batch mode loads all balances up front and rejects unaffordable jobs"""
+        mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        mock_events.put_events.return_value = {'FailedEntryCount': 0}
+        ssm = mock.Mock()
+        ssm.get_parameter.return_value = {'Parameter': {'Value': '0.5'}}
+        resource = mock.Mock()
+        resource.batch_get_item.return_value = {
+            'Responses': {'Credits-test': [
+                {'userId': 'user-rich', 'remaining': 100},
+                {'userId': 'user-poor', 'remaining': 3}
+            ]}
+        }
+        checker = handler.CreditChecker(resource, 'Credits-test', ssm)
+        
+        records = [
+            self.make_record(f'msg-{user}-{i}', {
+                'jobId': f'job-{user}-{i}',
+                'userId': user,
+                'prompt': 'p',
+                'lengthSec': 8,
+                'resolution': '720p'
+            })
+            for user in ('user-rich', 'user-poor')
+            for i in range(2)
+        ]
+        
+        with mock.patch.object(handler, 'CREDIT_CHECK_ENABLED', True), \
+             mock.patch.object(handler, 'credit_checker', checker):
+            result = handler.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': []}
+        resource.batch_get_item.assert_called_once()
+        routed = [json.loads(e['MessageBody'])['jobId']
+                  for e in mock_sqs.send_message_batch.call_args[1]['Entries']]
+        assert routed == ['job-user-rich-0', 'job-user-rich-1']
+        rejected = {call.args for call in mock_rejected.call_args_list}
+        assert rejected == {('job-user-poor-0', 'insufficient_credits'),
+                            ('job-user-poor-1', 'insufficient_credits')}
+    
+    @mock.patch('src.handler.mark_job_rejected', return_value=True)
+    @mock.patch('src.handler.cloudwatch')
+    @mock.patch('src.handler.events_client')
+    @mock.patch('src.handler.sqs')
+    def test_batch_refunds_credit_of_unsent_jobs(self, mock_sqs, mock_events, mock_cloudwatch, mock_rejected):
+        """Test that a job whose claim is lost gives its provisional deduction back"""
+        mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+        mock_events.put_events.return_value = {'FailedEntryCount': 0}
+        ssm = mock.Mock()
+        ssm.get_parameter.return_value = {'Parameter': {'Value': '0.5'}}
+        resource = mock.Mock()
+        # Two 8 s jobs at 0.5/s
+        resource.batch_get_item.return_value = {
+            'Responses': {'Credits-test': [{'userId': 'user-1', 'remaining': 8}]}
+        }
+        checker = handler.CreditChecker(resource, 'Credits-test', ssm)
+        records = [
+            self.make_record(f'msg-{name}', {
+                'jobId': f'job-{name}', 'userId': 'user-1', 'prompt': 'p', 'lengthSec': 8, 'resolution': '720p'
+            })
+            for name in ('dup', 'a', 'b')
+        ]
+        
+        with mock.patch.object(handler, 'CREDIT_CHECK_ENABLED', True), \
+             mock.patch.object(handler, 'credit_checker', checker), \
+             mock.patch.object(handler, 'claim_job', side_effect=lambda job_id, *args: job_id != 'job-dup'):
+            result = handler.lambda_handler({'Records': records}, None)
+        
+        assert result == {'batchItemFailures': []}
+        routed = [json.loads(e['MessageBody'])['jobId']
+                  for e in mock_sqs.send_message_batch.call_args[1]['Entries']]
+        assert routed == ['job-a', 'job-b']
+        mock_rejected.assert_not_called()
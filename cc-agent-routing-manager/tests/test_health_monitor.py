@@ -0,0 +1,238 @@
+"""
+Unit tests for the agent health monitor
+"""
+import asyncio
+import time
+from unittest import mock
+
+with mock.patch('boto3.client'), mock.patch('boto3.resource'):
+    from src import health_monitor
+
+
+def healthy_result(agent_id, response_ms=50):
+    return {
+        'agentId': agent_id,
+        'healthy': True,
+        'status': 'healthy',
+        'responseTime': response_ms,
+        'timestamp': '2025-01-01T00:00:00'
+    }
+
+
+def unhealthy_result(agent_id):
+    return {
+        'agentId': agent_id,
+        'healthy': False,
+        'error': 'boom',
+        'responseTime': 10,
+        'timestamp': '2025-01-01T00:00:00'
+    }
+
+
+class TestProber:
+    """Test concurrent probing with per-agent deadlines"""
+
+    def test_slow_agent_does_not_hold_up_cycle(self):
+        """Test that an agent over its latency-derived deadline times out alone"""
+        endpoints = {'fast': 'arn:fast', 'slow': 'arn:slow'}
+        previous = {'slow': {'agentId': 'slow', 'latencyMean': 0.05, 'latencyDeviation': 0.01}}
+
+        def check(agent_id, function_arn):
+            if agent_id == 'slow':
+                time.sleep(1)
+            return healthy_result(agent_id)
+
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', endpoints), \
+             mock.patch.object(health_monitor, 'MIN_PROBE_TIMEOUT', 0.1), \
+             mock.patch.object(health_monitor, 'check_agent_health', side_effect=check):
+            start = time.time()
+            results = asyncio.run(health_monitor.probe_all_agents(previous, start))
+            elapsed = time.time() - start
+
+        by_agent = {r['agentId']: r for r in results}
+        assert by_agent['fast']['healthy']
+        assert not by_agent['slow']['healthy']
+        assert 'timed out' in by_agent['slow']['error']
+        assert elapsed < 0.8
+
+    def test_probe_timeout_follows_latency_history(self):
+        """Test deadline derivation and clamping"""
+        assert health_monitor.probe_timeout({}) == health_monitor.HEALTH_CHECK_TIMEOUT
+        assert health_monitor.probe_timeout({'mean': 4.0, 'deviation': 0.5}) == 6.0
+        assert health_monitor.probe_timeout({'mean': 0.01, 'deviation': 0}) == health_monitor.MIN_PROBE_TIMEOUT
+        # A fast agent's deadline still covers a cold start
+        assert health_monitor.MIN_PROBE_TIMEOUT >= 3.0
+        assert health_monitor.probe_timeout({'mean': 60, 'deviation': 5}) == health_monitor.MAX_PROBE_TIMEOUT
+
+        latency = health_monitor.update_latency({}, 0.4)
+        assert latency == {'mean': 0.4, 'deviation': 0.2}
+        latency = health_monitor.update_latency(latency, 0.4)
+        assert latency['mean'] == 0.4
+        assert latency['deviation'] < 0.2
+
+
+class TestCircuitBreaker:
+    """Test breaker transitions across cycles"""
+
+    def run_cycle(self, previous, now, check):
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', {'agent': 'arn:agent'}), \
+             mock.patch.object(health_monitor, 'check_agent_health', side_effect=check) as mock_check:
+            result = asyncio.run(health_monitor.probe_all_agents(previous, now))[0]
+        record = {
+            'agentId': 'agent',
+            'breakerState': result['breaker']['state'],
+            'consecutiveFailures': result['breaker']['failures'],
+            'breakerOpenCount': result['breaker']['openCount'],
+            'breakerRetryAt': result['breaker']['retryAt']
+        }
+        return result, {'agent': record}, mock_check.call_count
+
+    def test_breaker_opens_backs_off_and_closes(self):
+        """Test closed -> open -> half-open -> open (longer) -> half-open -> closed"""
+        fail = lambda agent_id, arn: unhealthy_result(agent_id)  # noqa: E731
+        ok = lambda agent_id, arn: healthy_result(agent_id)  # noqa: E731
+        now = 1_000_000.0
+        previous = {}
+
+        for _ in range(health_monitor.BREAKER_FAILURE_THRESHOLD):
+            result, previous, calls = self.run_cycle(previous, now, fail)
+            assert calls == 1
+        assert result['breaker']['state'] == 'open'
+        first_retry = result['breaker']['retryAt']
+        assert first_retry == now + health_monitor.BREAKER_BASE_BACKOFF
+
+        # Open: not probed until the backoff expires
+        result, previous, calls = self.run_cycle(previous, now + 10, fail)
+        assert calls == 0
+        assert result['error'] == 'circuit_open'
+
+        # Half-open probe fails: re-open with double the backoff
+        result, previous, calls = self.run_cycle(previous, first_retry, fail)
+        assert calls == 1
+        assert result['breaker']['state'] == 'open'
+        assert result['breaker']['retryAt'] == first_retry + 2 * health_monitor.BREAKER_BASE_BACKOFF
+
+        # Half-open probe succeeds: closed and reset
+        result, previous, calls = self.run_cycle(previous, result['breaker']['retryAt'], ok)
+        assert calls == 1
+        assert result['breaker'] == {'state': 'closed', 'failures': 0, 'openCount': 0, 'retryAt': 0}
+
+    def test_breaker_state_written_to_health_table(self):
+        """Test that breaker and latency fields are persisted"""
+        result = healthy_result('agent')
+        result['breaker'] = {'state': 'open', 'failures': 3, 'openCount': 1, 'retryAt': 1234.5}
+        result['latency'] = {'mean': 0.25, 'deviation': 0.1}
+
+        with mock.patch.object(health_monitor, 'dynamodb') as mock_dynamodb:
+            health_monitor.update_health_records([result])
+
+        batch = mock_dynamodb.Table.return_value.batch_writer.return_value.__enter__.return_value
+        item = batch.put_item.call_args[1]['Item']
+        assert item['breakerState'] == 'open'
+        assert item['consecutiveFailures'] == 3
+        assert item['breakerRetryAt'] == 1234
+        assert float(item['latencyMean']) == 0.25
+
+
+class TestPassiveHealth:
+    """Test metric-based health checks"""
+
+    def test_one_metric_query_for_all_agents(self):
+        """Test that heartbeat and Lambda error metrics decide health without invokes"""
+        from datetime import datetime, timezone
+
+        endpoints = {
+            'routing-manager': 'arn:aws:lambda:us-east-1:123:function:routing-manager-dev',
+            'credit-reconciler': 'arn:aws:lambda:us-east-1:123:function:cc-agent-reconciler-dev',
+            'prompt-curator': 'arn:aws:lambda:us-east-1:123:function:prompt-curator-dev'
+        }
+        beat = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        response = {'MetricDataResults': [
+            # routing-manager: fresh heartbeat, 1/100 errors
+            {'Id': 'hb0', 'Timestamps': [beat], 'Values': [1]},
+            {'Id': 'err0', 'Timestamps': [beat], 'Values': [1]},
+            {'Id': 'inv0', 'Timestamps': [beat], 'Values': [100]},
+            # credit-reconciler: fresh heartbeat, half its invocations fail
+            {'Id': 'hb1', 'Timestamps': [beat], 'Values': [1]},
+            {'Id': 'err1', 'Timestamps': [beat], 'Values': [5]},
+            {'Id': 'inv1', 'Timestamps': [beat], 'Values': [10]},
+            # prompt-curator: no heartbeat in the window
+            {'Id': 'hb2', 'Timestamps': [], 'Values': []}
+        ]}
+
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', endpoints), \
+             mock.patch.object(health_monitor, 'cloudwatch') as mock_cloudwatch:
+            mock_cloudwatch.get_metric_data.return_value = response
+            observed = health_monitor.observe_agents_from_metrics(1_735_732_800.0)
+
+        mock_cloudwatch.get_metric_data.assert_called_once()
+        queries = mock_cloudwatch.get_metric_data.call_args[1]['MetricDataQueries']
+        assert len(queries) == 9
+        assert queries[0]['MetricStat']['Metric']['Namespace'] == 'Agent/RoutingManager'
+        assert queries[1]['MetricStat']['Metric']['Dimensions'] == [
+            {'Name': 'FunctionName', 'Value': 'routing-manager-dev'}
+        ]
+
+        assert observed['routing-manager']['healthy']
+        assert not observed['credit-reconciler']['healthy']
+        assert 'prompt-curator' not in observed
+
+    def test_only_stale_agents_are_invoked(self):
+        """Test that observed agents skip the Lambda invoke"""
+        endpoints = {'seen': 'arn:seen', 'stale': 'arn:stale'}
+        observed = {'seen': {'agentId': 'seen', 'healthy': True, 'source': 'metrics',
+                             'timestamp': '2025-01-01T00:00:00'}}
+
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', endpoints), \
+             mock.patch.object(health_monitor, 'check_agent_health',
+                               side_effect=lambda agent_id, arn: healthy_result(agent_id)) as mock_check:
+            results = asyncio.run(health_monitor.probe_all_agents({}, 1000.0, observed))
+
+        mock_check.assert_called_once_with('stale', 'arn:stale')
+        by_agent = {r['agentId']: r for r in results}
+        assert by_agent['seen']['source'] == 'metrics'
+        assert by_agent['seen']['breaker']['state'] == 'closed'
+        assert by_agent['stale']['healthy']
+
+    def test_metrics_read_unless_active_mode(self):
+        """Test that the default passive mode reads metrics and active mode skips them"""
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', {'a': 'arn:a'}), \
+             mock.patch.object(health_monitor, 'load_previous_health', return_value={}), \
+             mock.patch.object(health_monitor, 'observe_agents_from_metrics', return_value={}) as mock_observe, \
+             mock.patch.object(health_monitor, 'check_agent_health',
+                               side_effect=lambda agent_id, arn: healthy_result(agent_id)):
+            health_monitor.check_all_agents_health()
+            mock_observe.assert_called_once()
+
+            with mock.patch.object(health_monitor, 'HEALTH_CHECK_MODE', 'active'):
+                health_monitor.check_all_agents_health()
+            mock_observe.assert_called_once()
+
+    def test_metric_errors_fall_back_to_active_probes(self):
+        """Test that a CloudWatch failure leaves every agent for active probing"""
+        with mock.patch.object(health_monitor, 'AGENT_ENDPOINTS', {'a': 'arn:a'}), \
+             mock.patch.object(health_monitor, 'cloudwatch') as mock_cloudwatch:
+            mock_cloudwatch.get_metric_data.side_effect = Exception('throttled')
+            assert health_monitor.observe_agents_from_metrics(1000.0) == {}
+
+
+class TestErrorRates:
+    """Test error rates in health records"""
+
+    def test_health_record_carries_windowed_error_rates(self):
+        """Test that the 5-minute rate and all windows are written"""
+        with mock.patch.object(health_monitor, 'AGENT_OUTCOMES_TABLE', 'test-agent-outcomes'), \
+             mock.patch.object(health_monitor, 'error_rates',
+                               return_value={5: 0.5, 15: 0.2, 60: None}), \
+             mock.patch.object(health_monitor, 'dynamodb') as mock_dynamodb:
+            health_monitor.update_health_records([healthy_result('agent')])
+
+        batch = mock_dynamodb.Table.return_value.batch_writer.return_value.__enter__.return_value
+        item = batch.put_item.call_args[1]['Item']
+        assert float(item['errorRate']) == 0.5
+        assert {k: float(v) for k, v in item['errorRates'].items()} == {'5m': 0.5, '15m': 0.2}
+
+    def test_error_rate_without_counters_table(self):
+        """Test that agents without counters report 0.0"""
+        with mock.patch.object(health_monitor, 'AGENT_OUTCOMES_TABLE', None):
+            assert health_monitor.calculate_error_rate('agent') == 0.0
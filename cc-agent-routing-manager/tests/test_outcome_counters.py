@@ -0,0 +1,79 @@
+"""
+Unit tests for minute-bucketed outcome counters
+"""
+import boto3
+import pytest
+from moto import mock_aws
+
+from outcome_counters import OutcomeCounter, error_rates
+
+
+@pytest.fixture
+def table():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        yield dynamodb.create_table(
+            TableName='test-agent-outcomes',
+            KeySchema=[
+                {'AttributeName': 'agentId', 'KeyType': 'HASH'},
+                {'AttributeName': 'epochMinute', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'agentId', 'AttributeType': 'S'},
+                {'AttributeName': 'epochMinute', 'AttributeType': 'N'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+
+class TestOutcomeCounters:
+    """Test bucketed writes and windowed error rates"""
+
+    def test_flush_writes_one_item_per_minute(self, table, clock):
+        """Test that many outcomes in a minute become one counter update"""
+        counter = OutcomeCounter(table, 'routing-manager', clock)
+
+        for _ in range(50):
+            counter.record(True)
+        counter.record(False, 3)
+        counter.flush()
+        counter.record(True)
+        counter.flush()
+
+        items = table.scan()['Items']
+        assert len(items) == 1
+        assert items[0]['successes'] == 51
+        assert items[0]['errors'] == 3
+        assert items[0]['expiresAt'] > clock.now
+
+    def test_sliding_window_error_rates(self, table, clock):
+        """Test 5/15/60-minute rates from bucketed counts"""
+        counter = OutcomeCounter(table, 'routing-manager', clock)
+        now = clock.now
+
+        # 50 minutes ago: all errors; 10 minutes ago: healthy; last minute: half errors
+        for minutes_ago, successes, errors in ((50, 0, 10), (10, 20, 0), (0, 5, 5)):
+            clock.now = now - minutes_ago * 60
+            counter.record(True, successes)
+            counter.record(False, errors)
+        counter.flush()
+
+        rates = error_rates(table, 'routing-manager', now)
+
+        assert rates[5] == pytest.approx(0.5)
+        assert rates[15] == pytest.approx(5 / 30)
+        assert rates[60] == pytest.approx(15 / 40)
+
+    def test_no_traffic_and_other_agents(self, table, clock):
+        """Test that windows without traffic report None and agents are isolated"""
+        counter = OutcomeCounter(table, 'other-agent', clock)
+        counter.record(False, 10)
+        counter.flush()
+
+        assert error_rates(table, 'routing-manager', clock()) == {5: None, 15: None, 60: None}
+
+    def test_counter_without_table_is_noop(self):
+        """Test that agents without a counters table skip recording"""
+        counter = OutcomeCounter(None, 'routing-manager')
+        counter.record(True)
+        counter.flush()
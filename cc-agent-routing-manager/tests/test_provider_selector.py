@@ -0,0 +1,140 @@
+"""
+Unit tests for adaptive provider selection
+"""
+from unittest import mock
+import pytest
+
+from src.provider_selector import ProviderLoadTracker, select_provider
+
+QUEUE_URLS = {
+    "fal": "https://sqs.region.amazonaws.com/123/FalJobQueue",
+    "replicate": "https://sqs.region.amazonaws.com/123/ReplicateJobQueue"
+}
+CANDIDATES = [("fal", "wan-i2v"), ("replicate", "stable-video")]
+
+
+class TestSelectProvider:
+    """Test provider scoring"""
+    
+    def test_keeps_preferred_provider_without_signals(self):
+        """Test that the rule's route is used until load data exists"""
+        assert select_provider(CANDIDATES, {}) == ("fal", "wan-i2v")
+    
+    def test_keeps_preferred_within_margin(self):
+        """Test that small backlog differences do not move jobs"""
+        snapshot = {
+            "fal": {"depth": 12, "latency": 0},
+            "replicate": {"depth": 5, "latency": 0}
+        }
+        assert select_provider(CANDIDATES, snapshot) == ("fal", "wan-i2v")
+    
+    def test_spills_over_when_preferred_backed_up(self):
+        """Test that a backed-up preferred queue sends jobs to an idle provider"""
+        snapshot = {
+            "fal": {"depth": 400, "latency": 120},
+            "replicate": {"depth": 0, "latency": 0}
+        }
+        assert select_provider(CANDIDATES, snapshot) == ("replicate", "stable-video")
+    
+    def test_latency_counts_against_provider(self):
+        """Test that queue age is part of the score"""
+        snapshot = {
+            "fal": {"depth": 0, "latency": 600},
+            "replicate": {"depth": 20, "latency": 0}
+        }
+        assert select_provider(CANDIDATES, snapshot) == ("replicate", "stable-video")
+
+
+class TestProviderLoadTracker:
+    """Test cached load signals"""
+    
+    def make_tracker(self):
+        sqs = mock.Mock()
+        sqs.get_queue_attributes.side_effect = lambda QueueUrl, AttributeNames: {
+            'Attributes': {'ApproximateNumberOfMessages': '250' if 'Fal' in QueueUrl else '3'}
+        }
+        cloudwatch = mock.Mock()
+        cloudwatch.get_metric_data.return_value = {
+            'MetricDataResults': [
+                {'Id': 'age0', 'Values': [90.0, 30.0]},
+                {'Id': 'age1', 'Values': []}
+            ]
+        }
+        return ProviderLoadTracker(QUEUE_URLS, sqs, cloudwatch,
+                                   depth_refresh_seconds=5, latency_refresh_seconds=60), sqs, cloudwatch
+    
+    def test_refresh_reads_depth_and_latency(self):
+        """Test that one refresh reads every queue and one metric query"""
+        tracker, sqs, cloudwatch = self.make_tracker()
+        
+        tracker.refresh()
+        
+        assert sqs.get_queue_attributes.call_count == 2
+        cloudwatch.get_metric_data.assert_called_once()
+        with mock.patch.object(tracker, '_refreshing', True):
+            snapshot = tracker.snapshot()
+        assert snapshot['fal'] == {'depth': 250.0, 'latency': 90.0}
+        assert snapshot['replicate'] == {'depth': 3.0, 'latency': 0.0}
+    
+    def test_snapshot_is_cached_between_refreshes(self):
+        """Test that signals are not re-fetched per job"""
+        tracker, sqs, cloudwatch = self.make_tracker()
+        tracker.refresh()
+        
+        for _ in range(100):
+            tracker.snapshot()
+        
+        assert sqs.get_queue_attributes.call_count == 2
+        assert cloudwatch.get_metric_data.call_count == 1
+    
+    def test_stale_snapshot_refreshes_in_background(self):
+        """Test that a stale cache triggers a single background refresh"""
+        tracker, sqs, cloudwatch = self.make_tracker()
+        
+        with mock.patch('src.provider_selector.threading.Thread') as mock_thread:
+            assert tracker.snapshot() == {}
+            tracker.snapshot()
+        
+        mock_thread.assert_called_once()
+        mock_thread.return_value.start.assert_called_once()
+    
+    def test_note_enqueued_bumps_cached_depth(self):
+        """Test that jobs routed since the last refresh count towards depth"""
+        tracker, sqs, cloudwatch = self.make_tracker()
+        tracker.refresh()
+        
+        tracker.note_enqueued('replicate', 10)
+        
+        with mock.patch.object(tracker, '_refreshing', True):
+            assert tracker.snapshot()['replicate']['depth'] == 13.0
+    
+    def test_lanes_count_towards_provider_load(self):
+        """Test that a provider's depth sums its lanes and its latency is the oldest lane's"""
+        sqs = mock.Mock()
+        sqs.get_queue_attributes.side_effect = lambda QueueUrl, AttributeNames: {
+            'Attributes': {'ApproximateNumberOfMessages': '40' if QueueUrl.endswith('-premium') else '10'}
+        }
+        cloudwatch = mock.Mock()
+        cloudwatch.get_metric_data.return_value = {
+            'MetricDataResults': [
+                {'Id': 'age0', 'Values': [5.0]},
+                {'Id': 'age1', 'Values': [120.0]},
+                {'Id': 'age2', 'Values': [1.0]}
+            ]
+        }
+        tracker = ProviderLoadTracker(
+            {'fal': [QUEUE_URLS['fal'], QUEUE_URLS['fal'] + '-premium'], 'replicate': QUEUE_URLS['replicate']},
+            sqs, cloudwatch
+        )
+        
+        tracker.refresh()
+        
+        assert sqs.get_queue_attributes.call_count == 3
+        queries = cloudwatch.get_metric_data.call_args.kwargs['MetricDataQueries']
+        assert [q['MetricStat']['Metric']['Dimensions'][0]['Value'] for q in queries] == [
+            'FalJobQueue', 'FalJobQueue-premium', 'ReplicateJobQueue'
+        ]
+        with mock.patch.object(tracker, '_refreshing', True):
+            snapshot = tracker.snapshot()
+        assert snapshot['fal'] == {'depth': 50.0, 'latency': 120.0}
+        assert snapshot['replicate'] == {'depth': 10.0, 'latency': 1.0}
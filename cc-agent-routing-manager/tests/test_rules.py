@@ -129,4 +129,150 @@ class TestRoutingRuleEngine:
         }
         
         provider, model, reason = self.engine.evaluate(job)
-        assert reason == "no_route"  # 0 seconds, no resolution
\ No newline at end of file
+        assert reason == "no_route"  # 0 seconds, no resolution
+
+class TestCompiledRules:
+    """Test data-driven rule documents and hot reload"""
+    
+    DOCUMENT = {
+        "version": "test-1",
+        "providers": {"fal": "wan-i2v", "replicate": "stable-video"},
+        "rules": [
+            {"id": "catch-all-long", "priority": 1,
+             "match": {"lengthSec": {"min": 1, "max": 300}},
+             "route": {"provider": "replicate"}},
+            {"id": "premium-1080p", "priority": 50,
+             "match": {"tier": "premium", "resolution": "1080p", "lengthSec": {"min": 1, "max": 30}},
+             "route": {"provider": "fal", "model": "wan-pro"}},
+            {"id": "audio-short", "priority": 60,
+             "match": {"audio": True, "lengthSec": {"min": 5, "max": 20}},
+             "route": {"provider": "replicate", "model": "audio-video"}},
+            {"id": "block-huge-audio", "priority": 70,
+             "match": {"audio": True, "lengthSec": {"min": 200}},
+             "reject": "audio_too_long"}
+        ]
+    }
+    
+    def test_priority_and_wildcards(self):
+        """Test that the highest-priority matching rule wins across buckets"""
+        engine = RoutingRuleEngine(document=self.DOCUMENT)
+        
+        # Only the wildcard rule matches; model falls back to provider default
+        assert engine.evaluate({"lengthSec": 100, "resolution": "480p"}) == \
+            ("replicate", "stable-video", None)
+        
+        # Exact bucket beats the wildcard rule
+        assert engine.evaluate({"tier": "premium", "resolution": "1080p", "lengthSec": 20}) == \
+            ("fal", "wan-pro", None)
+        
+        # Overlapping interval with higher priority wins inside its range only
+        job = {"tier": "premium", "resolution": "1080p", "lengthSec": 10, "feature": {"audio": True}}
+        assert engine.evaluate(job) == ("replicate", "audio-video", None)
+        job["lengthSec"] = 25
+        assert engine.evaluate(job) == ("fal", "wan-pro", None)
+    
+    def test_reject_rule_and_no_route(self):
+        """Test reject rules and lengths outside every interval"""
+        engine = RoutingRuleEngine(document=self.DOCUMENT)
+        
+        assert engine.evaluate({"lengthSec": 250, "feature": {"audio": True}}) == \
+            (None, None, "audio_too_long")
+        assert engine.evaluate({"lengthSec": 0}) == (None, None, "no_route")
+    
+    def test_invalid_rule_rejected_at_compile(self):
+        """Test that malformed rules fail compilation"""
+        with pytest.raises(ValueError):
+            RoutingRuleEngine(document={"rules": [
+                {"id": "bad", "match": {"lengthSec": {"min": 10, "max": 5}}, "route": {"provider": "fal"}}
+            ]})
+    
+    def test_hot_reload_keyed_on_version(self):
+        """Test that sources are polled but only recompiled on a new version tag"""
+        calls = []
+        documents = {"v1": self.DOCUMENT}
+        
+        def source():
+            calls.append(1)
+            version = max(documents)
+            return version, documents[version]
+        
+        engine = RoutingRuleEngine(source=source, refresh_seconds=0)
+        assert engine.version == "v1"
+        first = engine.rules
+        
+        engine.refresh()
+        assert engine.rules is first
+        
+        documents["v2"] = {
+            "version": "v2",
+            "providers": {"fal": "wan-i2v"},
+            "rules": [{"id": "all-fal", "route": {"provider": "fal"}}]
+        }
+        assert engine.evaluate({"lengthSec": 100}) == ("fal", "wan-i2v", None)
+        assert engine.version == "v2"
+        assert len(calls) == 3
+    
+    def test_failed_reload_keeps_last_good_rules(self):
+        """Test that a broken source does not drop the current rules"""
+        def source():
+            raise RuntimeError("parameter not found")
+        
+        engine = RoutingRuleEngine(source=source, refresh_seconds=0)
+        
+        assert engine.version == "builtin-1"
+        assert engine.evaluate({"lengthSec": 8, "resolution": "720p"}) == ("fal", "wan-i2v", None)
+    
+    def test_matches_linear_scan(self):
+        """Test the compiled index against a brute-force scan of the rules"""
+        import random
+        rng = random.Random(7)
+        tiers, resolutions = ["standard", "premium"], ["480p", "720p", "1080p"]
+        rules = []
+        for i in range(300):
+            match = {}
+            if rng.random() < 0.5:
+                match["tier"] = rng.choice(tiers)
+            if rng.random() < 0.5:
+                match["resolution"] = rng.choice(resolutions)
+            if rng.random() < 0.3:
+                match["audio"] = rng.random() < 0.5
+            low = rng.randint(1, 200)
+            match["lengthSec"] = {"min": low, "max": low + rng.randint(0, 100)}
+            rules.append({"id": f"r{i}", "priority": rng.randint(0, 20), "match": match,
+                          "route": {"provider": "fal", "model": f"m{i}"}})
+        engine = RoutingRuleEngine(document={"providers": {"fal": "wan-i2v"}, "rules": rules})
+        
+        def scan(job):
+            best = None
+            for order, rule in enumerate(rules):
+                m = rule["match"]
+                if "tier" in m and m["tier"] != job["tier"]:
+                    continue
+                if "resolution" in m and m["resolution"] != job["resolution"]:
+                    continue
+                if "audio" in m and m["audio"] != job["feature"]["audio"]:
+                    continue
+                if not m["lengthSec"]["min"] <= job["lengthSec"] <= m["lengthSec"]["max"]:
+                    continue
+                rank = (-rule["priority"], order)
+                if best is None or rank < best[0]:
+                    best = (rank, rule)
+            return best[1]["route"]["model"] if best else None
+        
+        for _ in range(500):
+            job = {"tier": rng.choice(tiers), "resolution": rng.choice(resolutions),
+                   "lengthSec": rng.randint(1, 300), "feature": {"audio": rng.random() < 0.5}}
+            assert engine.evaluate(job)[1] == scan(job)
+    
+    def test_evaluate_candidates_lists_alternatives(self):
+        """Test that alternatives follow the preferred route"""
+        engine = RoutingRuleEngine()
+        
+        candidates, reason = engine.evaluate_candidates(
+            {"lengthSec": 8, "resolution": "720p", "provider": "auto"}
+        )
+        assert reason is None
+        assert candidates == [("fal", "wan-i2v"), ("replicate", "stable-video")]
+        
+        candidates, reason = engine.evaluate_candidates({"lengthSec": 8, "provider": "fal"})
+        assert candidates == [("fal", "wan-i2v")]
@@ -0,0 +1,238 @@
+"""
+Weighted fair dequeue for provider workers.
+Serves per-tier priority lanes by smooth weighted round-robin and caps each
+user's in-flight jobs with expiring per-job leases.
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Conditional writes tried per acquire before a contended user's job is deferred
+ACQUIRE_ATTEMPTS = 3
+# SQS caps per-message DelaySeconds at 15 minutes
+MAX_DELAY_SECONDS = 900
+
+
+class WeightedFairConsumer:
+    """
+    Dequeue provider jobs from per-tier priority lanes.
+
+    Lanes are served by smooth weighted round-robin, so a premium lane with
+    weight 6 gets six receives for every one of a weight-1 free lane while
+    idle lanes never block busy ones. Each userId may hold at most
+    max_in_flight_per_user jobs; messages over the limit are made invisible
+    again for defer_seconds so other users' jobs start first. Every receive
+    counts towards the queue's maxReceiveCount, so a message about to use its
+    last receive on a deferral is re-sent as a fresh message (delayed by
+    defer_seconds) instead of being moved to the dead-letter queue.
+
+    Every admitted job holds a lease, messageId -> expiresAt, that
+    complete()/release() drops. Expired leases are pruned on the next acquire,
+    so a worker that dies mid-job frees its slots after lease_seconds instead
+    of holding them forever; a redelivered message renews its own lease.
+    Leases are kept in memory per consumer, or when in_flight_table is given
+    in one DynamoDB item per userId (a `leases` map written under a version
+    check, with `expiresAt` for TTL), which bounds the user across all
+    consumer instances.
+    """
+
+    def __init__(self, lanes: List[Tuple[str, str, int]], max_in_flight_per_user: int = 3,
+                 in_flight_table: Optional[str] = None, defer_seconds: int = 30,
+                 lease_seconds: int = 900, max_receive_count: int = 5,
+                 region_name: str = 'us-east-1', sqs_client: Any = None, clock=time.time):
+        """
+        Args:
+            lanes: [(name, queue_url, weight), ...], e.g. [('premium', url, 6), ('standard', url, 3)]
+            max_in_flight_per_user: Leases one user may hold at once
+            in_flight_table: DynamoDB table keyed on userId for leases shared across consumers
+            defer_seconds: Visibility timeout given to messages from users at their cap
+            lease_seconds: How long a job may run before its slot is reclaimed; keep it at
+                least the lane queues' visibility timeout
+            max_receive_count: The lane queues' redrive maxReceiveCount
+            region_name: AWS region for the default clients
+            sqs_client: SQS client to use instead of a new one
+            clock: Time source, in epoch seconds
+        """
+        self.lanes = [{'name': name, 'url': url, 'weight': weight} for name, url, weight in lanes]
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.defer_seconds = defer_seconds
+        self.lease_seconds = lease_seconds
+        self.max_receive_count = max_receive_count
+        self.clock = clock
+        self.sqs = sqs_client or boto3.client('sqs', region_name=region_name)
+        self.table = None
+        if in_flight_table:
+            self.table = boto3.resource('dynamodb', region_name=region_name).Table(in_flight_table)
+        self._current = {lane['name']: 0 for lane in self.lanes}
+        # userId -> {messageId: expiresAt}, without a table
+        self._leases: Dict[str, Dict[str, float]] = {}
+
+    def _lane_order(self) -> List[Dict[str, Any]]:
+        # Smooth weighted round-robin pick, remaining lanes as work-conserving fallback
+        total = sum(lane['weight'] for lane in self.lanes)
+        for lane in self.lanes:
+            self._current[lane['name']] += lane['weight']
+        order = sorted(self.lanes, key=lambda lane: self._current[lane['name']], reverse=True)
+        self._current[order[0]['name']] -= total
+        return order
+
+    def receive(self, max_messages: int = 10, wait_seconds: int = 0) -> List[Dict[str, Any]]:
+        """
+        Receive admitted jobs from the next lane with work.
+
+        Args:
+            max_messages: Most messages to take from the lane
+            wait_seconds: SQS long-poll wait per lane
+
+        Returns:
+            Up to max_messages items {'lane', 'userId', 'messageId', 'job', 'queue_url',
+            'receipt_handle'}; pass each to complete() or release() when the job finishes
+        """
+        for lane in self._lane_order():
+            response = self.sqs.receive_message(
+                QueueUrl=lane['url'],
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=wait_seconds,
+                MessageAttributeNames=['All'],
+                AttributeNames=['ApproximateReceiveCount']
+            )
+            messages = response.get('Messages', [])
+            if not messages:
+                continue
+
+            admitted = []
+            for message in messages:
+                job = json.loads(message['Body'])
+                attributes = message.get('MessageAttributes', {})
+                user_id = attributes.get('userId', {}).get('StringValue') or job.get('userId')
+                item = {
+                    'lane': lane['name'],
+                    'userId': user_id,
+                    'messageId': message['MessageId'],
+                    'job': job,
+                    'queue_url': lane['url'],
+                    'receipt_handle': message['ReceiptHandle']
+                }
+                if self._acquire(user_id, item['messageId']):
+                    admitted.append(item)
+                else:
+                    self._defer(item, message)
+            if admitted:
+                return admitted
+        return []
+
+    def complete(self, item: Dict[str, Any]):
+        """Delete a finished job and drop its lease."""
+        self.sqs.delete_message(QueueUrl=item['queue_url'], ReceiptHandle=item['receipt_handle'])
+        self._release(item['userId'], item['messageId'])
+
+    def release(self, item: Dict[str, Any]):
+        """Drop the job's lease without deleting; SQS redelivers after the visibility timeout."""
+        self._release(item['userId'], item['messageId'])
+
+    def _defer(self, item: Dict[str, Any], message: Dict[str, Any]):
+        receive_count = int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1))
+        if receive_count >= self.max_receive_count - 1:
+            try:
+                # A fresh copy starts its receive count over; the original is dropped once it is sent
+                self.sqs.send_message(
+                    QueueUrl=item['queue_url'],
+                    MessageBody=message['Body'],
+                    MessageAttributes={
+                        name: {key: value for key, value in attribute.items()
+                               if key in ('DataType', 'StringValue', 'BinaryValue')}
+                        for name, attribute in message.get('MessageAttributes', {}).items()
+                    },
+                    DelaySeconds=min(self.defer_seconds, MAX_DELAY_SECONDS)
+                )
+                self.sqs.delete_message(QueueUrl=item['queue_url'], ReceiptHandle=item['receipt_handle'])
+                return
+            except ClientError:
+                # Fall back to deferring in place
+                pass
+        try:
+            self.sqs.change_message_visibility(
+                QueueUrl=item['queue_url'],
+                ReceiptHandle=item['receipt_handle'],
+                VisibilityTimeout=self.defer_seconds
+            )
+        except ClientError:
+            # Falls back to the queue's own visibility timeout
+            pass
+
+    def _live_leases(self, leases: Dict[str, Any], now: float) -> Dict[str, Any]:
+        return {message_id: expires_at for message_id, expires_at in leases.items() if expires_at > now}
+
+    def _acquire(self, user_id: str, message_id: str) -> bool:
+        """
+        Take a lease for one job, pruning the user's expired leases.
+
+        Args:
+            user_id: Job owner
+            message_id: SQS message id of the job
+
+        Returns:
+            True if the job is admitted, False if the user is at the cap
+        """
+        now = self.clock()
+        expires_at = int(now + self.lease_seconds)
+
+        if self.table is None:
+            leases = self._live_leases(self._leases.get(user_id, {}), now)
+            if message_id not in leases and len(leases) >= self.max_in_flight_per_user:
+                self._leases[user_id] = leases
+                return False
+            leases[message_id] = expires_at
+            self._leases[user_id] = leases
+            return True
+
+        for _ in range(ACQUIRE_ATTEMPTS):
+            item = self.table.get_item(Key={'userId': user_id}, ConsistentRead=True).get('Item', {})
+            leases = self._live_leases(item.get('leases', {}), now)
+            if message_id not in leases and len(leases) >= self.max_in_flight_per_user:
+                return False
+            leases[message_id] = expires_at
+            values = {':leases': leases, ':expires': max(leases.values()), ':one': 1}
+            if 'version' in item:
+                condition = 'version = :version'
+                values[':version'] = item['version']
+            else:
+                condition = 'attribute_not_exists(version)'
+            try:
+                # Whole map rewritten under the version read, so concurrent acquires cannot overshoot
+                self.table.update_item(
+                    Key={'userId': user_id},
+                    UpdateExpression='SET leases = :leases, expiresAt = :expires ADD version :one',
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values
+                )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        return False
+
+    def _release(self, user_id: str, message_id: str):
+        if self.table is None:
+            self._leases.get(user_id, {}).pop(message_id, None)
+            if not self._leases.get(user_id):
+                self._leases.pop(user_id, None)
+            return
+
+        try:
+            # The version bump fails any acquire that read the lease before it was dropped
+            self.table.update_item(
+                Key={'userId': user_id},
+                UpdateExpression='REMOVE leases.#message ADD version :one',
+                ConditionExpression='attribute_exists(leases.#message)',
+                ExpressionAttributeNames={'#message': message_id},
+                ExpressionAttributeValues={':one': 1}
+            )
+        except ClientError as e:
+            # Already expired and pruned
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
@@ -0,0 +1,118 @@
+"""
+Minute-bucketed success/error counters for agents, shipped in the shared layer.
+Agents add to the current minute's bucket; the routing manager's health monitor
+reads a bounded window of buckets to compute sliding-window error rates.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Any, Iterable, Optional
+
+from boto3.dynamodb.conditions import Key
+
+logger = logging.getLogger()
+
+# Buckets expire (DynamoDB TTL) after the longest window plus slack
+BUCKET_TTL_SECONDS = 2 * 60 * 60
+
+# Windows the health monitor reports (minutes)
+ERROR_RATE_WINDOWS = (5, 15, 60)
+
+
+class OutcomeCounter:
+    """
+    Buffers an agent's outcomes in memory and adds them to per-minute items.
+
+    Items are keyed (agentId, epochMinute), epochMinute = epoch seconds // 60.
+    flush() issues one UpdateItem (ADD successes, errors) per minute touched,
+    normally one per invocation, so the write cost is constant per invocation
+    no matter how many jobs it handled.
+    """
+
+    def __init__(self, table: Any, agent_id: str, clock=time.time):
+        self.table = table
+        self.agent_id = agent_id
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, int]] = {}
+
+    def record(self, success: bool, count: int = 1):
+        """
+        Count outcomes in the current minute.
+
+        Args:
+            success: Whether the work succeeded
+            count: Number of outcomes
+        """
+        if count <= 0 or self.table is None:
+            return
+        minute = int(self.clock() // 60)
+        with self._lock:
+            bucket = self._pending.setdefault(minute, {'successes': 0, 'errors': 0})
+            bucket['successes' if success else 'errors'] += count
+
+    def flush(self):
+        """Write buffered counts; failures are logged and the counts dropped."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for minute, counts in pending.items():
+            try:
+                self.table.update_item(
+                    Key={'agentId': self.agent_id, 'epochMinute': minute},
+                    UpdateExpression='ADD successes :s, errors :e SET expiresAt = :expires',
+                    ExpressionAttributeValues={
+                        ':s': counts['successes'],
+                        ':e': counts['errors'],
+                        ':expires': minute * 60 + BUCKET_TTL_SECONDS
+                    }
+                )
+            except Exception as e:
+                logger.error(f"Failed to write outcome counters for {self.agent_id}: {str(e)}")
+
+
+def error_rates(table: Any, agent_id: str, now: Optional[float] = None,
+                windows: Iterable[int] = ERROR_RATE_WINDOWS) -> Dict[int, Optional[float]]:
+    """
+    Compute error rates over several trailing windows from one Query.
+
+    Reads at most max(windows) bucket items for the agent, independent of job
+    volume.
+
+    Args:
+        table: Outcome counters table
+        agent_id: Agent identifier
+        now: Current time (epoch seconds)
+        windows: Window lengths in minutes
+
+    Returns:
+        Dict of window minutes -> error rate (0.0 to 1.0), None without traffic
+    """
+    windows = sorted(windows)
+    current_minute = int((time.time() if now is None else now) // 60)
+    oldest_minute = current_minute - windows[-1] + 1
+
+    buckets = []
+    query = {
+        'KeyConditionExpression': Key('agentId').eq(agent_id) & Key('epochMinute').gte(oldest_minute),
+        'ProjectionExpression': 'epochMinute, successes, errors'
+    }
+    while True:
+        response = table.query(**query)
+        buckets.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    rates: Dict[int, Optional[float]] = {}
+    for window in windows:
+        first_minute = current_minute - window + 1
+        successes = errors = 0
+        for bucket in buckets:
+            if int(bucket['epochMinute']) >= first_minute:
+                successes += int(bucket.get('successes', 0))
+                errors += int(bucket.get('errors', 0))
+        total = successes + errors
+        rates[window] = errors / total if total else None
+    return rates